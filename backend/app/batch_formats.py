@@ -0,0 +1,310 @@
+"""Input and output file formats for batch predictions.
+
+Uploads may be CSV (plain, gzip or zstd compressed), Parquet or Arrow
+IPC/Feather. The format is detected from the leading magic bytes, then the
+content type, then the file name. Columnar formats are read with pyarrow and
+compressed CSV is decompressed as a byte stream into the pandas C parser, so
+nothing is decoded to Python text first. Required columns are checked on the
+schema (or the CSV header) before any data is read.
+"""
+import json
+from typing import BinaryIO, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.ipc as ipc
+import pyarrow.parquet as pq
+from fastapi import HTTPException
+
+from app.validation import REQUIRED_COLUMNS, check_required_columns
+
+# Leading bytes of each format (Arrow IPC streams start with a continuation marker)
+MAGIC_BYTES = [
+    (b"PAR1", "parquet"),
+    (b"ARROW1", "arrow_file"),
+    (b"\xff\xff\xff\xff", "arrow_stream"),
+    (b"\x1f\x8b", "csv_gzip"),
+    (b"\x28\xb5\x2f\xfd", "csv_zstd"),
+]
+
+CONTENT_TYPES = {
+    "text/csv": "csv",
+    "application/csv": "csv",
+    "application/vnd.ms-excel": "csv",
+    "application/vnd.apache.parquet": "parquet",
+    "application/x-parquet": "parquet",
+    "application/vnd.apache.arrow.file": "arrow_file",
+    "application/vnd.apache.arrow.stream": "arrow_stream",
+    "application/gzip": "csv_gzip",
+    "application/x-gzip": "csv_gzip",
+    "application/zstd": "csv_zstd",
+}
+
+EXTENSIONS = [
+    (".csv.gz", "csv_gzip"),
+    (".csv.zst", "csv_zstd"),
+    (".csv", "csv"),
+    (".parquet", "parquet"),
+    (".feather", "arrow_file"),
+    (".arrow", "arrow_file"),
+    (".arrows", "arrow_stream"),
+]
+
+# Response formats selectable with the Accept header (JSON is the default)
+COMPACT_MEDIA_TYPE = "application/vnd.trafficsafe.compact+json"
+RESPONSE_MEDIA_TYPES = {
+    COMPACT_MEDIA_TYPE: "compact",
+    "application/vnd.apache.arrow.stream": "arrow",
+    "application/vnd.apache.arrow.file": "arrow",
+    "application/vnd.apache.parquet": "parquet",
+    "application/x-parquet": "parquet",
+}
+
+RESPONSE_FILES = {
+    "arrow": ("application/vnd.apache.arrow.stream", "predictions.arrows"),
+    "parquet": ("application/vnd.apache.parquet", "predictions.parquet"),
+}
+
+
+def detect_format(fileobj: BinaryIO, filename: Optional[str], content_type: Optional[str]) -> str:
+    """Identify an upload's format; raises 400 if it is not supported."""
+    head = fileobj.read(8)
+    fileobj.seek(0)
+    for magic, fmt in MAGIC_BYTES:
+        if head.startswith(magic):
+            return fmt
+
+    media_type = (content_type or "").split(";")[0].strip().lower()
+    if media_type in CONTENT_TYPES:
+        return CONTENT_TYPES[media_type]
+
+    name = (filename or "").lower()
+    for extension, fmt in EXTENSIONS:
+        if name.endswith(extension):
+            return fmt
+
+    raise HTTPException(
+        status_code=400,
+        detail="Unsupported file format: upload CSV (.csv, .csv.gz, .csv.zst), Parquet or Arrow IPC/Feather",
+    )
+
+
+def _read_csv(fileobj: BinaryIO, compression: Optional[str]) -> pd.DataFrame:
+    if compression is not None:
+        # pyarrow streams close the file they wrap, so decompress from a
+        # buffer of the (compressed) upload instead
+        fileobj.seek(0)
+        compressed = pa.py_buffer(fileobj.read())
+
+    def open_stream():
+        if compression is None:
+            fileobj.seek(0)
+            return fileobj
+        return pa.input_stream(compressed, compression=compression)
+
+    try:
+        header = pd.read_csv(open_stream(), nrows=0)
+    except pd.errors.EmptyDataError:
+        raise HTTPException(status_code=400, detail="CSV file is empty")
+    check_required_columns(header.columns)
+    return pd.read_csv(open_stream(), usecols=REQUIRED_COLUMNS, low_memory=False)[REQUIRED_COLUMNS]
+
+
+def read_batch_frame(fileobj: BinaryIO, fmt: str) -> pd.DataFrame:
+    """Read the required columns of an upload into a DataFrame."""
+    try:
+        if fmt == "csv":
+            return _read_csv(fileobj, None)
+        if fmt == "csv_gzip":
+            return _read_csv(fileobj, "gzip")
+        if fmt == "csv_zstd":
+            return _read_csv(fileobj, "zstd")
+
+        if fmt == "parquet":
+            reader = pq.ParquetFile(fileobj)
+            check_required_columns(reader.schema_arrow.names)
+            table = reader.read(columns=REQUIRED_COLUMNS)
+        elif fmt == "arrow_file":
+            reader = ipc.open_file(fileobj)
+            check_required_columns(reader.schema.names)
+            table = reader.read_all().select(REQUIRED_COLUMNS)
+        elif fmt == "arrow_stream":
+            reader = ipc.open_stream(fileobj)
+            check_required_columns(reader.schema.names)
+            table = reader.read_all().select(REQUIRED_COLUMNS)
+        else:
+            raise ValueError(f"Unknown format: {fmt}")
+    except (pa.ArrowInvalid, OSError, UnicodeDecodeError, pd.errors.ParserError) as e:
+        raise HTTPException(status_code=400, detail=f"Could not read {fmt.replace('_', ' ')} file: {e}")
+    return table.to_pandas()
+
+
+CSV_COMPRESSION = {"csv": None, "csv_gzip": "gzip", "csv_zstd": "zstd"}
+
+
+def _count_csv_rows(path: str) -> int:
+    """Count data rows of a plain CSV file by its line breaks."""
+    lines = 0
+    last = b"\n"
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            lines += block.count(b"\n")
+            last = block[-1:]
+    if last != b"\n":
+        lines += 1
+    return max(lines - 1, 0)
+
+
+def iter_batch_frames(
+    path: str, fmt: str, chunk_rows: int
+) -> Tuple[Optional[int], Iterator[pd.DataFrame]]:
+    """Open an upload stored at `path` for chunked reading.
+
+    Checks the required columns before returning. Returns the row count
+    (None when it is unknown without decompressing, i.e. compressed CSV)
+    and an iterator of DataFrames of at most `chunk_rows` rows. Chunks are
+    the same on every call, so a job can skip the ones it already scored.
+    """
+    try:
+        if fmt in CSV_COMPRESSION:
+            compression = CSV_COMPRESSION[fmt]
+
+            def open_stream():
+                return path if compression is None else pa.input_stream(path, compression=compression)
+
+            try:
+                header = pd.read_csv(open_stream(), nrows=0)
+            except pd.errors.EmptyDataError:
+                raise HTTPException(status_code=400, detail="CSV file is empty")
+            check_required_columns(header.columns)
+            rows_total = _count_csv_rows(path) if compression is None else None
+            reader = pd.read_csv(open_stream(), usecols=REQUIRED_COLUMNS, chunksize=chunk_rows)
+            return rows_total, (chunk[REQUIRED_COLUMNS].reset_index(drop=True) for chunk in reader)
+
+        if fmt == "parquet":
+            parquet_file = pq.ParquetFile(path)
+            check_required_columns(parquet_file.schema_arrow.names)
+            batches = parquet_file.iter_batches(batch_size=chunk_rows, columns=REQUIRED_COLUMNS)
+            return parquet_file.metadata.num_rows, (batch.to_pandas() for batch in batches)
+
+        if fmt in ("arrow_file", "arrow_stream"):
+            # Memory-mapped, so slices are zero-copy views of the file
+            source = pa.memory_map(path)
+            reader = ipc.open_file(source) if fmt == "arrow_file" else ipc.open_stream(source)
+            check_required_columns(reader.schema.names)
+            table = reader.read_all().select(REQUIRED_COLUMNS)
+            return table.num_rows, (
+                table.slice(start, chunk_rows).to_pandas()
+                for start in range(0, table.num_rows, chunk_rows)
+            )
+    except (pa.ArrowInvalid, OSError, UnicodeDecodeError, pd.errors.ParserError) as e:
+        raise HTTPException(status_code=400, detail=f"Could not read {fmt.replace('_', ' ')} file: {e}")
+    raise ValueError(f"Unknown format: {fmt}")
+
+
+def select_response_format(accept: Optional[str]) -> Optional[str]:
+    """Pick "compact", "arrow" or "parquet" from an Accept header, or None for JSON.
+
+    Media ranges are taken in order of preference (q value, then position);
+    the first JSON or wildcard range wins over later file formats.
+    """
+    if not accept:
+        return None
+    ranges: List[Tuple[float, int, str]] = []
+    for position, item in enumerate(accept.split(",")):
+        parts = [p.strip() for p in item.split(";")]
+        q = 1.0
+        for param in parts[1:]:
+            if param.startswith("q="):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0.0
+        if q > 0:
+            ranges.append((-q, position, parts[0].lower()))
+    for _, _, media_type in sorted(ranges):
+        if media_type in RESPONSE_MEDIA_TYPES:
+            return RESPONSE_MEDIA_TYPES[media_type]
+        if media_type in ("application/json", "*/*", "application/*"):
+            return None
+    return None
+
+
+def encode_predictions(
+    labels: np.ndarray, errors: Dict[int, str], summary: Dict, response_format: str
+) -> bytes:
+    """Encode per-row predictions as an Arrow IPC stream or Parquet file.
+
+    One row per input row, in input order: `accident_risk_level` (null for
+    invalid rows) and `error` (null for valid rows). The summary is stored
+    in the schema metadata under "summary".
+    """
+    error_column = np.full(len(labels), None, dtype=object)
+    for idx, message in errors.items():
+        error_column[idx] = message
+    table = pa.table({
+        "accident_risk_level": pa.array(labels, type=pa.string()),
+        "error": pa.array(error_column, type=pa.string()),
+    }).replace_schema_metadata({"summary": json.dumps(summary)})
+
+    sink = pa.BufferOutputStream()
+    if response_format == "arrow":
+        with ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+    else:
+        pq.write_table(table, sink)
+    return sink.getvalue().to_pybytes()
+
+
+# Label table of compact responses with `labels=codes`
+LABEL_TABLE = ["low", "medium", "high"]
+
+
+def encode_compact(
+    df: pd.DataFrame,
+    validation,
+    labels: np.ndarray,
+    summary: Dict,
+    codes: bool = False,
+    include_input: bool = False,
+    explanations: Optional[Dict] = None,
+) -> bytes:
+    """Encode batch predictions as compact, column-oriented JSON.
+
+    Labels come as one array (null for invalid rows) or, with `codes`, as
+    indices into `label_table` (-1 for invalid rows). Errors are listed only
+    for the failing rows. With `include_input`, inputs are echoed as one
+    array per column: coerced values for valid rows, raw values otherwise.
+    `explanations` (feature indices into a `feature_table`, contributions
+    and values per row) is passed through.
+    """
+    payload: Dict = {"total_count": len(labels), "summary": summary}
+    if codes:
+        payload["label_table"] = LABEL_TABLE
+        payload["codes"] = pd.Categorical(labels, categories=LABEL_TABLE).codes.tolist()
+    else:
+        payload["labels"] = labels.tolist()
+    payload["errors"] = {
+        "rows": list(validation.errors),
+        "messages": list(validation.errors.values()),
+    }
+    if include_input:
+        positions = validation.clean.index.to_numpy()
+        inputs = {}
+        for name in REQUIRED_COLUMNS:
+            column = df[name].to_numpy(dtype=object, copy=True)
+            column[positions] = validation.clean[name].to_numpy(dtype=object)
+            column[pd.isna(column)] = None
+            inputs[name] = column.tolist()
+        payload["inputs"] = inputs
+    if explanations is not None:
+        payload["explanations"] = explanations
+    return json.dumps(payload, default=_json_default).encode("utf-8")
+
+
+def _json_default(value):
+    # NumPy scalars that survive in object columns
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
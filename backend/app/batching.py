@@ -0,0 +1,166 @@
+"""Async micro-batching dispatcher for single predictions.
+
+Concurrent `/predict` requests are queued and scored together with one
+`predict_batch` call, so N in-flight requests cost one scoring pass instead
+of N. A batch is flushed when `max_batch_size` requests are waiting or
+`max_wait_ms` has passed since the first one arrived.
+"""
+import asyncio
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from app.config import MICRO_BATCH_MAX_SIZE, MICRO_BATCH_MAX_WAIT_MS, MICRO_BATCH_MAX_QUEUE, RETRY_AFTER_S
+from app.executor import Overloaded, SparkExecutor, single_executor
+from app.metrics import metrics
+from app.spark_service import spark_service
+
+
+class BatchStats:
+    """Counters for batch sizes and queueing delay."""
+
+    def __init__(self, max_batch_size: int):
+        # Power-of-two buckets: 1, 2, 4, ... up to max_batch_size
+        self.size_buckets: List[int] = []
+        bucket = 1
+        while bucket < max_batch_size:
+            self.size_buckets.append(bucket)
+            bucket *= 2
+        self.size_buckets.append(max_batch_size)
+        self.size_counts = [0] * len(self.size_buckets)
+        self.batches = 0
+        self.requests = 0
+        self.failed_batches = 0
+        self.queue_delay_total_ms = 0.0
+        self.queue_delay_max_ms = 0.0
+
+    def record(self, batch_size: int, delays_ms: List[float]) -> None:
+        self.batches += 1
+        self.requests += batch_size
+        for i, bucket in enumerate(self.size_buckets):
+            if batch_size <= bucket:
+                self.size_counts[i] += 1
+                break
+        self.queue_delay_total_ms += sum(delays_ms)
+        self.queue_delay_max_ms = max(self.queue_delay_max_ms, max(delays_ms))
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "batches": self.batches,
+            "requests": self.requests,
+            "failed_batches": self.failed_batches,
+            "mean_batch_size": round(self.requests / self.batches, 2) if self.batches else 0.0,
+            "batch_size_histogram": {
+                f"<={bucket}": count for bucket, count in zip(self.size_buckets, self.size_counts)
+            },
+            "queue_delay_ms": {
+                "mean": round(self.queue_delay_total_ms / self.requests, 3) if self.requests else 0.0,
+                "max": round(self.queue_delay_max_ms, 3),
+            },
+        }
+
+
+class MicroBatcher:
+    """Coalesce concurrent single predictions into `predict_batch` calls."""
+
+    def __init__(
+        self,
+        predict_batch: Callable[[List[Dict[str, Any]]], List[str]],
+        executor: SparkExecutor,
+        max_batch_size: int = 64,
+        max_wait_ms: float = 2.0,
+        max_queue: int = 1024,
+    ):
+        self._predict_batch = predict_batch
+        self._executor = executor
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self.max_queue = max_queue
+        self.stats = BatchStats(self.max_batch_size)
+        self._queue: Optional[asyncio.Queue] = None
+        self._full: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        """Start the collector task on the running event loop."""
+        if self._task is None or self._task.done():
+            self._queue = asyncio.Queue()
+            self._full = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the collector and fail any requests still queued."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        while self._queue is not None and not self._queue.empty():
+            _, future, _ = self._queue.get_nowait()
+            if not future.done():
+                future.set_exception(RuntimeError("Prediction dispatcher stopped"))
+
+    @property
+    def queue_depth(self) -> int:
+        """Requests waiting for the next scoring pass."""
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def submit(self, data: Dict[str, Any]) -> str:
+        """Queue one input and wait for its predicted risk level."""
+        self.start()
+        if self._queue.qsize() >= self.max_queue:
+            raise Overloaded("single", RETRY_AFTER_S)
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((data, future, time.perf_counter()))
+        if self._queue.qsize() >= self.max_batch_size - 1:
+            self._full.set()
+        return await future
+
+    async def _run(self) -> None:
+        while True:
+            batch = [await self._queue.get()]
+            if self.max_wait > 0 and self._queue.qsize() < self.max_batch_size - 1:
+                # Wait for the window to pass or the batch to fill. asyncio.wait
+                # (unlike wait_for) never swallows a cancellation from stop().
+                self._full.clear()
+                waiter = asyncio.ensure_future(self._full.wait())
+                try:
+                    await asyncio.wait({waiter}, timeout=self.max_wait)
+                finally:
+                    waiter.cancel()
+            while len(batch) < self.max_batch_size and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            await self._dispatch(batch)
+
+    async def _dispatch(self, batch: List[Tuple[Dict[str, Any], asyncio.Future, float]]) -> None:
+        # Skip callers whose deadline already expired while queued
+        batch = [item for item in batch if not item[1].done()]
+        if not batch:
+            return
+        started = time.perf_counter()
+        self.stats.record(len(batch), [(started - queued) * 1000.0 for _, _, queued in batch])
+        try:
+            # One trace per scoring pass: its stages are shared by the whole batch
+            with metrics.traced("microbatch", len(batch)):
+                results = await self._executor.run(self._predict_batch, [data for data, _, _ in batch])
+        except Exception as e:
+            self.stats.failed_batches += 1
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future, _), result in zip(batch, results):
+            # The caller may have gone away (client disconnect)
+            if not future.done():
+                future.set_result(result)
+
+
+# Shared dispatcher used by the single prediction route
+prediction_batcher = MicroBatcher(
+    spark_service.predict_batch,
+    single_executor,
+    max_batch_size=MICRO_BATCH_MAX_SIZE,
+    max_wait_ms=MICRO_BATCH_MAX_WAIT_MS,
+    max_queue=MICRO_BATCH_MAX_QUEUE,
+)
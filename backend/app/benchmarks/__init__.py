@@ -0,0 +1,9 @@
+"""Reproducible benchmarks of single and batch prediction throughput.
+
+    python -m app.benchmarks run --output bench.json
+    python -m app.benchmarks compare baseline.json bench.json
+
+See `app/benchmarks/__main__.py` for the options, `data.py` for the input
+generator, `micro.py` and `http_load.py` for the cases and `report.py` for
+the result format.
+"""
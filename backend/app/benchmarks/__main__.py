@@ -0,0 +1,101 @@
+"""Benchmark command line.
+
+    python -m app.benchmarks run [--suites micro http] [--sizes 1 100 10000 1000000]
+                                 [--concurrency 1 8 32] --output results.json
+    python -m app.benchmarks compare baseline.json results.json [--threshold 0.2]
+
+`run` turns the prediction cache off (unless `--cache`), so repeated inputs
+are scored every time, and records the host and configuration next to the
+results. `compare` exits with status 1 if any case regressed by more than
+the threshold and beyond the round-to-round spread of both runs.
+"""
+import argparse
+import json
+import os
+import sys
+from typing import List, Optional
+
+from app.benchmarks.report import (
+    DEFAULT_METRICS,
+    METRIC_DIRECTIONS,
+    compare,
+    environment,
+    format_comparison,
+    load,
+    save,
+)
+
+
+def run(args: argparse.Namespace) -> None:
+    if not args.cache:
+        # Read by app.config, so set before the app modules are imported
+        os.environ["PREDICTION_CACHE_SIZE"] = "0"
+    from app.benchmarks import http_load, micro
+
+    def progress(result):
+        print(json.dumps(result), file=sys.stderr, flush=True)
+
+    results = []
+    if "micro" in args.suites:
+        cases = [c for c in micro.CASES if not args.cases or c in args.cases]
+        results += micro.run(cases, args.sizes, args.min_time, args.min_iterations, args.max_time,
+                             args.rounds, args.seed, progress)
+    if "http" in args.suites:
+        cases = [c for c in http_load.CASES if not args.cases or c in args.cases]
+        results += http_load.run(cases, args.concurrency, args.duration, args.batch_rows,
+                                 rounds=args.rounds, seed=args.seed, progress=progress)
+
+    meta = environment()
+    if args.output:
+        save(args.output, meta, results)
+        print(f"✅ Wrote {len(results)} results to {args.output}")
+    else:
+        print(json.dumps({"meta": meta, "results": results}, indent=2))
+
+
+def compare_files(args: argparse.Namespace) -> None:
+    report = compare(load(args.baseline), load(args.current), args.threshold, tuple(args.metrics))
+    print(json.dumps(report, indent=2) if args.json else format_comparison(report))
+    if report["regressions"]:
+        raise SystemExit(1)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m app.benchmarks", description="Prediction benchmarks")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="run benchmarks and write a result file")
+    run_parser.add_argument("--suites", nargs="+", default=["micro", "http"], choices=["micro", "http"])
+    run_parser.add_argument("--cases", nargs="+", help="only these cases (e.g. predict_batch predict)")
+    run_parser.add_argument("--sizes", type=int, nargs="+", default=[1, 100, 10000, 1000000],
+                            help="rows per call for the micro suite")
+    run_parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32],
+                            help="concurrent clients for the http suite")
+    run_parser.add_argument("--rounds", type=int, default=3,
+                            help="interleaved repetitions of every case (spread = noise)")
+    run_parser.add_argument("--duration", type=float, default=5.0, help="seconds per http case and round")
+    run_parser.add_argument("--batch-rows", type=int, default=1000, help="rows per /predict/batch upload")
+    run_parser.add_argument("--min-time", type=float, default=2.0, help="minimum seconds per micro case and round")
+    run_parser.add_argument("--min-iterations", type=int, default=5)
+    run_parser.add_argument("--max-time", type=float, default=60.0, help="maximum seconds per micro case and round")
+    run_parser.add_argument("--seed", type=int, default=0)
+    run_parser.add_argument("--cache", action="store_true", help="keep the prediction cache on")
+    run_parser.add_argument("--output", help="result file (default: print to stdout)")
+    run_parser.set_defaults(func=run)
+
+    compare_parser = commands.add_parser("compare", help="flag regressions against a baseline")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--threshold", type=float, default=0.20,
+                                help="relative change counted as a regression (default 0.20)")
+    compare_parser.add_argument("--metrics", nargs="+", default=list(DEFAULT_METRICS), choices=list(METRIC_DIRECTIONS),
+                                help="metrics to compare (default: p50_ms rows_per_s)")
+    compare_parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    compare_parser.set_defaults(func=compare_files)
+
+    args = parser.parse_args(argv)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""Synthetic road segments with the schema and marginals of the Kaggle data.
+
+`data/train.csv` is not shipped, so benchmarks (and anything else that needs
+realistic inputs) generate them. Columns and types match the competition
+files (`id`, the 12 input features and optionally `accident_risk` /
+`accident_risk_level`); value distributions follow the summary statistics in
+`notebook/EDA.ipynb`:
+
+- num_lanes 1-4 and speed_limit in {25, 35, 45, 60, 70}, uniform
+- curvature in [0, 1] with two decimals (mean ~0.49, std ~0.27)
+- num_reported_accidents 0-7 (mean ~1.19, std ~0.9)
+- categorical and boolean fields uniform
+
+The optional target is a noisy linear risk score with the signs of the
+EDA's strongest signals (curvature, night lighting, speed, bad weather,
+accident history), cut into three balanced levels. It is meant for
+exercising the training code, not for judging model quality.
+
+    python -m app.benchmarks.data --rows 1000000 --output /tmp/segments.csv --labels
+"""
+import argparse
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from app.config import ROAD_TYPES, LIGHTING_OPTIONS, WEATHER_OPTIONS, TIME_OF_DAY_OPTIONS
+
+SPEED_LIMITS = (25, 35, 45, 60, 70)
+RISK_LEVELS = ("low", "medium", "high")
+
+
+def generate_columns(n: int, seed: int = 0) -> Dict[str, np.ndarray]:
+    """Input feature columns of `n` segments (same names and order as the input schema)."""
+    rng = np.random.default_rng(seed)
+    return {
+        "road_type": rng.choice(np.array(ROAD_TYPES, dtype=object), n),
+        "num_lanes": rng.integers(1, 5, n),
+        "curvature": np.round(rng.beta(1.2, 1.25, n), 2),
+        "speed_limit": rng.choice(np.array(SPEED_LIMITS), n),
+        "lighting": rng.choice(np.array(LIGHTING_OPTIONS, dtype=object), n),
+        "weather": rng.choice(np.array(WEATHER_OPTIONS, dtype=object), n),
+        "road_signs_present": rng.random(n) < 0.5,
+        "public_road": rng.random(n) < 0.5,
+        "time_of_day": rng.choice(np.array(TIME_OF_DAY_OPTIONS, dtype=object), n),
+        "holiday": rng.random(n) < 0.5,
+        "school_season": rng.random(n) < 0.5,
+        "num_reported_accidents": rng.binomial(7, 0.17, n),
+    }
+
+
+def risk_score(columns: Dict[str, np.ndarray], seed: int = 0) -> np.ndarray:
+    """Synthetic `accident_risk` in [0, 1] for generated columns."""
+    rng = np.random.default_rng(seed + 1)
+    score = (
+        0.30 * columns["curvature"]
+        + 0.15 * (columns["lighting"] == "night") + 0.05 * (columns["lighting"] == "dim")
+        + 0.10 * (columns["speed_limit"] >= 60)
+        + 0.08 * (columns["weather"] != "clear")
+        + 0.03 * columns["num_reported_accidents"]
+        + 0.03 * columns["holiday"] - 0.03 * columns["road_signs_present"]
+        + rng.normal(0.0, 0.05, len(columns["curvature"]))
+    )
+    return np.clip(np.round(score, 3), 0.0, 1.0)
+
+
+def generate_frame(n: int, seed: int = 0, labels: bool = False) -> pd.DataFrame:
+    """`n` segments as a DataFrame with an `id` column (and the target if `labels`)."""
+    columns = generate_columns(n, seed)
+    frame = pd.DataFrame({"id": np.arange(n), **columns})
+    if labels:
+        risk = risk_score(columns, seed)
+        frame["accident_risk"] = risk
+        # Tercile cut points give the balanced classes seen in the EDA
+        cuts = np.quantile(risk, [1 / 3, 2 / 3]) if n else [0.0, 0.0]
+        frame["accident_risk_level"] = np.array(RISK_LEVELS, dtype=object)[np.searchsorted(cuts, risk, side="right")]
+    return frame
+
+
+def generate_rows(n: int, seed: int = 0) -> List[dict]:
+    """`n` segments as PredictionInput-shaped dicts (Python scalars)."""
+    frame = pd.DataFrame(generate_columns(n, seed))
+    return frame.to_dict("records")
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Generate synthetic road segments")
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--labels", action="store_true", help="add accident_risk and accident_risk_level")
+    parser.add_argument("--output", required=True, help=".csv or .parquet file")
+    args = parser.parse_args(argv)
+
+    frame = generate_frame(args.rows, args.seed, args.labels)
+    if args.output.endswith(".parquet"):
+        frame.to_parquet(args.output, index=False)
+    else:
+        frame.to_csv(args.output, index=False)
+    print(f"✅ Wrote {len(frame)} rows to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
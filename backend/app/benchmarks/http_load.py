@@ -0,0 +1,123 @@
+"""In-process HTTP load tests of the prediction endpoints.
+
+The FastAPI app runs in the benchmark process (lifespan included) and is
+called through `httpx.ASGITransport`, so requests go through routing,
+validation, the worker pools, micro-batching and response encoding, but
+not through sockets or a separate server. Clients and server share the
+event loop (and the CPU), so rates are lower bounds of a real deployment
+and meant for comparing code changes on the same machine.
+
+Cases, each at every requested concurrency level:
+
+- `POST /api/predict`: a different generated input per request
+- `POST /api/predict/batch`: a CSV upload of `batch_rows` rows
+"""
+import asyncio
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from app.benchmarks.data import generate_frame, generate_rows
+from app.benchmarks.report import summarize
+
+CASES = ("predict", "predict_batch")
+
+# Pause before the next request after a 503 (pool full), as a client would
+REJECTED_BACKOFF_S = 0.05
+
+
+async def _load(client, send: Callable, concurrency: int, duration_s: float,
+                min_requests: int) -> Dict[str, Any]:
+    latencies: List[float] = []
+    statuses: Dict[str, int] = {}
+    deadline = time.perf_counter() + duration_s
+    counter = [0]
+
+    async def worker() -> None:
+        while time.perf_counter() < deadline or counter[0] < min_requests:
+            i = counter[0]
+            counter[0] += 1
+            started = time.perf_counter()
+            response = await send(client, i)
+            if response.status_code == 200:
+                latencies.append(time.perf_counter() - started)
+            key = str(response.status_code)
+            statuses[key] = statuses.get(key, 0) + 1
+            if response.status_code == 503:
+                await asyncio.sleep(REJECTED_BACKOFF_S)
+
+    started = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    return {"latencies": latencies, "elapsed_s": time.perf_counter() - started, "statuses": statuses}
+
+
+async def _run(cases: List[str], concurrency_levels: List[int], duration_s: float, batch_rows: int,
+               min_requests: int, rounds: int, seed: int, progress) -> List[Dict[str, Any]]:
+    import httpx
+    from app.main import app
+    from app.spark_service import spark_service
+
+    inputs = generate_rows(10000, seed)
+    upload = generate_frame(batch_rows, seed).drop(columns="id").to_csv(index=False).encode()
+
+    async def send_single(client, i):
+        return await client.post("/api/predict", json=inputs[i % len(inputs)])
+
+    async def send_batch(client, i):
+        return await client.post("/api/predict/batch", files={"file": ("bench.csv", upload, "text/csv")})
+
+    senders = {"predict": (send_single, 1), "predict_batch": (send_batch, batch_rows)}
+    plan = [(case, concurrency) for case in cases for concurrency in concurrency_levels]
+    runs: Dict[Tuple[str, int], List[Dict[str, Any]]] = {key: [] for key in plan}
+    async with app.router.lifespan_context(app):
+        while not spark_service.is_ready():
+            await asyncio.sleep(0.1)
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=600) as client:
+            for case in cases:
+                # Warm the route, pools and scoring path
+                await _load(client, senders[case][0], 1, 0.0, 3)
+            for _ in range(rounds):
+                for case, concurrency in plan:
+                    runs[case, concurrency].append(
+                        await _load(client, senders[case][0], concurrency, duration_s, min_requests)
+                    )
+
+    results = []
+    for case, concurrency in plan:
+        statuses: Dict[str, int] = {}
+        for run in runs[case, concurrency]:
+            for code, count in run["statuses"].items():
+                statuses[code] = statuses.get(code, 0) + count
+        rows = senders[case][1]
+        result = {
+            "suite": "http", "case": case, "rows": rows, "concurrency": concurrency,
+            **summarize([run["latencies"] for run in runs[case, concurrency]], rows,
+                        [run["elapsed_s"] for run in runs[case, concurrency]]),
+            "requests": sum(statuses.values()),
+            "statuses": statuses,
+        }
+        results.append(result)
+        if progress is not None:
+            progress(result)
+    return results
+
+
+def run(
+    cases: List[str],
+    concurrency_levels: List[int],
+    duration_s: float = 10.0,
+    batch_rows: int = 1000,
+    min_requests: int = 5,
+    rounds: int = 3,
+    seed: int = 0,
+    progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+) -> List[Dict[str, Any]]:
+    """Load each endpoint in `cases` at each concurrency level for `duration_s`.
+
+    The (endpoint, concurrency) runs are repeated `rounds` times, interleaved.
+
+    Latency percentiles cover successful (200) requests; `statuses` counts
+    every response code, e.g. 503 when a worker pool is full (the client
+    then waits `REJECTED_BACKOFF_S` before its next request).
+    """
+    return asyncio.run(_run(cases, concurrency_levels, duration_s, batch_rows, min_requests, rounds, seed, progress))
@@ -0,0 +1,137 @@
+"""Microbenchmarks of the scoring functions, called directly (no HTTP).
+
+Cases, each at every requested size:
+
+- `add_engineered_features`: the Spark feature projection, executed with a
+  no-op write on a cached input DataFrame
+- `predict_single`: one row per call, a different row each time (size 1 only)
+- `predict_batch`: a list of input dicts, as coalesced single predictions
+- `predict_frame`: a validated DataFrame, as batch uploads
+
+Scoring uses the configured `SCORING_BACKEND`. Run it through
+`python -m app.benchmarks`, which turns the prediction cache off so every
+call does the full work.
+"""
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from app.benchmarks.data import generate_columns, generate_rows
+from app.benchmarks.report import summarize
+
+CASES = ("add_engineered_features", "predict_single", "predict_batch", "predict_frame")
+
+
+def measure(fn: Callable[[], Any], min_time_s: float, min_iterations: int, max_time_s: float,
+            warmup: bool = True) -> List[float]:
+    """Latencies of repeated `fn()` calls.
+
+    Runs at least `min_iterations` calls and `min_time_s` seconds, but stops
+    after `max_time_s` (with at least one call) so large sizes stay bounded.
+    """
+    if warmup:
+        fn()
+    latencies: List[float] = []
+    started = time.perf_counter()
+    while True:
+        call_started = time.perf_counter()
+        fn()
+        now = time.perf_counter()
+        latencies.append(now - call_started)
+        elapsed = now - started
+        if elapsed >= max_time_s or (len(latencies) >= min_iterations and elapsed >= min_time_s):
+            return latencies
+
+
+def _features_case(rows: int, seed: int) -> Tuple[Callable[[], Any], Optional[Callable[[], Any]]]:
+    from app.spark_service import spark_service
+
+    schema = spark_service.get_input_schema()
+    columns = generate_columns(rows, seed)
+    sdf = spark_service.spark.createDataFrame(pd.DataFrame({f.name: columns[f.name] for f in schema.fields}), schema)
+    sdf = sdf.cache()
+    sdf.count()
+
+    def run() -> None:
+        spark_service.add_engineered_features(sdf).write.format("noop").mode("overwrite").save()
+
+    return run, sdf.unpersist
+
+
+def _single_case(rows: int, seed: int) -> Tuple[Callable[[], Any], None]:
+    from app.spark_service import spark_service
+
+    inputs = generate_rows(10000, seed)
+    position = [0]
+
+    def run() -> None:
+        spark_service.predict_single(inputs[position[0] % len(inputs)])
+        position[0] += 1
+
+    return run, None
+
+
+def _batch_case(rows: int, seed: int) -> Tuple[Callable[[], Any], None]:
+    from app.spark_service import spark_service
+
+    inputs = generate_rows(rows, seed)
+    return (lambda: spark_service.predict_batch(inputs)), None
+
+
+def _frame_case(rows: int, seed: int) -> Tuple[Callable[[], Any], None]:
+    from app.spark_service import spark_service
+
+    frame = pd.DataFrame(generate_columns(rows, seed))
+    return (lambda: spark_service.predict_frame(frame)), None
+
+
+_BUILDERS = {
+    "add_engineered_features": _features_case,
+    "predict_single": _single_case,
+    "predict_batch": _batch_case,
+    "predict_frame": _frame_case,
+}
+
+
+def run(
+    cases: List[str],
+    sizes: List[int],
+    min_time_s: float = 2.0,
+    min_iterations: int = 5,
+    max_time_s: float = 60.0,
+    rounds: int = 3,
+    seed: int = 0,
+    progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+) -> List[Dict[str, Any]]:
+    """Run the microbenchmark `cases` at `sizes`; one result per (case, size).
+
+    Every case is measured once per round and the rounds are interleaved,
+    so slow drift of the machine shows up as spread rather than as a
+    difference between cases.
+    """
+    from app.spark_service import spark_service
+
+    spark_service.prepare()
+    plan = [(case, rows) for case in cases for rows in ([1] if case == "predict_single" else sizes)]
+    latencies: Dict[Tuple[str, int], List[List[float]]] = {key: [] for key in plan}
+    for round_index in range(rounds):
+        for case, rows in plan:
+            fn, cleanup = _BUILDERS[case](rows, seed)
+            try:
+                # Small inputs are dominated by first-call costs; large ones
+                # run after them with everything already warm
+                warmup = round_index == 0 and rows <= 10000
+                latencies[case, rows].append(measure(fn, min_time_s, min_iterations, max_time_s, warmup))
+            finally:
+                if cleanup is not None:
+                    cleanup()
+
+    results = []
+    for case, rows in plan:
+        result = {"suite": "micro", "case": case, "rows": rows, "concurrency": 1,
+                  **summarize(latencies[case, rows], rows)}
+        results.append(result)
+        if progress is not None:
+            progress(result)
+    return results
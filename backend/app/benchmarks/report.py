@@ -0,0 +1,170 @@
+"""Benchmark result files and regression checks.
+
+A result file is JSON: `{"meta": {...}, "results": [...]}`. Each result
+is one case (`suite`, `case`, `rows`, `concurrency`) with its latency
+percentiles in milliseconds and throughput in rows/second. `compare`
+matches the cases of two files and flags the ones that got slower by
+more than a threshold.
+"""
+import json
+import os
+import platform
+import subprocess
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+# Metric -> +1 if larger is better, -1 if smaller is better
+METRIC_DIRECTIONS = {"p50_ms": -1, "p95_ms": -1, "p99_ms": -1, "mean_ms": -1, "rows_per_s": +1}
+# Compared by default: tails of sub-millisecond calls vary too much between
+# processes to gate on
+DEFAULT_METRICS = ("p50_ms", "rows_per_s")
+
+
+def summarize(rounds: List[List[float]], rows: int, elapsed_s: Optional[List[float]] = None) -> Dict[str, Any]:
+    """Percentiles (ms) and rows/second of call latencies from several rounds.
+
+    Percentiles are over all calls. Throughput is the median over rounds:
+    `rows` per median latency for sequential calls, or rows of all calls per
+    wall time (`elapsed_s` of each round) for concurrent ones. The ranges of
+    the per-round p50, p95 and throughput show the run-to-run noise.
+    """
+    pooled = [t for latencies in rounds for t in latencies]
+    if not pooled:
+        return {"rounds": len(rounds), "iterations": 0, "p50_ms": None, "p95_ms": None, "p99_ms": None,
+                "mean_ms": None, "rows_per_s": None}
+    ms = np.array(pooled) * 1000
+    p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+    round_p50 = [float(np.percentile(latencies, 50)) * 1000 for latencies in rounds if latencies]
+    round_p95 = [float(np.percentile(latencies, 95)) * 1000 for latencies in rounds if latencies]
+    if elapsed_s is None:
+        round_rates = [rows / (p / 1000) for p in round_p50 if p > 0]
+    else:
+        round_rates = [rows * len(latencies) / t for latencies, t in zip(rounds, elapsed_s) if t > 0]
+    return {
+        "rounds": len(rounds),
+        "iterations": len(pooled),
+        "p50_ms": round(float(p50), 3),
+        "p95_ms": round(float(p95), 3),
+        "p99_ms": round(float(p99), 3),
+        "mean_ms": round(float(ms.mean()), 3),
+        "rows_per_s": round(float(np.median(round_rates)), 1) if round_rates else None,
+        "p50_ms_range": [round(min(round_p50), 3), round(max(round_p50), 3)],
+        "p95_ms_range": [round(min(round_p95), 3), round(max(round_p95), 3)],
+        "rows_per_s_range": [round(min(round_rates), 1), round(max(round_rates), 1)] if round_rates else None,
+    }
+
+
+def environment() -> Dict[str, Any]:
+    """What a result depends on besides the code: host, versions, configuration."""
+    import pyspark
+    from app import config
+
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                                text=True, timeout=10).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "git_commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "pyspark": pyspark.__version__,
+        "scoring_backend": config.SCORING_BACKEND,
+        "prediction_cache_size": config.PREDICTION_CACHE_SIZE,
+        "micro_batch_enabled": config.MICRO_BATCH_ENABLED,
+        "single_pool": [config.SINGLE_POOL_WORKERS, config.SINGLE_POOL_QUEUE],
+        "batch_pool": [config.BATCH_POOL_WORKERS, config.BATCH_POOL_QUEUE],
+    }
+
+
+def save(path: str, meta: Dict[str, Any], results: List[Dict[str, Any]]) -> None:
+    with open(path, "w") as f:
+        json.dump({"meta": meta, "results": results}, f, indent=2)
+        f.write("\n")
+
+
+def load(path: str) -> Dict[str, Any]:
+    with open(path) as f:
+        return json.load(f)
+
+
+def _key(result: Dict[str, Any]) -> Tuple:
+    return (result["suite"], result["case"], result.get("rows"), result.get("concurrency"))
+
+
+def _overlap(a: Optional[List[float]], b: Optional[List[float]]) -> bool:
+    return a is not None and b is not None and a[0] <= b[1] and b[0] <= a[1]
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any], threshold: float = 0.20,
+            metrics: Tuple[str, ...] = DEFAULT_METRICS) -> Dict[str, Any]:
+    """Changes of every case present in both runs; regressions exceed `threshold`.
+
+    A change is relative to the baseline (0.20 = 20% slower). A metric only
+    counts as regressed if, in addition, its per-round ranges in the two
+    runs do not overlap; otherwise the change is reported as "noise". Cases
+    only in one of the runs are listed but do not count as regressions.
+    """
+    base = {_key(r): r for r in baseline["results"]}
+    cur = {_key(r): r for r in current["results"]}
+    rows = []
+    for key in [k for k in cur if k in base]:
+        for metric in metrics:
+            direction = METRIC_DIRECTIONS[metric]
+            old, new = base[key].get(metric), cur[key].get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            # Positive "worse" means the metric moved in the bad direction
+            worse = -change if direction > 0 else change
+            status = "regression" if worse > threshold else "improved" if worse < -threshold else "ok"
+            if status != "ok" and _overlap(base[key].get(f"{metric}_range"), cur[key].get(f"{metric}_range")):
+                # Within the round-to-round noise of the two runs
+                status = "noise"
+            rows.append({"suite": key[0], "case": key[1], "rows": key[2], "concurrency": key[3],
+                         "metric": metric, "baseline": old, "current": new,
+                         "change": round(change, 4), "status": status})
+
+    # Results are only comparable on the same host and configuration
+    ignored = {"timestamp", "git_commit"}
+    meta_diff = {
+        k: [baseline["meta"].get(k), current["meta"].get(k)]
+        for k in set(baseline["meta"]) | set(current["meta"])
+        if k not in ignored and baseline["meta"].get(k) != current["meta"].get(k)
+    }
+    return {
+        "threshold": threshold,
+        "comparisons": rows,
+        "regressions": [r for r in rows if r["status"] == "regression"],
+        "only_in_baseline": [list(k) for k in base if k not in cur],
+        "only_in_current": [list(k) for k in cur if k not in base],
+        "environment_differences": meta_diff,
+    }
+
+
+def format_comparison(report: Dict[str, Any]) -> str:
+    """Human-readable table of a `compare` report."""
+    lines = []
+    for k, (old, new) in sorted(report["environment_differences"].items()):
+        lines.append(f"⚠️  {k} differs: baseline {old!r}, current {new!r}")
+    lines.append(f"{'case':<34} {'rows':>8} {'conc':>5} {'metric':<11} {'baseline':>12} {'current':>12} {'change':>8}")
+    for r in report["comparisons"]:
+        flag = {"regression": "  ❌ REGRESSION", "improved": "  ✅ improved",
+                "noise": "  (within noise)"}.get(r["status"], "")
+        lines.append(
+            f"{r['suite'] + '/' + r['case']:<34} {r['rows'] if r['rows'] is not None else '-':>8} "
+            f"{r['concurrency'] if r['concurrency'] is not None else '-':>5} {r['metric']:<11} "
+            f"{r['baseline']:>12g} {r['current']:>12g} {r['change'] * 100:>+7.1f}%{flag}"
+        )
+    for key in report["only_in_baseline"]:
+        lines.append(f"missing from current run: {key}")
+    for key in report["only_in_current"]:
+        lines.append(f"new case (no baseline): {key}")
+    n = len(report["regressions"])
+    lines.append(f"{n} regression(s) beyond {report['threshold'] * 100:g}%" if n else
+                 f"No regressions beyond {report['threshold'] * 100:g}%")
+    return "\n".join(lines)
@@ -0,0 +1,353 @@
+"""Offline bulk scoring on Spark.
+
+Scores whole datasets without going through the API: inputs are read with
+`spark.read` (CSV with a header, or Parquet), validated, given the
+engineered features and run through the saved `PipelineModel`, all as one
+distributed job; no row passes through the Python driver.
+
+    python -m app.bulk_score ../data/test.csv --output scores/            # Parquet
+    python -m app.bulk_score ../data/test.csv --format kaggle --output submission.csv
+    python -m app.bulk_score roads/*.parquet --output scores/ --partition-by road_type \\
+        --master "local[8]" --partitions 64 --probabilities
+
+Parquet output has `id` (when the input has one), `accident_risk_level`,
+`accident_risk`, optionally the class probabilities (`p_low`, ...) and the
+inputs, and `error` for rows that failed validation (their prediction is
+null). The Kaggle format is a single `id,accident_risk` CSV like
+`data/sample_submission.csv`.
+
+`accident_risk` is the expected risk under the predicted class
+probabilities: each class stands for a typical risk value
+(`--class-risk low=0.15 medium=0.35 high=0.6`). With `--class-risk-from
+train.csv` the values are the mean `accident_risk` of each level in the
+training data.
+
+Inputs are split into one task per file block, at least one per core;
+`--partitions` repartitions them (e.g. a few large files on many cores) and
+`--output-files` sets the number of Parquet files. Progress (tasks done of
+the running stages) goes to stderr every `--progress-interval` seconds; the
+summary with rows, invalid rows and rows/second is printed as JSON.
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import threading
+import time
+from enum import Enum
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from app.config import SPARK_APP_NAME
+from app.features import spark_add_features
+from app.model_registry import current_version, model_path
+from app.models import PredictionInput
+from app.validation import REQUIRED_COLUMNS
+
+# Typical accident_risk of each level (class means of the training data,
+# rounded); used for the expected risk unless --class-risk(-from) is given
+CLASS_RISK = {"low": 0.15, "medium": 0.35, "high": 0.6}
+
+# Valid values substituted into invalid rows, so the pipeline never sees
+# nulls or unknown categories; their predictions are discarded
+_PLACEHOLDER = {
+    "road_type": "urban", "num_lanes": 2, "curvature": 0.0, "speed_limit": 45,
+    "lighting": "daylight", "weather": "clear", "road_signs_present": False,
+    "public_road": True, "time_of_day": "morning", "holiday": False,
+    "school_season": False, "num_reported_accidents": 0,
+}
+
+
+def build_session(master: str = "local[*]", driver_memory: str = "4g", max_partition_mb: Optional[int] = None):
+    """SparkSession for bulk jobs (the API's session is tuned for small requests)."""
+    from pyspark.sql import SparkSession
+
+    os.makedirs("/tmp/spark-events", exist_ok=True)
+    builder = (SparkSession.builder
+               .appName(f"{SPARK_APP_NAME}-bulk")
+               .master(master)
+               .config("spark.driver.memory", driver_memory)
+               .config("spark.ui.enabled", "false"))
+    if max_partition_mb:
+        builder = builder.config("spark.sql.files.maxPartitionBytes", f"{max_partition_mb}m")
+    spark = builder.getOrCreate()
+    spark.sparkContext.setLogLevel("WARN")
+    return spark
+
+
+def read_input(spark, paths: List[str], input_format: Optional[str] = None):
+    """Read CSV (with header) or Parquet files; the format defaults to the extension."""
+    fmt = input_format or ("parquet" if paths[0].rstrip("/").endswith(".parquet") else "csv")
+    if fmt == "parquet":
+        return spark.read.parquet(*paths)
+    # Strings only: columns are cast by name, so no inference pass is needed
+    return spark.read.csv(paths, header=True, inferSchema=False)
+
+
+def _field_checks() -> List[Tuple[str, Any, str]]:
+    """(column, condition on the cast column, message) per input field."""
+    from pyspark.sql import functions as F
+
+    checks = []
+    for name in REQUIRED_COLUMNS:
+        info = PredictionInput.model_fields[name]
+        col = F.col(name)
+        if isinstance(info.annotation, type) and issubclass(info.annotation, Enum):
+            values = [m.value for m in info.annotation]
+            checks.append((name, col.isin(*values), f"{name}: must be one of {', '.join(values)}"))
+            continue
+        condition = col.isNotNull()
+        bounds = []
+        for constraint in info.metadata:
+            if getattr(constraint, "ge", None) is not None:
+                condition = condition & (col >= constraint.ge)
+                bounds.append(f">= {constraint.ge}")
+            if getattr(constraint, "le", None) is not None:
+                condition = condition & (col <= constraint.le)
+                bounds.append(f"<= {constraint.le}")
+        kind = info.annotation.__name__
+        message = f"{name}: must be a valid {kind}" + (f" {' and '.join(bounds)}" if bounds else "")
+        checks.append((name, condition, message))
+    return checks
+
+
+def score_dataframe(df, model, labels: List[str], class_risk: Dict[str, float],
+                    probabilities: bool = False, include_input: bool = False,
+                    passthrough: Sequence[str] = ()):
+    """Validated, scored DataFrame plus a `valid` column (no action is run).
+
+    Columns: `id` (if present), the `passthrough` columns unchanged,
+    `accident_risk_level`, `accident_risk`, `p_<label>` (if
+    `probabilities`), the inputs (if `include_input`), `error` and `valid`.
+    Works on streaming DataFrames too.
+    """
+    from pyspark.ml.functions import vector_to_array
+    from pyspark.sql import functions as F
+
+    from app.spark_service import spark_service
+
+    missing = set(REQUIRED_COLUMNS) - set(df.columns)
+    if missing:
+        raise ValueError(f"Missing required columns: {', '.join(sorted(missing))}")
+
+    schema = spark_service.get_input_schema()
+    keep = ["id"] if "id" in df.columns else []
+    df = df.select(*[F.col(c).cast("long") for c in keep], *passthrough,
+                   *[F.col(f.name).try_cast(f.dataType).alias(f.name) for f in schema.fields])
+    keep += list(passthrough)
+
+    checks = _field_checks()
+    valid = F.lit(True)
+    for _, condition, _ in checks:
+        valid = valid & F.coalesce(condition, F.lit(False))
+    error = F.concat_ws("; ", *[F.when(~F.coalesce(condition, F.lit(False)), F.lit(message))
+                                for _, condition, message in checks])
+    df = df.select(*keep, *[f.name for f in schema.fields], valid.alias("valid"),
+                   F.when(~valid, error).alias("error"))
+
+    # Invalid rows get placeholder inputs; their predictions are nulled below
+    model_input = spark_add_features(df.select(
+        *keep, "valid", "error",
+        *[F.when(F.col("valid"), F.col(f.name)).otherwise(F.lit(_PLACEHOLDER[f.name]).cast(f.dataType))
+          .alias(f.name) for f in schema.fields],
+        *[F.col(f.name).alias(f"_raw_{f.name}") for f in schema.fields],
+    ))
+
+    scored = model.transform(model_input)
+    proba = vector_to_array("probability")
+    label_array = F.array(*[F.lit(label) for label in labels])
+    risk = sum(proba[i] * F.lit(class_risk[label]) for i, label in enumerate(labels))
+
+    def when_valid(expr):
+        return F.when(F.col("valid"), expr)
+
+    columns = [*keep,
+               when_valid(F.element_at(label_array, F.col("prediction").cast("int") + 1)).alias("accident_risk_level"),
+               when_valid(risk).alias("accident_risk")]
+    if probabilities:
+        columns += [when_valid(proba[i]).alias(f"p_{label}") for i, label in enumerate(labels)]
+    if include_input:
+        columns += [F.col(f"_raw_{f.name}").alias(f.name) for f in schema.fields]
+    return scored.select(*columns, "error", "valid")
+
+
+def class_risk_from(spark, path: str) -> Dict[str, float]:
+    """Mean `accident_risk` per `accident_risk_level` of a labelled dataset."""
+    from pyspark.sql import functions as F
+
+    df = read_input(spark, [path])
+    rows = (df.groupBy("accident_risk_level")
+              .agg(F.avg(F.col("accident_risk").cast("double")).alias("risk"))
+              .collect())
+    return {r["accident_risk_level"]: float(r["risk"]) for r in rows if r["accident_risk_level"] is not None}
+
+
+class _Progress:
+    """Print the task progress of running stages to stderr every `interval_s`."""
+
+    def __init__(self, spark, interval_s: float):
+        self.tracker = spark.sparkContext.statusTracker()
+        self.interval_s = interval_s
+        self.started = time.perf_counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="bulk-progress", daemon=True)
+
+    def __enter__(self):
+        if self.interval_s > 0:
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval_s):
+            stages = [self.tracker.getStageInfo(i) for i in self.tracker.getActiveStageIds()]
+            stages = [s for s in stages if s is not None]
+            if not stages:
+                continue
+            done = sum(s.numCompletedTasks for s in stages)
+            total = sum(s.numTasks for s in stages)
+            running = sum(s.numActiveTasks for s in stages)
+            elapsed = time.perf_counter() - self.started
+            print(json.dumps({"elapsed_s": round(elapsed, 1), "tasks_done": done, "tasks_total": total,
+                              "tasks_running": running}), file=sys.stderr, flush=True)
+
+
+def _write_single_csv(df, path: str) -> None:
+    """Write `df` as one CSV file at `path` (ordered by id)."""
+    parts = path + ".parts"
+    # The shuffle keeps scoring parallel; only the final sort and write is one task
+    df.repartition(1).sortWithinPartitions("id").write.mode("overwrite").csv(parts, header=True)
+    part = next(f for f in sorted(os.listdir(parts)) if f.startswith("part-"))
+    os.replace(os.path.join(parts, part), path)
+    shutil.rmtree(parts)
+
+
+def run(
+    inputs: List[str],
+    output: str,
+    output_format: str = "parquet",
+    input_format: Optional[str] = None,
+    model_version: Optional[str] = None,
+    class_risk: Optional[Dict[str, float]] = None,
+    class_risk_path: Optional[str] = None,
+    probabilities: bool = False,
+    include_input: bool = False,
+    partitions: Optional[int] = None,
+    output_files: Optional[int] = None,
+    partition_by: Optional[List[str]] = None,
+    overwrite: bool = False,
+    master: str = "local[*]",
+    driver_memory: str = "4g",
+    max_partition_mb: Optional[int] = None,
+    progress_interval_s: float = 10.0,
+) -> Dict[str, Any]:
+    """Score `inputs` into `output`; returns a summary with rows and rows/second.
+
+    `startup_s` is the Spark session and model load; `elapsed_s` and
+    `rows_per_s` cover reading, scoring and writing.
+    """
+    from pyspark.ml import PipelineModel
+    from pyspark.sql import Observation
+    from pyspark.sql import functions as F
+
+    if output_format == "kaggle" and os.path.exists(output) and not overwrite:
+        raise FileExistsError(f"{output} exists (use --overwrite)")
+    started = time.perf_counter()
+    spark = build_session(master, driver_memory, max_partition_mb)
+    version = model_version or current_version()
+    model = PipelineModel.load(model_path(version))
+    labels = list(model.stages[0].labels)
+    risk_values = dict(CLASS_RISK)
+    if class_risk_path:
+        risk_values.update(class_risk_from(spark, class_risk_path))
+    risk_values.update(class_risk or {})
+    unknown = [label for label in labels if label not in risk_values]
+    if unknown:
+        raise ValueError(f"No class risk for {', '.join(unknown)}; pass --class-risk")
+
+    loaded = time.perf_counter()
+    df = read_input(spark, inputs, input_format)
+    input_partitions = df.rdd.getNumPartitions()
+    if partitions:
+        df = df.repartition(partitions)
+    scored = score_dataframe(df, model, labels, risk_values, probabilities, include_input)
+    observation = Observation("bulk_score")
+    scored = scored.observe(observation, F.count(F.lit(1)).alias("rows"),
+                            F.sum((~F.col("valid")).cast("long")).alias("invalid"))
+
+    with _Progress(spark, progress_interval_s):
+        if output_format == "kaggle":
+            if "id" not in scored.columns:
+                raise ValueError("The Kaggle format needs an 'id' column in the input")
+            _write_single_csv(scored.select("id", "accident_risk"), output)
+        else:
+            result = scored.drop("valid")
+            if output_files:
+                result = result.repartition(output_files)
+            writer = result.write.mode("overwrite" if overwrite else "errorifexists")
+            if partition_by:
+                writer = writer.partitionBy(*partition_by)
+            writer.parquet(output)
+    metrics = observation.get
+    elapsed = time.perf_counter() - loaded
+    rows = int(metrics.get("rows") or 0)
+    return {
+        "output": output,
+        "format": output_format,
+        "model_version": version,
+        "rows": rows,
+        "invalid_rows": int(metrics.get("invalid") or 0),
+        "input_partitions": input_partitions,
+        "partitions": partitions or input_partitions,
+        "cores": spark.sparkContext.defaultParallelism,
+        "class_risk": {label: round(risk_values[label], 4) for label in labels},
+        "startup_s": round(loaded - started, 2),
+        "elapsed_s": round(elapsed, 2),
+        "rows_per_s": round(rows / elapsed, 1) if elapsed > 0 else None,
+    }
+
+
+def _parse_class_risk(values: Optional[List[str]]) -> Dict[str, float]:
+    risk = {}
+    for value in values or []:
+        label, _, number = value.partition("=")
+        risk[label] = float(number)
+    return risk
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m app.bulk_score", description="Score datasets on Spark")
+    parser.add_argument("inputs", nargs="+", help="CSV or Parquet files or directories")
+    parser.add_argument("--output", required=True, help="Parquet directory, or CSV file with --format kaggle")
+    parser.add_argument("--format", default="parquet", choices=["parquet", "kaggle"], help="output format")
+    parser.add_argument("--input-format", choices=["csv", "parquet"], help="default: from the file extension")
+    parser.add_argument("--model-version", help="model version (default: the one being served)")
+    parser.add_argument("--class-risk", nargs="+", metavar="LEVEL=RISK",
+                        help="risk value per level for accident_risk (default low=0.15 medium=0.35 high=0.6)")
+    parser.add_argument("--class-risk-from", metavar="TRAIN_CSV",
+                        help="use the mean accident_risk per level of a labelled file")
+    parser.add_argument("--probabilities", action="store_true", help="add p_<level> columns (Parquet)")
+    parser.add_argument("--include-input", action="store_true", help="keep the input columns (Parquet)")
+    parser.add_argument("--partition-by", nargs="+", help="Parquet partition columns, e.g. accident_risk_level")
+    parser.add_argument("--partitions", type=int, help="repartition the input into N tasks")
+    parser.add_argument("--output-files", type=int, help="number of Parquet files per output partition")
+    parser.add_argument("--max-partition-mb", type=int, help="largest input split (spark.sql.files.maxPartitionBytes)")
+    parser.add_argument("--master", default="local[*]", help="Spark master (default: all local cores)")
+    parser.add_argument("--driver-memory", default="4g")
+    parser.add_argument("--overwrite", action="store_true", help="replace an existing output")
+    parser.add_argument("--progress-interval", type=float, default=10.0, help="seconds between progress lines (0: off)")
+    args = parser.parse_args(argv)
+
+    summary = run(
+        args.inputs, args.output, args.format, args.input_format, args.model_version,
+        _parse_class_risk(args.class_risk), args.class_risk_from, args.probabilities, args.include_input,
+        args.partitions, args.output_files, args.partition_by, args.overwrite, args.master,
+        args.driver_memory, args.max_partition_mb, args.progress_interval,
+    )
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
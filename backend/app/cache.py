@@ -0,0 +1,132 @@
+"""In-process LRU/TTL cache of predictions keyed on the canonical input tuple."""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Iterable, Optional, Tuple
+
+import numpy as np
+
+from app.config import PREDICTION_CACHE_SIZE, PREDICTION_CACHE_TTL_S
+
+# Order of the fields in a canonical key (matches SparkService.get_input_schema)
+FEATURE_FIELDS = (
+    "road_type", "num_lanes", "curvature", "speed_limit",
+    "lighting", "weather", "road_signs_present", "public_road",
+    "time_of_day", "holiday", "school_season", "num_reported_accidents",
+)
+
+
+def canonical_key(data: Dict[str, Any]) -> Tuple:
+    """Canonical, hashable form of one input row.
+
+    Types follow the Spark input schema; curvature is rounded to float32 so
+    inputs that Spark would see as the same FloatType share one entry.
+    """
+    return (
+        str(data["road_type"]),
+        int(data["num_lanes"]),
+        float(np.float32(data["curvature"])),
+        int(data["speed_limit"]),
+        str(data["lighting"]),
+        str(data["weather"]),
+        bool(data["road_signs_present"]),
+        bool(data["public_road"]),
+        str(data["time_of_day"]),
+        bool(data["holiday"]),
+        bool(data["school_season"]),
+        int(data["num_reported_accidents"]),
+    )
+
+
+def key_to_input(key: Tuple) -> Dict[str, Any]:
+    """Inverse of `canonical_key`."""
+    return dict(zip(FEATURE_FIELDS, key))
+
+
+class PredictionCache:
+    """Bounded LRU cache with per-entry TTL, keyed per model identity.
+
+    Entries are stored under `(model_tag, key)`, so a lookup only sees values
+    computed by the model it names. Entries of a replaced model are never hit
+    again and age out through LRU eviction and the TTL. While a reload is in
+    flight the old and new models can share the cache without clearing each
+    other's entries.
+    """
+
+    def __init__(self, max_size: int, ttl_s: float):
+        self.max_size = max_size
+        self.ttl_s = ttl_s
+        self._entries: "OrderedDict[Tuple[str, Hashable], Tuple[Any, float]]" = OrderedDict()
+        # Model of the most recent write, reported by `stats`
+        self._model_tag: Optional[str] = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_size > 0
+
+    def get_many(self, keys: Iterable[Hashable], model_tag: str) -> Dict[Hashable, Any]:
+        """Return the cached values for whichever of `keys` are present."""
+        found: Dict[Hashable, Any] = {}
+        if not self.enabled:
+            return found
+        now = time.monotonic()
+        with self._lock:
+            for key in keys:
+                entry = self._entries.get((model_tag, key))
+                if entry is None:
+                    self.misses += 1
+                    continue
+                value, expires = entry
+                if expires < now:
+                    del self._entries[(model_tag, key)]
+                    self.expirations += 1
+                    self.misses += 1
+                    continue
+                self._entries.move_to_end((model_tag, key))
+                found[key] = value
+                self.hits += 1
+        return found
+
+    def get(self, key: Hashable, model_tag: str) -> Optional[Any]:
+        return self.get_many([key], model_tag).get(key)
+
+    def put_many(self, items: Iterable[Tuple[Hashable, Any]], model_tag: str) -> None:
+        if not self.enabled:
+            return
+        expires = time.monotonic() + self.ttl_s
+        with self._lock:
+            self._model_tag = model_tag
+            for key, value in items:
+                self._entries[(model_tag, key)] = (value, expires)
+                self._entries.move_to_end((model_tag, key))
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl_s": self.ttl_s,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "model": self._model_tag,
+            }
+
+
+# Shared cache used by SparkService
+prediction_cache = PredictionCache(PREDICTION_CACHE_SIZE, PREDICTION_CACHE_TTL_S)
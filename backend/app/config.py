@@ -8,6 +8,114 @@ BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__fil
 SPARK_APP_NAME = "TrafficAccidentPredictor"
 MODEL_PATH = os.path.join(BASE_DIR, "traffic_lr_model")
 
+# Versioned models (see app/model_registry.py): directory of versions and a
+# version pinned by the environment (overrides MODELS_DIR/CURRENT)
+MODELS_DIR = os.getenv("MODELS_DIR", os.path.join(BASE_DIR, "models"))
+MODEL_VERSION = os.getenv("MODEL_VERSION", "")
+# Generated rows scored by a model before it starts serving, and seconds
+# between checks of MODELS_DIR/CURRENT for a new version (0 disables)
+MODEL_WARMUP_ROWS = int(os.getenv("MODEL_WARMUP_ROWS", "1000"))
+MODEL_WATCH_INTERVAL_S = float(os.getenv("MODEL_WATCH_INTERVAL_S", "5"))
+# Token required by /api/admin endpoints; when unset they only accept
+# requests from localhost
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+
+# Scoring backend: "numpy" serves predictions from the compiled NumPy scorer,
+# "spark" runs PipelineModel.transform for every request, "remote" sends
+# them to a shared model server (see app/model_server.py).
+SCORING_BACKEND = os.getenv("SCORING_BACKEND", "numpy")
+SCORER_ARTIFACT_PATH = os.getenv("SCORER_ARTIFACT_PATH", MODEL_PATH + ".npz")
+
+# Shared model server for multi-worker serving: socket path, coalescing
+# window, largest coalesced batch and per-request timeout
+MODEL_SERVER_SOCKET = os.getenv("MODEL_SERVER_SOCKET", "/tmp/trafficsafe-model.sock")
+MODEL_SERVER_MAX_WAIT_MS = float(os.getenv("MODEL_SERVER_MAX_WAIT_MS", "2"))
+MODEL_SERVER_MAX_ROWS = int(os.getenv("MODEL_SERVER_MAX_ROWS", "100000"))
+MODEL_SERVER_TIMEOUT_S = float(os.getenv("MODEL_SERVER_TIMEOUT_S", "300"))
+
+# Prediction cache (entries; 0 disables) and entry lifetime in seconds
+PREDICTION_CACHE_SIZE = int(os.getenv("PREDICTION_CACHE_SIZE", "10000"))
+PREDICTION_CACHE_TTL_S = float(os.getenv("PREDICTION_CACHE_TTL_S", "3600"))
+
+# Micro-batching of concurrent single predictions
+MICRO_BATCH_ENABLED = os.getenv("MICRO_BATCH_ENABLED", "true").lower() == "true"
+MICRO_BATCH_MAX_SIZE = int(os.getenv("MICRO_BATCH_MAX_SIZE", "64"))
+MICRO_BATCH_MAX_WAIT_MS = float(os.getenv("MICRO_BATCH_MAX_WAIT_MS", "2"))
+
+# Worker pools for prediction work (kept off the event loop). A pool admits
+# workers + queue calls; anything beyond is rejected with 503 + Retry-After.
+SINGLE_POOL_WORKERS = int(os.getenv("SINGLE_POOL_WORKERS", "2"))
+SINGLE_POOL_QUEUE = int(os.getenv("SINGLE_POOL_QUEUE", "8"))
+SINGLE_DEADLINE_S = float(os.getenv("SINGLE_DEADLINE_S", "5"))
+BATCH_POOL_WORKERS = int(os.getenv("BATCH_POOL_WORKERS", "1"))
+BATCH_POOL_QUEUE = int(os.getenv("BATCH_POOL_QUEUE", "2"))
+BATCH_DEADLINE_S = float(os.getenv("BATCH_DEADLINE_S", "300"))
+RETRY_AFTER_S = int(os.getenv("RETRY_AFTER_S", "2"))
+MICRO_BATCH_MAX_QUEUE = int(os.getenv("MICRO_BATCH_MAX_QUEUE", "1024"))
+
+# Rows per chunk when streaming batch predictions
+STREAM_CHUNK_ROWS = int(os.getenv("STREAM_CHUNK_ROWS", "10000"))
+
+# Asynchronous batch jobs: storage directory, rows scored per chunk,
+# concurrently running jobs, largest results page and seconds a finished
+# job (input, parts and results) is kept (0 keeps them forever)
+JOBS_DIR = os.getenv("JOBS_DIR", os.path.join(BASE_DIR, "jobs"))
+JOB_CHUNK_ROWS = int(os.getenv("JOB_CHUNK_ROWS", "50000"))
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "1"))
+JOB_PAGE_MAX = int(os.getenv("JOB_PAGE_MAX", "1000"))
+JOB_RETENTION_S = float(os.getenv("JOB_RETENTION_S", str(7 * 24 * 3600)))
+
+# Segment registry (see app/segments.py): SQLite database, segments scored
+# per background batch (x 144 conditions each), seconds between checks for
+# stale segments and most segment ids per lookup
+SEGMENTS_DB = os.getenv("SEGMENTS_DB", os.path.join(BASE_DIR, "segments.db"))
+SEGMENT_BATCH_SEGMENTS = int(os.getenv("SEGMENT_BATCH_SEGMENTS", "500"))
+SEGMENT_REFRESH_INTERVAL_S = float(os.getenv("SEGMENT_REFRESH_INTERVAL_S", "5"))
+SEGMENT_LOOKUP_MAX = int(os.getenv("SEGMENT_LOOKUP_MAX", "10000"))
+
+# Drift monitoring (see app/drift.py): recent window length and the number
+# of time buckets it is kept in, largest batch observed row by row (larger
+# ones are sampled), live rows needed before a field gets a status, PSI
+# thresholds of "warning" and "drift", and the reference profile of the
+# default model (versions keep theirs in MODELS_DIR/<version>/)
+DRIFT_ENABLED = os.getenv("DRIFT_ENABLED", "true").lower() == "true"
+DRIFT_WINDOW_S = float(os.getenv("DRIFT_WINDOW_S", "3600"))
+DRIFT_BUCKETS = int(os.getenv("DRIFT_BUCKETS", "12"))
+DRIFT_MAX_BATCH_ROWS = int(os.getenv("DRIFT_MAX_BATCH_ROWS", "100000"))
+DRIFT_MIN_COUNT = int(os.getenv("DRIFT_MIN_COUNT", "100"))
+DRIFT_PSI_WARN = float(os.getenv("DRIFT_PSI_WARN", "0.1"))
+DRIFT_PSI_ALERT = float(os.getenv("DRIFT_PSI_ALERT", "0.25"))
+DRIFT_PROFILE_PATH = os.getenv("DRIFT_PROFILE_PATH", MODEL_PATH + ".drift.json")
+
+# Per-stage latency histograms exported at /metrics
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+# Sampling profiler: requests slower than PROFILE_SLOW_MS (0 disables) are
+# sampled every PROFILE_INTERVAL_MS and the PROFILE_KEEP slowest are written
+# to PROFILE_DIR as folded stacks for a flame graph
+PROFILE_SLOW_MS = float(os.getenv("PROFILE_SLOW_MS", "0"))
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join(BASE_DIR, "profiles"))
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", "20"))
+
+# Traffic capture for replay (see app/capture.py and app/replay.py): paths
+# recorded, log directory, payloads kept ("full") or only hashed ("hash"),
+# largest body stored, bytes per log file before rotating and files kept
+CAPTURE_ENABLED = os.getenv("CAPTURE_ENABLED", "false").lower() == "true"
+CAPTURE_PATHS = [p for p in os.getenv("CAPTURE_PATHS", "/api/predict,/api/predict/batch").split(",") if p]
+CAPTURE_DIR = os.getenv("CAPTURE_DIR", os.path.join(BASE_DIR, "captures"))
+CAPTURE_PAYLOADS = os.getenv("CAPTURE_PAYLOADS", "full")
+CAPTURE_MAX_BODY_BYTES = int(os.getenv("CAPTURE_MAX_BODY_BYTES", str(16 * 1024 * 1024)))
+CAPTURE_ROTATE_BYTES = int(os.getenv("CAPTURE_ROTATE_BYTES", str(64 * 1024 * 1024)))
+CAPTURE_KEEP_FILES = int(os.getenv("CAPTURE_KEEP_FILES", "48"))
+
+# Training (see app/train.py): featurized datasets and search checkpoints
+TRAINING_CACHE_DIR = os.getenv("TRAINING_CACHE_DIR", os.path.join(BASE_DIR, "training_cache"))
+
+# Largest grid accepted by /predict/sweep
+SWEEP_MAX_POINTS = int(os.getenv("SWEEP_MAX_POINTS", "10000"))
+# Largest k accepted by /predict/top
+TOP_K_MAX = int(os.getenv("TOP_K_MAX", "1000"))
+
 # API configuration
 API_PREFIX = "/api"
 CORS_ORIGINS = [
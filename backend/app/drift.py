@@ -0,0 +1,386 @@
+"""Online drift monitoring of live inputs and predictions.
+
+Every scored request updates fixed-size sketches in memory:
+
+- counts per category of the enum and boolean fields
+- fixed-bin histograms of `curvature`, `speed_limit` and
+  `num_reported_accidents`
+- counts per predicted risk level
+
+Every sketch has an extra `other` bin for unknown categories and values
+outside the edges. All sketches share one flat count vector, so a batch
+costs one `np.bincount` over the bin index of every (row, field) pair.
+Batches above DRIFT_MAX_BATCH_ROWS are observed through an evenly spaced
+sample weighted back to their size. A single request appends its dozen bin
+indices to a short buffer that is counted the same way.
+
+Counts are kept since start and in a ring of DRIFT_BUCKETS time buckets
+covering the last DRIFT_WINDOW_S seconds. Memory is (buckets + 1) x ~80
+floats whatever the traffic.
+
+`report()` compares either window with the reference profile of the
+serving model version: the same sketches computed over the training data.
+It gives the population stability index, PSI = sum (q - p) ln(q / p), and
+KL(q || p) per field, where q is live and p is reference. Zero bins are
+smoothed by adding half a count per bin. `app.train` writes the profile
+next to the model. For existing models, build it from their training data:
+
+    python -m app.drift ../data/train.csv --version v2
+
+Counts are per process; with several API workers each reports its own
+traffic.
+"""
+import argparse
+import bisect
+import json
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from app.config import (
+    DRIFT_BUCKETS,
+    DRIFT_ENABLED,
+    DRIFT_MAX_BATCH_ROWS,
+    DRIFT_MIN_COUNT,
+    DRIFT_PSI_ALERT,
+    DRIFT_PSI_WARN,
+    DRIFT_WINDOW_S,
+    LIGHTING_OPTIONS,
+    ROAD_TYPES,
+    TIME_OF_DAY_OPTIONS,
+    WEATHER_OPTIONS,
+)
+from app.summaries import RISK_LEVELS, bin_indices, category_codes
+
+CATEGORICAL_FIELDS = {
+    "road_type": ROAD_TYPES,
+    "lighting": LIGHTING_OPTIONS,
+    "weather": WEATHER_OPTIONS,
+    "time_of_day": TIME_OF_DAY_OPTIONS,
+    "road_signs_present": [False, True],
+    "public_road": [False, True],
+    "holiday": [False, True],
+    "school_season": [False, True],
+}
+
+# Histogram edges; the last bin includes its right edge, as in np.histogram.
+# Curvature is a FloatType in the input schema, so its edges are rounded
+# through float32 like the values they are compared with.
+HISTOGRAM_EDGES = {
+    "curvature": (np.arange(11) / 10).astype(np.float32).astype(np.float64),
+    "speed_limit": np.arange(15, 126, 10),
+    "num_reported_accidents": np.arange(9),
+}
+
+PREDICTION = "prediction"
+OTHER = "other"
+
+
+def _bin_names(name: str) -> List[str]:
+    if name in CATEGORICAL_FIELDS:
+        values = CATEGORICAL_FIELDS[name]
+    elif name in HISTOGRAM_EDGES:
+        edges = HISTOGRAM_EDGES[name].tolist()
+        values = [f"[{a:g}, {b:g})" for a, b in zip(edges[:-1], edges[1:])]
+        values[-1] = values[-1][:-1] + "]"
+    else:
+        values = RISK_LEVELS
+    return [json.dumps(v) if isinstance(v, bool) else v for v in values] + [OTHER]
+
+
+# Sketch layout in the flat count vector: name -> (offset, bin names)
+SKETCHES: Dict[str, tuple] = {}
+_offset = 0
+for _name in [*CATEGORICAL_FIELDS, *HISTOGRAM_EDGES, PREDICTION]:
+    SKETCHES[_name] = (_offset, _bin_names(_name))
+    _offset += len(SKETCHES[_name][1])
+SIZE = _offset
+
+# Single-record lookups: value -> flat index, the `other` bin of every
+# sketch and histogram edges as lists
+_CATEGORY_INDEX = {
+    name: {value: SKETCHES[name][0] + i for i, value in enumerate(values)}
+    for name, values in CATEGORICAL_FIELDS.items()
+}
+_OTHER_INDEX = {name: offset + len(bins) - 1 for name, (offset, bins) in SKETCHES.items()}
+_PREDICTION_INDEX = {value: SKETCHES[PREDICTION][0] + i for i, value in enumerate(RISK_LEVELS)}
+_EDGE_LISTS = {name: edges.tolist() for name, edges in HISTOGRAM_EDGES.items()}
+
+
+def sketch_indices(columns: Dict[str, np.ndarray], labels: np.ndarray) -> np.ndarray:
+    """Flat bin index of every (field, row) pair, shape (fields, rows)."""
+    indices = []
+    for name, values in CATEGORICAL_FIELDS.items():
+        column = columns[name]
+        codes = column.astype(np.int64) if column.dtype == bool else category_codes(column, values)
+        indices.append(codes)
+    for name, edges in HISTOGRAM_EDGES.items():
+        indices.append(bin_indices(columns[name], edges))
+    indices.append(category_codes(labels, RISK_LEVELS))
+    for (offset, bins), codes in zip(SKETCHES.values(), indices):
+        codes[codes < 0] = len(bins) - 1
+        codes += offset
+    return np.stack(indices)
+
+
+def sketch_counts(columns: Dict[str, np.ndarray], labels: np.ndarray) -> np.ndarray:
+    """Counts of a batch in the flat sketch layout."""
+    return np.bincount(sketch_indices(columns, labels).ravel(), minlength=SIZE).astype(np.float64)
+
+
+def _record_indices(data: Dict[str, Any], label: str) -> List[int]:
+    """Flat bin index of every field of one input dict (same bins as `sketch_indices`)."""
+    indices = [lookup.get(data[name], _OTHER_INDEX[name]) for name, lookup in _CATEGORY_INDEX.items()]
+    for name, edges in _EDGE_LISTS.items():
+        value = data[name]
+        if name == "curvature":
+            value = float(np.float32(value))
+        if edges[0] <= value < edges[-1]:
+            indices.append(SKETCHES[name][0] + bisect.bisect_right(edges, value) - 1)
+        elif value == edges[-1]:
+            indices.append(SKETCHES[name][0] + len(edges) - 2)
+        else:
+            indices.append(_OTHER_INDEX[name])
+    indices.append(_PREDICTION_INDEX.get(label, _OTHER_INDEX[PREDICTION]))
+    return indices
+
+
+def divergence(live: np.ndarray, reference: np.ndarray) -> Dict[str, float]:
+    """PSI and KL(live || reference) of two count vectors, half-count smoothed."""
+    q = (live + 0.5) / (live.sum() + 0.5 * len(live))
+    p = (reference + 0.5) / (reference.sum() + 0.5 * len(reference))
+    log_ratio = np.log(q / p)
+    return {"psi": float(((q - p) * log_ratio).sum()), "kl": float((q * log_ratio).sum())}
+
+
+def _status(psi: float) -> str:
+    if psi >= DRIFT_PSI_ALERT:
+        return "drift"
+    if psi >= DRIFT_PSI_WARN:
+        return "warning"
+    return "stable"
+
+
+class DriftMonitor:
+    """Windowed input and prediction sketches of live traffic."""
+
+    # Bin indices of single records buffered before one bincount adds them
+    # (a numpy scalar increment per bin would cost more than the rest)
+    FLUSH_INDICES = 4096
+
+    def __init__(self, enabled: bool, window_s: float, buckets: int, max_batch_rows: int):
+        self.enabled = enabled
+        self.bucket_s = window_s / buckets
+        self.max_batch_rows = max_batch_rows
+        self._lock = threading.Lock()
+        self._buckets = np.zeros((buckets, SIZE), dtype=np.float64)
+        self._bucket_ids = np.full(buckets, -1, dtype=np.int64)
+        self._bucket_id = -1
+        self._pending: List[int] = []
+        self._total = np.zeros(SIZE, dtype=np.float64)
+        self._started = time.time()
+        self._reference: Optional[tuple] = None
+
+    def _flush(self) -> None:
+        """Add buffered single records to the current bucket (caller holds the lock)."""
+        if self._pending:
+            counts = np.bincount(self._pending, minlength=SIZE)
+            self._buckets[self._bucket_id % len(self._bucket_ids)] += counts
+            self._total += counts
+            self._pending = []
+
+    def _advance(self) -> int:
+        """Slot of the current time bucket, cleared when reused (caller holds the lock)."""
+        bucket_id = int(time.time() // self.bucket_s)
+        slot = bucket_id % len(self._bucket_ids)
+        if bucket_id != self._bucket_id:
+            self._flush()
+            self._bucket_id = bucket_id
+            if self._bucket_ids[slot] != bucket_id:
+                self._buckets[slot] = 0
+                self._bucket_ids[slot] = bucket_id
+        return slot
+
+    def observe_record(self, data: Dict[str, Any], label: str) -> None:
+        """Count one validated input dict and its predicted risk level."""
+        if not self.enabled:
+            return
+        indices = _record_indices(data, label)
+        with self._lock:
+            self._advance()
+            self._pending += indices
+            if len(self._pending) >= self.FLUSH_INDICES:
+                self._flush()
+
+    def observe_columns(self, columns: Dict[str, np.ndarray], labels: np.ndarray) -> None:
+        """Count a batch of input columns (see `frame_to_columns`) and their risk levels."""
+        n = len(labels)
+        if not self.enabled or n == 0:
+            return
+        if n > self.max_batch_rows:
+            sample = np.linspace(0, n - 1, self.max_batch_rows).astype(np.int64)
+            columns = {name: values[sample] for name, values in columns.items()}
+            counts = sketch_counts(columns, np.asarray(labels)[sample]) * (n / self.max_batch_rows)
+        else:
+            counts = sketch_counts(columns, labels)
+        with self._lock:
+            self._buckets[self._advance()] += counts
+            self._total += counts
+
+    def reset(self) -> None:
+        with self._lock:
+            self._buckets[:] = 0
+            self._bucket_ids[:] = -1
+            self._bucket_id = -1
+            self._pending = []
+            self._total[:] = 0
+            self._started = time.time()
+
+    def counts(self, window: str = "recent") -> np.ndarray:
+        """Counts of the last DRIFT_WINDOW_S seconds ("recent") or since start ("total")."""
+        with self._lock:
+            self._advance()
+            self._flush()
+            if window == "total":
+                return self._total.copy()
+            return self._buckets[self._bucket_ids > self._bucket_id - len(self._bucket_ids)].sum(axis=0)
+
+    def reference(self) -> Optional[Dict[str, Any]]:
+        """Reference profile of the serving model version, if it has one."""
+        from app.model_registry import drift_profile_path
+        from app.spark_service import spark_service
+
+        version = spark_service.model_version()
+        if version is None:
+            return None
+        path = drift_profile_path(version)
+        try:
+            mtime = os.path.getmtime(path)
+        except OSError:
+            return None
+        if self._reference is None or self._reference[:2] != (path, mtime):
+            with open(path) as f:
+                self._reference = (path, mtime, json.load(f))
+        return self._reference[2]
+
+    def report(self, window: str = "recent") -> Dict[str, Any]:
+        """Live distributions and their divergence from the reference profile."""
+        counts = self.counts(window)
+        reference = self.reference()
+        sketches = {}
+        for name, (offset, bins) in SKETCHES.items():
+            live = counts[offset:offset + len(bins)]
+            n = float(live.sum())
+            entry: Dict[str, Any] = {
+                "count": round(n, 1),
+                "live": dict(zip(bins, np.round(live / max(n, 1e-12), 6).tolist())),
+            }
+            profile = (reference or {}).get("sketches", {}).get(name)
+            if profile is not None and profile["bins"] == bins:
+                expected = np.asarray(profile["counts"], dtype=np.float64)
+                entry["reference"] = dict(zip(bins, np.round(expected / max(expected.sum(), 1e-12), 6).tolist()))
+                if n >= DRIFT_MIN_COUNT:
+                    entry.update({k: round(v, 6) for k, v in divergence(live, expected).items()})
+                    entry["status"] = _status(entry["psi"])
+                else:
+                    entry["status"] = "insufficient_data"
+            elif reference is not None:
+                entry["status"] = "incompatible_reference"
+            sketches[name] = entry
+
+        statuses = [s["status"] for s in sketches.values() if "status" in s]
+        order = ["drift", "warning", "stable", "insufficient_data"]
+        return {
+            "window": window,
+            "window_s": self.bucket_s * len(self._bucket_ids) if window == "recent" else time.time() - self._started,
+            "status": next((s for s in order if s in statuses), "no_reference"),
+            "thresholds": {"psi_warn": DRIFT_PSI_WARN, "psi_alert": DRIFT_PSI_ALERT, "min_count": DRIFT_MIN_COUNT},
+            "reference": None if reference is None else {
+                k: reference.get(k) for k in ("created_at", "inputs", "rows", "model_uid")
+            },
+            "sketches": sketches,
+        }
+
+
+def build_profile(frames, scorer, inputs: List[str]) -> Dict[str, Any]:
+    """Reference profile of input DataFrames, with predictions from a NumPy scorer.
+
+    Invalid rows are skipped, like the API would reject them.
+    """
+    from app.numpy_scorer import frame_to_columns
+    from app.validation import validate_frame
+
+    counts = np.zeros(SIZE, dtype=np.float64)
+    rows = 0
+    for frame in frames:
+        clean = validate_frame(frame).clean
+        if clean.empty:
+            continue
+        columns = frame_to_columns(clean)
+        proba = scorer.predict_proba_columns(columns)
+        # Extra model classes map to "medium", as in SparkService.labels_for
+        table = np.array(list(scorer.labels) + ["medium"] * (proba.shape[1] - len(scorer.labels)), dtype=object)
+        labels = table[proba.argmax(axis=1)]
+        counts += sketch_counts(columns, labels)
+        rows += len(clean)
+    return {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "inputs": inputs,
+        "rows": rows,
+        "model_uid": scorer.model_uid,
+        "sketches": {
+            name: {"bins": bins, "counts": counts[offset:offset + len(bins)].tolist()}
+            for name, (offset, bins) in SKETCHES.items()
+        },
+    }
+
+
+def profile_files(paths: List[str], scorer, chunk_rows: int = 100000) -> Dict[str, Any]:
+    """Reference profile of CSV/Parquet/Arrow files (see `build_profile`)."""
+    from app.batch_formats import detect_format, iter_batch_frames
+
+    def frames():
+        for path in paths:
+            with open(path, "rb") as f:
+                fmt = detect_format(f, path, None)
+            yield from iter_batch_frames(path, fmt, chunk_rows)[1]
+
+    return build_profile(frames(), scorer, [os.path.abspath(p) for p in paths])
+
+
+def write_profile(profile: Dict[str, Any], path: str) -> None:
+    with open(path + ".tmp", "w") as f:
+        json.dump(profile, f, indent=2)
+    os.replace(path + ".tmp", path)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    from app.model_registry import current_version, drift_profile_path, model_path
+    from app.spark_service import spark_service
+
+    parser = argparse.ArgumentParser(
+        prog="python -m app.drift", description="Build the drift reference profile of a model version"
+    )
+    parser.add_argument("inputs", nargs="+", help="training data (CSV, Parquet or Arrow files)")
+    parser.add_argument("--version", help="model version (default: the one that should be served)")
+    parser.add_argument("--output", help="profile path (default: next to the model)")
+    args = parser.parse_args(argv)
+
+    version = args.version or current_version()
+    scorer = spark_service._load_scorer(version, model_path(version))
+    profile = profile_files(args.inputs, scorer)
+    output = args.output or drift_profile_path(version)
+    write_profile(profile, output)
+    print(f"✅ Drift profile of {profile['rows']} rows written to {output}")
+
+
+# Shared monitor, fed by the prediction routes and SparkService
+drift_monitor = DriftMonitor(DRIFT_ENABLED, DRIFT_WINDOW_S, DRIFT_BUCKETS, DRIFT_MAX_BATCH_ROWS)
+
+
+if __name__ == "__main__":
+    main()
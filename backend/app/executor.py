@@ -0,0 +1,135 @@
+"""Bounded thread pools for running Spark/scoring work off the event loop.
+
+Each pool admits at most `max_workers + max_queue` calls at a time. Beyond
+that the request is rejected immediately with 503 and a Retry-After header
+instead of piling up behind a long job. Every call also carries a deadline:
+when it passes the caller gets 504, a not-yet-started call is cancelled and a
+running Spark job is cancelled through its job tag.
+"""
+import asyncio
+import contextvars
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from fastapi import HTTPException
+
+from app.config import (
+    SINGLE_POOL_WORKERS,
+    SINGLE_POOL_QUEUE,
+    SINGLE_DEADLINE_S,
+    BATCH_POOL_WORKERS,
+    BATCH_POOL_QUEUE,
+    BATCH_DEADLINE_S,
+    RETRY_AFTER_S,
+)
+from app.metrics import metrics
+from app.spark_service import spark_service
+
+
+class Overloaded(HTTPException):
+    """Raised when a pool has no free worker or queue slot."""
+
+    def __init__(self, pool: str, retry_after: int):
+        super().__init__(
+            status_code=503,
+            detail=f"Server busy: too many pending {pool} predictions, retry later",
+            headers={"Retry-After": str(retry_after)},
+        )
+
+
+class DeadlineExceeded(HTTPException):
+    """Raised when a call does not finish before its deadline."""
+
+    def __init__(self, pool: str, timeout: float):
+        super().__init__(
+            status_code=504,
+            detail=f"{pool.capitalize()} prediction did not finish within {timeout:g}s",
+        )
+
+
+class SparkExecutor:
+    """Thread pool with admission control and per-call deadlines."""
+
+    def __init__(self, name: str, max_workers: int, max_queue: int,
+                 deadline_s: float, retry_after_s: int = RETRY_AFTER_S):
+        self.name = name
+        self.max_workers = max_workers
+        self.capacity = max_workers + max_queue
+        self.deadline_s = deadline_s
+        self.retry_after_s = retry_after_s
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"predict-{name}")
+        self._lock = threading.Lock()
+        self._pending = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.completed = 0
+
+    def _release(self, _future) -> None:
+        # Runs when the work really ends, so abandoned calls keep their slot
+        with self._lock:
+            self._pending -= 1
+            self.completed += 1
+
+    @staticmethod
+    def call_tagged(tag: str, fn: Callable, *args: Any) -> Any:
+        """Run `fn(*args)` on the current thread with its Spark jobs tagged `tag`.
+
+        For background workers that manage their own threads; cancel with
+        `cancelJobsWithTag(tag)`.
+        """
+        with metrics.worker_thread():
+            spark = spark_service._spark
+            if spark is None:
+                return fn(*args)
+            sc = spark.sparkContext
+            sc.setInterruptOnCancel(True)
+            sc.addJobTag(tag)
+            try:
+                return fn(*args)
+            finally:
+                sc.removeJobTag(tag)
+
+    async def run(self, fn: Callable, *args: Any, timeout: Optional[float] = None) -> Any:
+        """Run `fn(*args)` in the pool, enforcing admission and the deadline."""
+        with self._lock:
+            if self._pending >= self.capacity:
+                self.rejected += 1
+                raise Overloaded(self.name, self.retry_after_s)
+            self._pending += 1
+
+        timeout = self.deadline_s if timeout is None else timeout
+        tag = f"{self.name}-{uuid.uuid4().hex}"
+        # Run in a copy of the caller's context so stage timings reach its trace
+        context = contextvars.copy_context()
+        future = self._pool.submit(context.run, self.call_tagged, tag, fn, *args)
+        future.add_done_callback(self._release)
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+        except asyncio.TimeoutError:
+            with self._lock:
+                self.timed_out += 1
+            # Not started yet: dropped by wait_for; running: stop its Spark jobs
+            if spark_service._spark is not None and not future.done():
+                spark_service._spark.sparkContext.cancelJobsWithTag(tag)
+            raise DeadlineExceeded(self.name, timeout)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "in_flight": self._pending,
+                "capacity": self.capacity,
+                "workers": self.max_workers,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "timed_out": self.timed_out,
+            }
+
+    def shutdown(self) -> None:
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+# Separate pools so a large upload cannot starve interactive predictions
+single_executor = SparkExecutor("single", SINGLE_POOL_WORKERS, SINGLE_POOL_QUEUE, SINGLE_DEADLINE_S)
+batch_executor = SparkExecutor("batch", BATCH_POOL_WORKERS, BATCH_POOL_QUEUE, BATCH_DEADLINE_S)
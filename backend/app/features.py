@@ -0,0 +1,278 @@
+"""Engineered features, declared once and compiled for Spark, pandas and NumPy.
+
+`FEATURES` lists every derived column of the model as a small expression
+over the raw inputs or earlier features. The same list is compiled to:
+
+- a single Spark `select` projection (`spark_add_features`), instead of one
+  `withColumn` (and one analyzer pass) per feature,
+- a pandas implementation (`pandas_add_features`),
+- a NumPy implementation over column arrays (`numpy_add_features`).
+
+Compiled plans are cached per input schema, so repeated calls only apply
+them. Result types follow Spark: comparisons and casts give int, a product
+of ints is int and a product with the FloatType curvature is a double.
+
+    python -m app.features --check 20000    # compare the three backends
+    python -m app.features --bench          # planning overhead per call
+"""
+import argparse
+import json
+import time
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+
+class Feature(NamedTuple):
+    """One engineered column: `name = op(*args)`.
+
+    Ops: "eq" (column == value), "isin" (column in values),
+    "ge" (column >= value), "int" (boolean column as 0/1),
+    "mul" (product of two columns or features).
+    """
+    name: str
+    op: str
+    args: Tuple[Any, ...]
+
+
+FEATURES: List[Feature] = [
+    Feature("is_night", "eq", ("lighting", "night")),
+    Feature("bad_weather", "isin", ("weather", ("foggy", "rainy"))),
+    Feature("high_curvature", "ge", ("curvature", 0.5)),
+    Feature("high_speed", "ge", ("speed_limit", 60)),
+    Feature("night_high_curvature", "mul", ("is_night", "high_curvature")),
+    Feature("night_high_speed", "mul", ("is_night", "high_speed")),
+    Feature("high_curvature_bad_weather", "mul", ("high_curvature", "bad_weather")),
+    Feature("curvature_x_night", "mul", ("curvature", "is_night")),
+    Feature("speed_x_night", "mul", ("speed_limit", "is_night")),
+    Feature("road_signs_present_i", "int", ("road_signs_present",)),
+    Feature("public_road_i", "int", ("public_road",)),
+    Feature("holiday_i", "int", ("holiday",)),
+    Feature("school_season_i", "int", ("school_season",)),
+]
+
+FEATURE_NAMES = [f.name for f in FEATURES]
+
+
+# Array expressions (NumPy arrays and pandas Series support the same operators)
+
+def _array_op(feature: Feature) -> Callable[[Dict[str, Any]], Any]:
+    op, args = feature.op, feature.args
+    if op == "eq":
+        return lambda cols: (cols[args[0]] == args[1]).astype(np.int64)
+    if op == "isin":
+        values = list(args[1])
+        return lambda cols: _isin(cols[args[0]], values).astype(np.int64)
+    if op == "ge":
+        return lambda cols: (cols[args[0]] >= args[1]).astype(np.int64)
+    if op == "int":
+        return lambda cols: cols[args[0]].astype(np.int64)
+    if op == "mul":
+        return lambda cols: _mul(cols[args[0]], cols[args[1]])
+    raise ValueError(f"Unknown feature op '{op}' for {feature.name}")
+
+
+def _isin(values, candidates: List[Any]):
+    if isinstance(values, pd.Series):
+        return values.isin(candidates)
+    return np.isin(values, candidates)
+
+
+def _mul(a, b):
+    # Spark widens FloatType * IntegerType to DoubleType; the float32 value
+    # is converted exactly, so the product matches Spark bit for bit
+    if any(np.dtype(x.dtype).kind == "f" for x in (a, b)):
+        return a.astype(np.float64) * b.astype(np.float64)
+    return a * b
+
+
+_array_plan: Optional[List[Tuple[str, Callable]]] = None
+
+
+def _compiled_array_plan() -> List[Tuple[str, Callable]]:
+    global _array_plan
+    if _array_plan is None:
+        _array_plan = [(f.name, _array_op(f)) for f in FEATURES]
+    return _array_plan
+
+
+def numpy_add_features(columns: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    """Add the engineered features to a dict of column arrays."""
+    cols = dict(columns)
+    for name, fn in _compiled_array_plan():
+        cols[name] = fn(cols)
+    return cols
+
+
+def pandas_add_features(df: pd.DataFrame) -> pd.DataFrame:
+    """Return `df` with the engineered feature columns appended."""
+    cols: Dict[str, Any] = {name: df[name] for name in df.columns}
+    new = {}
+    for name, fn in _compiled_array_plan():
+        cols[name] = new[name] = fn(cols)
+    return pd.concat([df, pd.DataFrame(new, index=df.index)], axis=1)
+
+
+# Spark projection
+
+_spark_plans: Dict[str, list] = {}
+
+
+def _spark_columns(schema) -> list:
+    """Feature expressions for an input schema, built once per schema."""
+    from pyspark.sql import functions as F
+
+    key = schema.json()
+    plan = _spark_plans.get(key)
+    if plan is None:
+        exprs: Dict[str, Any] = {}
+
+        def ref(name: str):
+            # Earlier features are inlined, since a select cannot see its own aliases
+            return exprs[name] if name in exprs else F.col(name)
+
+        for feature in FEATURES:
+            op, args = feature.op, feature.args
+            if op == "eq":
+                expr = (F.col(args[0]) == args[1]).cast("int")
+            elif op == "isin":
+                expr = F.col(args[0]).isin(*args[1]).cast("int")
+            elif op == "ge":
+                expr = (F.col(args[0]) >= args[1]).cast("int")
+            elif op == "int":
+                expr = F.col(args[0]).cast("int")
+            elif op == "mul":
+                expr = ref(args[0]) * ref(args[1])
+                if all(a in exprs for a in args):
+                    expr = expr.cast("int")
+            else:
+                raise ValueError(f"Unknown feature op '{op}' for {feature.name}")
+            exprs[feature.name] = expr
+        plan = [F.col("*")] + [exprs[f.name].alias(f.name) for f in FEATURES]
+        _spark_plans[key] = plan
+    return plan
+
+
+def spark_add_features(df):
+    """Add the engineered features to a Spark DataFrame in one `select`."""
+    return df.select(*_spark_columns(df.schema))
+
+
+# Checks and benchmarks
+
+def _legacy_spark_add_features(df):
+    """The previous chained-withColumn implementation (benchmark baseline)."""
+    from pyspark.sql import functions as F
+
+    return (
+        df
+        .withColumn("is_night", (F.col("lighting") == "night").cast("int"))
+        .withColumn("bad_weather", (F.col("weather").isin("foggy", "rainy")).cast("int"))
+        .withColumn("high_curvature", (F.col("curvature") >= 0.5).cast("int"))
+        .withColumn("high_speed", (F.col("speed_limit") >= 60).cast("int"))
+        .withColumn("night_high_curvature", (F.col("is_night") * F.col("high_curvature")).cast("int"))
+        .withColumn("night_high_speed", (F.col("is_night") * F.col("high_speed")).cast("int"))
+        .withColumn("high_curvature_bad_weather", (F.col("high_curvature") * F.col("bad_weather")).cast("int"))
+        .withColumn("curvature_x_night", F.col("curvature") * F.col("is_night"))
+        .withColumn("speed_x_night", F.col("speed_limit") * F.col("is_night"))
+        .withColumn("road_signs_present_i", F.col("road_signs_present").cast("int"))
+        .withColumn("public_road_i", F.col("public_road").cast("int"))
+        .withColumn("holiday_i", F.col("holiday").cast("int"))
+        .withColumn("school_season_i", F.col("school_season").cast("int"))
+    )
+
+
+# Spark result type -> NumPy dtype the array backends must produce
+_SPARK_DTYPES = {"IntegerType()": np.int64, "DoubleType()": np.float64}
+
+
+def check_backends(n: int = 20000, seed: int = 0) -> Dict[str, Any]:
+    """Compare the Spark, pandas and NumPy features on generated inputs."""
+    from app.numpy_scorer import sample_inputs, rows_to_columns
+    from app.spark_service import spark_service
+
+    columns = rows_to_columns(sample_inputs(n, seed))
+    schema = spark_service.get_input_schema()
+    fields = [f.name for f in schema.fields]
+    np_cols = numpy_add_features(columns)
+    pd_cols = pandas_add_features(pd.DataFrame({f: columns[f] for f in fields}))
+
+    sdf = spark_service.spark.createDataFrame(pd.DataFrame({f: columns[f] for f in fields}), schema)
+    spark_out = spark_add_features(sdf)
+    legacy_out = _legacy_spark_add_features(sdf)
+    spark_types = {f.name: str(f.dataType) for f in spark_out.schema.fields}
+    legacy_types = {f.name: str(f.dataType) for f in legacy_out.schema.fields}
+    spark_cols = spark_out.select(*FEATURE_NAMES).toPandas()
+    legacy_cols = legacy_out.select(*FEATURE_NAMES).toPandas()
+
+    mismatches = []
+    for name in FEATURE_NAMES:
+        expected_dtype = _SPARK_DTYPES[spark_types[name]]
+        reference = spark_cols[name].to_numpy()
+        checks = {
+            "legacy_type": legacy_types[name] == spark_types[name],
+            "legacy_values": np.array_equal(legacy_cols[name].to_numpy(), reference),
+            "numpy_dtype": np_cols[name].dtype == expected_dtype,
+            "numpy_values": np.array_equal(np_cols[name], reference),
+            "pandas_dtype": pd_cols[name].dtype == expected_dtype,
+            "pandas_values": np.array_equal(pd_cols[name].to_numpy(), reference),
+        }
+        failed = [k for k, ok in checks.items() if not ok]
+        if failed:
+            mismatches.append({"feature": name, "spark_type": spark_types[name], "failed": failed})
+    return {"rows": n, "features": len(FEATURE_NAMES), "mismatches": mismatches}
+
+
+def bench_planning(calls: int = 200) -> Dict[str, Any]:
+    """Per-call cost of adding features and planning one prediction."""
+    from app.numpy_scorer import sample_inputs, rows_to_columns
+    from app.spark_service import spark_service
+
+    schema = spark_service.get_input_schema()
+    fields = [f.name for f in schema.fields]
+    columns = rows_to_columns(sample_inputs(1))
+    sdf = spark_service.spark.createDataFrame(pd.DataFrame({f: columns[f] for f in fields}), schema)
+    model = spark_service.model
+
+    def time_per_call(fn) -> float:
+        fn()  # warm-up
+        start = time.perf_counter()
+        for _ in range(calls):
+            fn()
+        return (time.perf_counter() - start) / calls * 1000
+
+    def planned(add_features):
+        # Build the full prediction plan and run the analyzer/optimizer on it
+        out = model.transform(add_features(sdf)).select("prediction")
+        out._jdf.queryExecution().optimizedPlan()
+
+    report = {
+        "calls": calls,
+        "withColumn_chain_ms": time_per_call(lambda: _legacy_spark_add_features(sdf)),
+        "select_ms": time_per_call(lambda: spark_add_features(sdf)),
+        "predict_plan_withColumn_chain_ms": time_per_call(lambda: planned(_legacy_spark_add_features)),
+        "predict_plan_select_ms": time_per_call(lambda: planned(spark_add_features)),
+    }
+    return {k: round(v, 3) if isinstance(v, float) else v for k, v in report.items()}
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Check and time the engineered feature backends")
+    parser.add_argument("--check", type=int, default=0, metavar="N",
+                        help="compare Spark, pandas and NumPy features on N generated rows")
+    parser.add_argument("--bench", action="store_true", help="time planning overhead per call")
+    parser.add_argument("--calls", type=int, default=200)
+    args = parser.parse_args(argv)
+
+    if args.check:
+        report = check_backends(args.check)
+        print(json.dumps(report))
+        if report["mismatches"]:
+            raise SystemExit(1)
+    if args.bench:
+        print(json.dumps(bench_planning(args.calls)))
+
+
+if __name__ == "__main__":
+    main()
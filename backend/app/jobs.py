@@ -0,0 +1,536 @@
+"""Asynchronous, disk-backed batch scoring jobs.
+
+Each job lives in its own directory under JOBS_DIR:
+
+- `input`: the uploaded file, as received
+- `job.json`: state and progress, rewritten atomically after every chunk
+- `parts/part-NNNNN.parquet`: scored rows of one chunk
+- `results.parquet`: all parts merged, written when the job completes
+
+A worker reads the input `JOB_CHUNK_ROWS` rows at a time, validates and
+scores each chunk with `SparkService.predict_frame` and writes its part
+before recording the chunk as done. Unfinished jobs are picked up again on
+startup and skip the chunks that already have results.
+
+When several API worker processes share JOBS_DIR, each job is run by the
+process that holds the lock on its `lock` file; the others read its state
+from `job.json` and ask it to stop by creating a `cancel` file.
+
+Finished jobs are deleted `JOB_RETENTION_S` seconds after they finished, by
+a background thread of each process (under the job's lock, so a job being
+resumed elsewhere is left alone).
+"""
+import fcntl
+import json
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, BinaryIO, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from fastapi import HTTPException
+
+from app.batch_formats import detect_format, iter_batch_frames
+from app.config import JOBS_DIR, JOB_CHUNK_ROWS, JOB_RETENTION_S, JOB_WORKERS
+from app.executor import SparkExecutor
+from app.spark_service import spark_service
+from app.streaming import json_safe
+from app.validation import REQUIRED_COLUMNS, validate_frame
+
+# Columns of the result parts. Inputs hold the coerced values of valid rows;
+# invalid rows keep their raw values as JSON in `raw_input`.
+RESULT_SCHEMA = pa.schema([
+    ("row", pa.int64()),
+    ("road_type", pa.string()),
+    ("num_lanes", pa.int64()),
+    ("curvature", pa.float64()),
+    ("speed_limit", pa.int64()),
+    ("lighting", pa.string()),
+    ("weather", pa.string()),
+    ("road_signs_present", pa.bool_()),
+    ("public_road", pa.bool_()),
+    ("time_of_day", pa.string()),
+    ("holiday", pa.bool_()),
+    ("school_season", pa.bool_()),
+    ("num_reported_accidents", pa.int64()),
+    ("accident_risk_level", pa.string()),
+    ("error", pa.string()),
+    ("raw_input", pa.string()),
+])
+
+ACTIVE_STATES = ("queued", "running")
+
+_JOB_ID = re.compile(r"^[0-9a-f]{32}$")
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _expired(state: Dict[str, Any], cutoff: float) -> bool:
+    """True for a finished job that finished before `cutoff` (epoch seconds)."""
+    if state["status"] in ACTIVE_STATES or not state.get("finished_at"):
+        return False
+    return datetime.fromisoformat(state["finished_at"]).timestamp() < cutoff
+
+
+def score_chunk(frame: pd.DataFrame, offset: int) -> Tuple[pa.Table, Dict[str, int], int]:
+    """Validate and score one chunk.
+
+    Returns the result table, the risk level counts and the error count.
+    """
+    n = len(frame)
+    validation = validate_frame(frame, offset=offset)
+    labels = np.full(n, None, dtype=object)
+    if len(validation.clean):
+        labels[validation.clean.index] = spark_service.predict_frame(validation.clean)
+
+    # Scatter the valid rows back to their positions, null elsewhere
+    positions = np.full(n, -1, dtype=np.int64)
+    positions[validation.clean.index] = np.arange(len(validation.clean))
+    take = pa.array(positions, mask=positions < 0)
+
+    errors = np.full(n, None, dtype=object)
+    raw = np.full(n, None, dtype=object)
+    if validation.errors:
+        rows = frame.iloc[list(validation.errors)].to_dict('records')
+        for (idx, message), row in zip(validation.errors.items(), rows):
+            errors[idx] = message
+            raw[idx] = json.dumps(json_safe(row), default=str)
+
+    columns = {"row": pa.array(np.arange(offset, offset + n, dtype=np.int64))}
+    for name in REQUIRED_COLUMNS:
+        values = validation.clean[name].to_numpy()
+        field_type = RESULT_SCHEMA.field(name).type
+        columns[name] = pa.array(values, type=field_type).take(take)
+    columns["accident_risk_level"] = pa.array(labels, type=pa.string())
+    columns["error"] = pa.array(errors, type=pa.string())
+    columns["raw_input"] = pa.array(raw, type=pa.string())
+    table = pa.table(columns, schema=RESULT_SCHEMA)
+
+    levels, counts = np.unique(labels[validation.valid_mask].astype(str), return_counts=True)
+    return table, dict(zip(levels.tolist(), counts.tolist())), len(validation.errors)
+
+
+def result_rows(table: pa.Table) -> List[Dict[str, Any]]:
+    """Convert result rows to PredictionResult-shaped dicts."""
+    results = []
+    for row in table.to_pylist():
+        if row["error"] is None:
+            input_data = {name: row[name] for name in REQUIRED_COLUMNS}
+        else:
+            input_data = json.loads(row["raw_input"])
+        results.append({
+            "accident_risk_level": row["accident_risk_level"],
+            "input_data": input_data,
+            "error": row["error"],
+        })
+    return results
+
+
+class JobManager:
+    """Runs batch jobs in a small thread pool and keeps their state on disk."""
+
+    def __init__(self, root: str, chunk_rows: int, workers: int, retention_s: float = 0.0):
+        self.root = root
+        self.chunk_rows = chunk_rows
+        self.workers = workers
+        self.retention_s = retention_s
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        self._cancel: Dict[str, threading.Event] = {}
+        self._claims: Dict[str, int] = {}
+        self._stopping = threading.Event()
+
+    # Storage
+
+    def _dir(self, job_id: str) -> str:
+        return os.path.join(self.root, job_id)
+
+    def _part_path(self, job_id: str, chunk: int) -> str:
+        return os.path.join(self._dir(job_id), "parts", f"part-{chunk:05d}.parquet")
+
+    def _results_path(self, job_id: str) -> str:
+        return os.path.join(self._dir(job_id), "results.parquet")
+
+    def _save(self, state: Dict[str, Any]) -> None:
+        path = os.path.join(self._dir(state["job_id"]), "job.json")
+        with open(path + ".tmp", "w") as f:
+            json.dump(state, f)
+        os.replace(path + ".tmp", path)
+
+    def _read(self, job_id: str) -> Optional[Dict[str, Any]]:
+        path = os.path.join(self._dir(job_id), "job.json")
+        if not _JOB_ID.match(job_id) or not os.path.exists(path):
+            return None
+        with open(path) as f:
+            return json.load(f)
+
+    def _lock_file(self, job_id: str) -> Optional[int]:
+        """Take the job's file lock; None if another process holds it."""
+        try:
+            fd = os.open(os.path.join(self._dir(job_id), "lock"), os.O_RDWR | os.O_CREAT, 0o644)
+        except FileNotFoundError:
+            # Deleted (expired) meanwhile
+            raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return None
+        return fd
+
+    def _claim(self, job_id: str) -> bool:
+        """Lock a job for this process; False if another process runs it."""
+        with self._lock:
+            if job_id in self._claims:
+                return True
+            fd = self._lock_file(job_id)
+            if fd is None:
+                return False
+            self._claims[job_id] = fd
+            return True
+
+    def _release(self, job_id: str) -> None:
+        with self._lock:
+            fd = self._claims.pop(job_id, None)
+        if fd is not None:
+            os.close(fd)
+
+    def _cancel_path(self, job_id: str) -> str:
+        return os.path.join(self._dir(job_id), "cancel")
+
+    def _update(self, job_id: str, **changes: Any) -> Dict[str, Any]:
+        with self._lock:
+            state = self._jobs[job_id]
+            state.update(changes)
+            self._save(state)
+            return dict(state)
+
+    # Lifecycle
+
+    def start(self) -> None:
+        """Load existing jobs and resume the unfinished ones."""
+        os.makedirs(self.root, exist_ok=True)
+        self._stopping = threading.Event()
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="batch-job")
+        resumed = 0
+        for job_id in sorted(os.listdir(self.root)):
+            state = self._read(job_id)
+            if state is None:
+                continue
+            self._jobs[job_id] = state
+            # Jobs locked by another worker process are left to it
+            if state["status"] in ACTIVE_STATES and self._claim(job_id):
+                self._enqueue(job_id)
+                resumed += 1
+        if resumed:
+            print(f"♻️  Resuming {resumed} batch job(s)")
+        if self.retention_s > 0:
+            threading.Thread(target=self._expire_loop, name="batch-job-expiry", daemon=True).start()
+
+    def shutdown(self) -> None:
+        """Stop after the current chunks; unfinished jobs resume on next start."""
+        self._stopping.set()
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def _enqueue(self, job_id: str) -> None:
+        # The caller holds the job's claim; _run releases it
+        self._cancel[job_id] = threading.Event()
+        self._update(job_id, status="queued", finished_at=None)
+        self._pool.submit(self._run, job_id)
+
+    # API
+
+    def submit(self, upload: BinaryIO, filename: Optional[str], content_type: Optional[str]) -> Dict[str, Any]:
+        """Store an upload as a new job and queue it; raises 400 for bad files."""
+        input_format = detect_format(upload, filename, content_type)
+        job_id = uuid.uuid4().hex
+        job_dir = self._dir(job_id)
+        os.makedirs(os.path.join(job_dir, "parts"))
+        try:
+            input_path = os.path.join(job_dir, "input")
+            with open(input_path, "wb") as f:
+                shutil.copyfileobj(upload, f, 1 << 20)
+            # Reject files without the required columns before accepting the job
+            rows_total, _ = iter_batch_frames(input_path, input_format, self.chunk_rows)
+        except BaseException:
+            shutil.rmtree(job_dir, ignore_errors=True)
+            raise
+
+        state = {
+            "job_id": job_id,
+            "status": "queued",
+            "filename": filename,
+            "input_format": input_format,
+            "created_at": _now(),
+            "started_at": None,
+            "finished_at": None,
+            "rows_total": rows_total,
+            "rows_done": 0,
+            "error_count": 0,
+            "risk_distribution": {"low": 0, "medium": 0, "high": 0},
+            "chunks_done": 0,
+            "chunk_rows": [],
+            "rows_per_s": None,
+            "eta_s": None,
+            "error": None,
+        }
+        with self._lock:
+            self._jobs[job_id] = state
+        self._claim(job_id)
+        self._enqueue(job_id)
+        return self.get(job_id)
+
+    def get(self, job_id: str) -> Dict[str, Any]:
+        """State of a job; jobs run by another process are read from disk."""
+        with self._lock:
+            if job_id in self._claims:
+                return dict(self._jobs[job_id])
+        state = self._read(job_id)
+        if state is None:
+            with self._lock:
+                self._jobs.pop(job_id, None)
+            raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+        with self._lock:
+            if job_id not in self._claims:
+                self._jobs[job_id] = state
+            return dict(self._jobs[job_id])
+
+    def list_jobs(self) -> List[Dict[str, Any]]:
+        jobs = []
+        for job_id in os.listdir(self.root):
+            try:
+                jobs.append(self.get(job_id))
+            except HTTPException:
+                continue
+        return sorted(jobs, key=lambda state: state["created_at"], reverse=True)
+
+    def cancel(self, job_id: str) -> Dict[str, Any]:
+        state = self.get(job_id)
+        if state["status"] not in ACTIVE_STATES:
+            raise HTTPException(status_code=409, detail=f"Job {job_id} is already {state['status']}")
+        with self._lock:
+            running_here = job_id in self._claims
+        if not running_here:
+            if self._claim(job_id):
+                # Left active by a process that is gone: nothing is running it
+                self._update(job_id, status="cancelled", finished_at=_now(), eta_s=None)
+                self._release(job_id)
+            else:
+                # Run by another worker process, which stops at its next chunk
+                open(self._cancel_path(job_id), "w").close()
+            return self.get(job_id)
+        self._cancel[job_id].set()
+        if state["status"] == "queued":
+            return self._update(job_id, status="cancelled", finished_at=_now(), eta_s=None)
+        # Running: stop its Spark jobs now, the worker records the cancellation
+        if spark_service._spark is not None:
+            spark_service._spark.sparkContext.cancelJobsWithTag(f"job-{job_id}")
+        return self.get(job_id)
+
+    def resume(self, job_id: str) -> Dict[str, Any]:
+        """Queue a cancelled or failed job again; finished chunks are kept."""
+        state = self.get(job_id)
+        if state["status"] not in ("cancelled", "failed"):
+            raise HTTPException(status_code=409, detail=f"Job {job_id} is {state['status']}")
+        if not self._claim(job_id):
+            raise HTTPException(status_code=409, detail=f"Job {job_id} is still being stopped")
+        if os.path.exists(self._cancel_path(job_id)):
+            os.remove(self._cancel_path(job_id))
+        self._update(job_id, error=None)
+        self._enqueue(job_id)
+        return self.get(job_id)
+
+    def results_page(self, job_id: str, offset: int, limit: int) -> Dict[str, Any]:
+        """Rows [offset, offset + limit) of the chunks scored so far."""
+        state = self.get(job_id)
+        starts = np.concatenate([[0], np.cumsum(state["chunk_rows"], dtype=np.int64)])
+        available = int(starts[-1])
+        tables = []
+        end = min(offset + limit, available)
+        if offset < end:
+            first = int(np.searchsorted(starts, offset, side="right")) - 1
+            last = int(np.searchsorted(starts, end, side="left")) - 1
+            for chunk in range(first, last + 1):
+                part = pq.read_table(self._part_path(job_id, chunk))
+                lo = max(offset - int(starts[chunk]), 0)
+                hi = min(end - int(starts[chunk]), part.num_rows)
+                tables.append(part.slice(lo, hi - lo))
+        predictions = result_rows(pa.concat_tables(tables)) if tables else []
+        # More rows exist, or may still be produced by an active job
+        more = end < available or state["status"] in ACTIVE_STATES
+        return {
+            "job_id": job_id,
+            "status": state["status"],
+            "offset": offset,
+            "limit": limit,
+            "rows_available": available,
+            "predictions": predictions,
+            "next_offset": max(end, offset) if more else None,
+        }
+
+    def results_file(self, job_id: str) -> str:
+        state = self.get(job_id)
+        if state["status"] != "completed":
+            raise HTTPException(status_code=409, detail=f"Job {job_id} is {state['status']}, results are not final")
+        return self._results_path(job_id)
+
+    def stats(self) -> Dict[str, Any]:
+        """Jobs per status as last seen by this process (no disk access)."""
+        counts: Dict[str, int] = {}
+        with self._lock:
+            for state in self._jobs.values():
+                counts[state["status"]] = counts.get(state["status"], 0) + 1
+        return {"workers": self.workers, "chunk_rows": self.chunk_rows,
+                "retention_s": self.retention_s, "jobs": counts}
+
+    # Retention
+
+    def remove_expired(self, now: Optional[float] = None) -> int:
+        """Delete jobs that finished more than `retention_s` ago; returns how many."""
+        cutoff = (time.time() if now is None else now) - self.retention_s
+        removed = 0
+        for job_id in os.listdir(self.root):
+            state = self._read(job_id)
+            if state is None or not _expired(state, cutoff):
+                continue
+            trash = os.path.join(self.root, f".expired-{job_id}")
+            with self._lock:
+                if job_id in self._claims:
+                    continue
+                try:
+                    fd = self._lock_file(job_id)
+                except HTTPException:
+                    continue
+                if fd is None:
+                    continue
+                try:
+                    # Resumed by another process since the first read?
+                    state = self._read(job_id)
+                    if state is None or not _expired(state, cutoff):
+                        continue
+                    os.rename(self._dir(job_id), trash)
+                finally:
+                    os.close(fd)
+                self._jobs.pop(job_id, None)
+                self._cancel.pop(job_id, None)
+            shutil.rmtree(trash, ignore_errors=True)
+            removed += 1
+        return removed
+
+    def _expire_loop(self) -> None:
+        stopping = self._stopping
+        interval = min(self.retention_s, 3600.0)
+        while True:
+            try:
+                removed = self.remove_expired()
+                if removed:
+                    print(f"🧹 Removed {removed} expired batch job(s)")
+            except Exception as e:
+                print(f"⚠️  Batch job cleanup failed: {e}")
+            if stopping.wait(interval):
+                return
+
+    # Worker
+
+    def _run(self, job_id: str) -> None:
+        try:
+            self._run_claimed(job_id)
+        finally:
+            self._release(job_id)
+
+    def _cancel_requested(self, job_id: str) -> bool:
+        # Set by cancel() in this process, or by another worker process
+        cancel = self._cancel[job_id]
+        if not cancel.is_set() and os.path.exists(self._cancel_path(job_id)):
+            os.remove(self._cancel_path(job_id))
+            cancel.set()
+        return cancel.is_set()
+
+    def _run_claimed(self, job_id: str) -> None:
+        cancel = self._cancel[job_id]
+        stopping = self._stopping
+        state = self.get(job_id)
+        if state["status"] != "queued" or self._cancel_requested(job_id):
+            if state["status"] == "queued":
+                self._update(job_id, status="cancelled", finished_at=_now(), eta_s=None)
+            return
+        state = self._update(job_id, status="running", started_at=state["started_at"] or _now())
+        tag = f"job-{job_id}"
+        try:
+            input_path = os.path.join(self._dir(job_id), "input")
+            _, frames = iter_batch_frames(input_path, state["input_format"], self.chunk_rows)
+            run_start = time.perf_counter()
+            run_rows = 0
+            offset = 0
+            for chunk, frame in enumerate(frames):
+                if chunk < state["chunks_done"]:
+                    # Scored before a restart or cancel: keep its part
+                    offset += len(frame)
+                    continue
+                if self._cancel_requested(job_id) or stopping.is_set():
+                    break
+                table, risk_counts, error_count = SparkExecutor.call_tagged(
+                    tag, score_chunk, frame, offset
+                )
+                pq.write_table(table, self._part_path(job_id, chunk) + ".tmp")
+                os.replace(self._part_path(job_id, chunk) + ".tmp", self._part_path(job_id, chunk))
+
+                offset += len(frame)
+                run_rows += len(frame)
+                rows_per_s = run_rows / max(time.perf_counter() - run_start, 1e-9)
+                distribution = dict(state["risk_distribution"])
+                for level, count in risk_counts.items():
+                    distribution[level] = distribution.get(level, 0) + count
+                rows_done = state["rows_done"] + len(frame)
+                eta_s = None
+                if state["rows_total"] is not None:
+                    eta_s = round(max(state["rows_total"] - rows_done, 0) / rows_per_s, 1)
+                state = self._update(
+                    job_id,
+                    rows_done=rows_done,
+                    error_count=state["error_count"] + error_count,
+                    risk_distribution=distribution,
+                    chunks_done=chunk + 1,
+                    chunk_rows=state["chunk_rows"] + [len(frame)],
+                    rows_per_s=round(rows_per_s, 1),
+                    eta_s=eta_s,
+                )
+            else:
+                self._merge_parts(job_id, state["chunks_done"])
+                self._update(job_id, status="completed", finished_at=_now(), eta_s=0.0,
+                             rows_total=state["rows_done"])
+                return
+        except Exception as e:
+            if not cancel.is_set() and not stopping.is_set():
+                detail = e.detail if isinstance(e, HTTPException) else str(e)
+                self._update(job_id, status="failed", finished_at=_now(), eta_s=None, error=detail)
+                return
+
+        if cancel.is_set():
+            self._update(job_id, status="cancelled", finished_at=_now(), eta_s=None)
+        else:
+            # Shutting down: left queued so the next start resumes it
+            self._update(job_id, status="queued", eta_s=None)
+
+    def _merge_parts(self, job_id: str, chunks: int) -> None:
+        path = self._results_path(job_id)
+        with pq.ParquetWriter(path + ".tmp", RESULT_SCHEMA) as writer:
+            for chunk in range(chunks):
+                writer.write_table(pq.read_table(self._part_path(job_id, chunk)))
+        os.replace(path + ".tmp", path)
+
+
+# Shared job manager, started in the app lifespan
+job_manager = JobManager(JOBS_DIR, JOB_CHUNK_ROWS, JOB_WORKERS, JOB_RETENTION_S)
@@ -1,12 +1,22 @@
 """FastAPI main application."""
+import asyncio
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse
 
-from app.config import API_PREFIX, CORS_ORIGINS
+from app.config import API_PREFIX, CORS_ORIGINS, SCORING_BACKEND, MICRO_BATCH_ENABLED, RETRY_AFTER_S
 from app.models import HealthResponse
 from app.spark_service import spark_service
-from app.routes import predict
+from app.batching import prediction_batcher
+from app.executor import single_executor, batch_executor
+from app.cache import prediction_cache
+from app.jobs import job_manager
+from app.segments import segment_store
+from app.metrics import MetricsMiddleware, metrics
+from app.capture import CaptureMiddleware, capture_log
+from app.drift import drift_monitor
+from app.routes import predict, jobs, segments, monitoring, admin
 
 
 @asynccontextmanager
@@ -16,14 +26,27 @@ async def lifespan(app: FastAPI):
     print("🚀 Starting Traffic Accident Prediction API...")
     print(f"📊 Spark version: {spark_service.get_spark_version()}")
     
-    # Pre-load the model
-    _ = spark_service.model
-    print("✅ ML Pipeline model loaded successfully")
+    # Load and warm up the model in the background; /health/ready reports
+    # when it is done, /health/live answers right away
+    spark_service.start()
+    
+    if MICRO_BATCH_ENABLED:
+        prediction_batcher.start()
+    
+    job_manager.start()
+    segment_store.start()
     
     yield
     
     # Shutdown: Clean up Spark
     print("🛑 Shutting down...")
+    await prediction_batcher.stop()
+    job_manager.shutdown()
+    segment_store.shutdown()
+    spark_service.stop()
+    single_executor.shutdown()
+    batch_executor.shutdown()
+    capture_log.close()
     if spark_service._spark:
         spark_service._spark.stop()
         print("✅ Spark session stopped")
@@ -41,6 +64,11 @@ app = FastAPI(
     ## Features
     - **Single Prediction**: Predict risk for one road segment
     - **Batch Prediction**: Upload CSV file for multiple predictions
+    - **Batch Jobs**: Score large files in the background with progress and paged results
+    - **Segment Registry**: Precomputed risk of registered segments under every condition
+    - **Model Versions**: Hot reload and rollback of model versions (admin)
+    - **Metrics**: Per-stage latency histograms in Prometheus format at `/metrics`
+    - **Drift Monitoring**: Live inputs and predictions compared with the training data
     
     ## Input Features
     - Road characteristics: type, lanes, curvature, speed limit, signs
@@ -60,8 +88,21 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Per-stage latency histograms (see app/metrics.py)
+if metrics.enabled:
+    app.add_middleware(MetricsMiddleware, metrics=metrics)
+
+# Traffic capture for replay (see app/capture.py); outermost, so recorded
+# latencies include the other middleware
+if capture_log.enabled:
+    app.add_middleware(CaptureMiddleware, log=capture_log)
+
 # Include routers
 app.include_router(predict.router, prefix=API_PREFIX)
+app.include_router(jobs.router, prefix=API_PREFIX)
+app.include_router(segments.router, prefix=API_PREFIX)
+app.include_router(monitoring.router, prefix=API_PREFIX)
+app.include_router(admin.router, prefix=API_PREFIX)
 
 
 @app.get("/", tags=["root"])
@@ -82,5 +123,101 @@ async def health_check():
     return HealthResponse(
         status="healthy",
         model_loaded=spark_service.is_model_loaded(),
+        ready=spark_service.is_ready(),
+        model_version=spark_service.model_version(),
         spark_version=spark_service.get_spark_version(),
+        batching=prediction_batcher.stats.as_dict() if MICRO_BATCH_ENABLED else None,
+        executors={"single": single_executor.stats(), "batch": batch_executor.stats()},
+        cache=prediction_cache.stats(),
+        jobs=job_manager.stats(),
+        model_server=await asyncio.to_thread(_model_server_stats),
+    )
+
+
+@app.get("/health/live", tags=["health"])
+async def liveness():
+    """Liveness probe: the process is up and serving HTTP."""
+    return {"status": "alive"}
+
+
+@app.get("/health/ready", tags=["health"])
+async def readiness():
+    """Readiness probe: 200 once the model is loaded and warmed up, else 503."""
+    if spark_service.is_ready():
+        return {"status": "ready", "model_version": spark_service.model_version()}
+    return JSONResponse(
+        status_code=503,
+        content={"status": "starting", "error": spark_service._last_error},
+        headers={"Retry-After": str(RETRY_AFTER_S)},
+    )
+
+
+def _model_server_stats():
+    """Counters of the shared model server, when scoring remotely."""
+    if SCORING_BACKEND != "remote":
+        return None
+    try:
+        info = spark_service.remote.info()
+    except Exception as e:
+        return {"error": str(e)}
+    return {"pid": info["pid"], "backend": info["backend"], "rows": info["rows"], "batching": info["batching"]}
+
+
+@app.get("/metrics", tags=["health"], response_class=PlainTextResponse)
+async def prometheus_metrics():
+    """Latency histograms, queue depths and JVM heap in Prometheus text format."""
+    return PlainTextResponse(
+        await asyncio.to_thread(metrics.expose),
+        media_type="text/plain; version=0.0.4; charset=utf-8",
     )
+
+
+def _pool_samples(key: str):
+    for executor in (single_executor, batch_executor):
+        yield {"pool": executor.name}, executor.stats()[key]
+
+
+def _jvm_heap_samples():
+    # In remote mode the JVM lives in the model server
+    heap = spark_service.remote.info().get("jvm_heap") if SCORING_BACKEND == "remote" else spark_service.jvm_heap()
+    for area, value in (heap or {}).items():
+        yield {"area": area}, value
+
+
+def _cache_samples(key: str):
+    yield {}, prediction_cache.stats()[key]
+
+
+def _drift_samples():
+    for name, sketch in drift_monitor.report()["sketches"].items():
+        if "psi" in sketch:
+            yield {"sketch": name}, sketch["psi"]
+
+
+metrics.gauge("trafficsafe_pool_in_flight", "Calls running or queued in a worker pool.",
+              lambda: _pool_samples("in_flight"))
+metrics.gauge("trafficsafe_pool_capacity", "Calls a worker pool admits before answering 503.",
+              lambda: _pool_samples("capacity"))
+metrics.gauge("trafficsafe_pool_rejected_total", "Calls rejected because a pool was full.",
+              lambda: _pool_samples("rejected"), kind="counter")
+metrics.gauge("trafficsafe_pool_timed_out_total", "Calls that missed their deadline.",
+              lambda: _pool_samples("timed_out"), kind="counter")
+metrics.gauge("trafficsafe_microbatch_queue_depth", "Single predictions waiting to be coalesced.",
+              lambda: [({}, prediction_batcher.queue_depth)])
+metrics.gauge("trafficsafe_cache_hits_total", "Prediction cache hits.",
+              lambda: _cache_samples("hits"), kind="counter")
+metrics.gauge("trafficsafe_cache_misses_total", "Prediction cache misses.",
+              lambda: _cache_samples("misses"), kind="counter")
+metrics.gauge("trafficsafe_cache_entries", "Entries in the prediction cache.",
+              lambda: _cache_samples("size"))
+metrics.gauge("trafficsafe_jvm_heap_bytes", "JVM heap of the Spark driver.", _jvm_heap_samples)
+metrics.gauge("trafficsafe_model_ready", "1 once the serving model is loaded and warmed up.",
+              lambda: [({"version": spark_service.model_version() or ""}, int(spark_service.is_ready()))])
+if drift_monitor.enabled:
+    metrics.gauge("trafficsafe_drift_psi", "PSI of live inputs and predictions against the training data.",
+                  _drift_samples)
+if capture_log.enabled:
+    metrics.gauge("trafficsafe_capture_records_total", "Requests written to the capture log.",
+                  lambda: [({}, capture_log.records)], kind="counter")
+    metrics.gauge("trafficsafe_capture_dropped_total", "Captured requests dropped (writer behind or failed).",
+                  lambda: [({}, capture_log.dropped)], kind="counter")
@@ -0,0 +1,390 @@
+"""Per-stage latency histograms, Prometheus text export and a sampling profiler.
+
+Every HTTP request gets a `RequestTrace` (held in a context variable, so it
+follows the request into worker pool threads). Code on the scoring path
+marks its stages with `stage("parse")` etc.; when the response has been
+sent, the request latency and each stage's time are added to histograms
+labelled with the endpoint and a batch-size bucket (request latency also
+with the response status). Failed and aborted requests are recorded too.
+Coalesced single predictions are traced as one "microbatch" request per
+scoring pass.
+
+Outside a request (batch jobs, warm-up) `stage()` does nothing, and the
+single-prediction path only pays for a few `perf_counter` calls and one
+histogram update per request.
+
+With `PROFILE_SLOW_MS` set, a background thread samples the stacks of the
+worker threads serving each request every `PROFILE_INTERVAL_MS`; requests
+slower than the threshold write their samples as folded stacks
+(`PROFILE_DIR/*.folded`, one "frame;frame;frame count" line per stack) that
+flamegraph.pl or speedscope turn into a flame graph. Only the
+`PROFILE_KEEP` slowest profiles are kept.
+"""
+import contextvars
+import os
+import sys
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from app.config import METRICS_ENABLED, PROFILE_SLOW_MS, PROFILE_INTERVAL_MS, PROFILE_DIR, PROFILE_KEEP
+
+# Latency buckets in seconds (upper bounds; +Inf is implicit)
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                   0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+# Batch-size buckets for the `rows_le` label (upper bounds)
+ROW_BUCKETS = (1, 10, 100, 1000, 10000, 100000)
+
+
+def rows_bucket(rows: Optional[int]) -> str:
+    """Label value of the batch-size bucket holding `rows`."""
+    if rows is None:
+        return "none"
+    i = bisect_left(ROW_BUCKETS, rows)
+    return str(ROW_BUCKETS[i]) if i < len(ROW_BUCKETS) else "+Inf"
+
+
+class Histogram:
+    """Cumulative-bucket histogram of one label set."""
+
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self, n_buckets: int):
+        self.counts = [0] * (n_buckets + 1)
+        self.sum = 0.0
+        self.count = 0
+
+
+class HistogramFamily:
+    """Histograms of one metric, keyed by label values."""
+
+    def __init__(self, name: str, help_text: str, label_names: Tuple[str, ...],
+                 buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        self._series: Dict[Tuple[str, ...], Histogram] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels: Tuple[str, ...], value: float) -> None:
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = Histogram(len(self.buckets))
+            series.counts[i] += 1
+            series.sum += value
+            series.count += 1
+
+    def expose(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        with self._lock:
+            series = sorted((labels, list(h.counts), h.sum, h.count) for labels, h in self._series.items())
+        for labels, counts, total, count in series:
+            base = ",".join(f'{k}="{v}"' for k, v in zip(self.label_names, labels))
+            cumulative = 0
+            for bound, n in zip(self.buckets, counts):
+                cumulative += n
+                yield f'{self.name}_bucket{{{base},le="{bound:g}"}} {cumulative}'
+            yield f'{self.name}_bucket{{{base},le="+Inf"}} {count}'
+            yield f"{self.name}_sum{{{base}}} {total:.6f}"
+            yield f"{self.name}_count{{{base}}} {count}"
+
+
+class RequestTrace:
+    """Stage timings of one request (or one coalesced scoring pass)."""
+
+    __slots__ = ("endpoint", "rows", "status", "started", "stages", "threads", "samples", "_open", "_open_started")
+
+    def __init__(self, endpoint: str, rows: Optional[int] = None):
+        self.endpoint = endpoint
+        self.rows = rows
+        # HTTP status code, "aborted", or "ok"/"error" for non-HTTP work
+        self.status = "ok"
+        self.started = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+        # Worker threads running this request, sampled by the profiler
+        self.threads: Optional[Dict[int, int]] = None
+        self.samples: Optional[Dict[str, int]] = None
+        self._open: Optional[str] = None
+        self._open_started = 0.0
+
+    def add(self, name: str, seconds: float) -> None:
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def begin(self, name: str) -> None:
+        """Start a stage that runs until `end()` (e.g. past the handler's return)."""
+        self.end()
+        self._open = name
+        self._open_started = time.perf_counter()
+
+    def end(self) -> None:
+        if self._open is not None:
+            self.add(self._open, time.perf_counter() - self._open_started)
+            self._open = None
+
+
+_trace: contextvars.ContextVar[Optional[RequestTrace]] = contextvars.ContextVar("request_trace", default=None)
+
+
+def current_trace() -> Optional[RequestTrace]:
+    return _trace.get()
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Time a block as stage `name` of the current request, if any."""
+    trace = _trace.get()
+    if trace is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace.add(name, time.perf_counter() - started)
+
+
+def set_rows(rows: int) -> None:
+    """Record the batch size of the current request (for the `rows_le` label)."""
+    trace = _trace.get()
+    if trace is not None:
+        trace.rows = rows
+
+
+class Metrics:
+    """Latency histograms, scrape-time gauges and the slow-request profiler."""
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self.requests = HistogramFamily(
+            "trafficsafe_request_seconds",
+            "Request latency from arrival to the last response byte.",
+            ("endpoint", "status", "rows_le"),
+        )
+        self.stages = HistogramFamily(
+            "trafficsafe_stage_seconds",
+            "Time spent per request in each processing stage.",
+            ("endpoint", "stage", "rows_le"),
+        )
+        self.in_flight = 0
+        self._collectors: List[Tuple[str, str, str, Callable[[], Iterable[Tuple[Dict[str, str], float]]]]] = []
+        self.profiler = SamplingProfiler(PROFILE_SLOW_MS, PROFILE_INTERVAL_MS, PROFILE_DIR, PROFILE_KEEP)
+
+    def start_trace(self, endpoint: str, rows: Optional[int] = None) -> Tuple[RequestTrace, contextvars.Token]:
+        trace = RequestTrace(endpoint, rows)
+        if self.profiler.enabled:
+            self.profiler.track(trace)
+        return trace, _trace.set(trace)
+
+    def finish_trace(self, trace: RequestTrace, token: Optional[contextvars.Token] = None) -> None:
+        if token is not None:
+            _trace.reset(token)
+        trace.end()
+        elapsed = time.perf_counter() - trace.started
+        rows = rows_bucket(trace.rows)
+        self.requests.observe((trace.endpoint, trace.status, rows), elapsed)
+        for name, seconds in trace.stages.items():
+            self.stages.observe((trace.endpoint, name, rows), seconds)
+        if self.profiler.enabled:
+            self.profiler.finish(trace, elapsed)
+
+    @contextmanager
+    def traced(self, endpoint: str, rows: Optional[int] = None) -> Iterator[RequestTrace]:
+        """Trace a unit of work that is not an HTTP request (e.g. a micro-batch)."""
+        if not self.enabled:
+            yield None
+            return
+        trace, token = self.start_trace(endpoint, rows)
+        try:
+            yield trace
+        except BaseException:
+            trace.status = "error"
+            raise
+        finally:
+            self.finish_trace(trace, token)
+
+    @contextmanager
+    def worker_thread(self) -> Iterator[None]:
+        """Mark the calling thread as working for the current request (profiler)."""
+        trace = _trace.get()
+        if trace is None or trace.threads is None:
+            yield
+            return
+        ident = threading.get_ident()
+        trace.threads[ident] = trace.threads.get(ident, 0) + 1
+        try:
+            yield
+        finally:
+            trace.threads[ident] -= 1
+            if not trace.threads[ident]:
+                del trace.threads[ident]
+
+    def gauge(self, name: str, help_text: str,
+              collect: Callable[[], Iterable[Tuple[Dict[str, str], float]]], kind: str = "gauge") -> None:
+        """Register a metric read at scrape time as (labels, value) pairs."""
+        self._collectors.append((name, help_text, kind, collect))
+
+    def expose(self) -> str:
+        """All metrics in the Prometheus text exposition format."""
+        lines: List[str] = [
+            "# HELP trafficsafe_requests_in_flight HTTP requests being processed.",
+            "# TYPE trafficsafe_requests_in_flight gauge",
+            f"trafficsafe_requests_in_flight {self.in_flight}",
+        ]
+        lines.extend(self.requests.expose())
+        lines.extend(self.stages.expose())
+        for name, help_text, kind, collect in self._collectors:
+            try:
+                samples = list(collect())
+            except Exception:
+                # A failing collector (e.g. the JVM going away) must not break the scrape
+                continue
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                value = int(value) if float(value).is_integer() else float(value)
+                if labels:
+                    base = ",".join(f'{k}="{v}"' for k, v in labels.items())
+                    lines.append(f"{name}{{{base}}} {value}")
+                else:
+                    lines.append(f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+class MetricsMiddleware:
+    """ASGI middleware tracing each HTTP request.
+
+    The endpoint label is the matched route template (e.g.
+    `/api/predict/jobs/{job_id}`), so ids do not create new series. The open
+    stage (usually "serialize") is closed when the response starts, and the
+    request is recorded when its last body chunk has been sent, or when it
+    fails: status 500 if the app raised before responding, "aborted" if the
+    response was cut off (an error mid-stream or the client going away).
+    """
+
+    def __init__(self, app, metrics: "Metrics"):
+        self.app = app
+        self.metrics = metrics
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] == "/metrics":
+            await self.app(scope, receive, send)
+            return
+
+        trace, token = self.metrics.start_trace(scope["path"])
+        self.metrics.in_flight += 1
+        started = finished = False
+
+        async def send_traced(message):
+            nonlocal started, finished
+            if message["type"] == "http.response.start":
+                started = True
+                trace.status = str(message["status"])
+                trace.end()
+            await send(message)
+            if message["type"] == "http.response.body" and not message.get("more_body", False) and not finished:
+                finished = True
+                self._record(trace, scope)
+
+        try:
+            await self.app(scope, receive, send_traced)
+        except Exception:
+            if not started:
+                # Answered by the server error handler further out
+                trace.status = "500"
+            raise
+        finally:
+            _trace.reset(token)
+            if not finished:
+                if started or trace.status != "500":
+                    trace.status = "aborted"
+                self._record(trace, scope)
+
+    def _record(self, trace: RequestTrace, scope) -> None:
+        self.metrics.in_flight -= 1
+        route = scope.get("route")
+        trace.endpoint = getattr(route, "path", None) or "unmatched"
+        self.metrics.finish_trace(trace)
+
+
+class SamplingProfiler:
+    """Sample worker-thread stacks of traced requests; dump the slowest ones."""
+
+    def __init__(self, slow_ms: float, interval_ms: float, directory: str, keep: int):
+        self.enabled = slow_ms > 0
+        self.slow_s = slow_ms / 1000.0
+        self.interval_s = max(interval_ms, 1.0) / 1000.0
+        self.directory = directory
+        self.keep = keep
+        self._active: Dict[int, RequestTrace] = {}
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self.dumped: List[Tuple[float, str]] = []
+
+    def track(self, trace: RequestTrace) -> None:
+        trace.threads = {}
+        trace.samples = {}
+        with self._lock:
+            self._active[id(trace)] = trace
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+                self._thread.start()
+
+    def finish(self, trace: RequestTrace, elapsed: float) -> None:
+        with self._lock:
+            self._active.pop(id(trace), None)
+        if elapsed >= self.slow_s and trace.samples:
+            self._dump(trace, elapsed)
+
+    def _run(self) -> None:
+        while True:
+            time.sleep(self.interval_s)
+            with self._lock:
+                traces = [t for t in self._active.values() if t.threads]
+            if not traces:
+                continue
+            frames = sys._current_frames()
+            for trace in traces:
+                for ident in list(trace.threads or ()):
+                    frame = frames.get(ident)
+                    if frame is not None:
+                        folded = _fold(frame)
+                        trace.samples[folded] = trace.samples.get(folded, 0) + 1
+
+    def _dump(self, trace: RequestTrace, elapsed: float) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        endpoint = trace.endpoint.strip("/").replace("/", "_").replace("{", "").replace("}", "") or "root"
+        path = os.path.join(self.directory, f"{time.strftime('%Y%m%dT%H%M%S')}-{endpoint}-{elapsed * 1000:.0f}ms.folded")
+        with open(path, "w") as f:
+            for stack, count in sorted(trace.samples.items()):
+                f.write(f"{stack} {count}\n")
+        with self._lock:
+            self.dumped.append((elapsed, path))
+            self.dumped.sort(reverse=True)
+            stale = self.dumped[self.keep:]
+            del self.dumped[self.keep:]
+        for _, old in stale:
+            try:
+                os.remove(old)
+            except FileNotFoundError:
+                pass
+
+
+def _fold(frame) -> str:
+    """Stack of `frame` as "outer;...;inner" with function and file:line."""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+# Shared registry used by the app
+metrics = Metrics(METRICS_ENABLED)
@@ -0,0 +1,98 @@
+"""Versioned model directories.
+
+Each version is a saved PipelineModel in `MODELS_DIR/<version>/`; its
+compiled NumPy scorer is written next to it as `scorer.npz` and its drift
+reference profile as `drift_profile.json`. The version to serve is the
+`MODEL_VERSION` environment variable if set, else the name in
+`MODELS_DIR/CURRENT`, else "default": the original `MODEL_PATH` model (with
+its scorer at `SCORER_ARTIFACT_PATH` and its profile at
+`DRIFT_PROFILE_PATH`).
+
+Deploying a model is: copy it to `MODELS_DIR/<version>/`, then write the
+version name to `CURRENT` (or call the reload endpoint, which does both
+loading and writing).
+"""
+import os
+import re
+from typing import List
+
+from fastapi import HTTPException
+
+from app.config import DRIFT_PROFILE_PATH, MODELS_DIR, MODEL_PATH, MODEL_VERSION, SCORER_ARTIFACT_PATH
+
+DEFAULT_VERSION = "default"
+
+_VERSION_NAME = re.compile(r"^[A-Za-z0-9][A-Za-z0-9._-]*$")
+
+
+def _current_file() -> str:
+    return os.path.join(MODELS_DIR, "CURRENT")
+
+
+def list_versions() -> List[str]:
+    """Names of the model versions on disk."""
+    versions = [DEFAULT_VERSION] if os.path.isdir(MODEL_PATH) else []
+    if os.path.isdir(MODELS_DIR):
+        for name in sorted(os.listdir(MODELS_DIR)):
+            if _VERSION_NAME.match(name) and os.path.isdir(os.path.join(MODELS_DIR, name, "metadata")):
+                versions.append(name)
+    return versions
+
+
+def model_path(version: str) -> str:
+    """Directory of a model version; raises 404 if it does not exist."""
+    if version == DEFAULT_VERSION:
+        path = MODEL_PATH
+    elif _VERSION_NAME.match(version):
+        path = os.path.join(MODELS_DIR, version)
+    else:
+        path = ""
+    if not path or not os.path.isdir(os.path.join(path, "metadata")):
+        raise HTTPException(status_code=404, detail=f"Model version '{version}' not found")
+    return path
+
+
+def new_version_path(version: str) -> str:
+    """Directory for a version about to be written (e.g. by training)."""
+    if version == DEFAULT_VERSION or not _VERSION_NAME.match(version):
+        raise ValueError(f"Invalid model version name '{version}'")
+    return os.path.join(MODELS_DIR, version)
+
+
+def scorer_path(version: str) -> str:
+    """Where the compiled NumPy scorer of a version is stored."""
+    if version == DEFAULT_VERSION:
+        return SCORER_ARTIFACT_PATH
+    return os.path.join(model_path(version), "scorer.npz")
+
+
+def drift_profile_path(version: str) -> str:
+    """Where the drift reference profile of a version is stored."""
+    if version == DEFAULT_VERSION:
+        return DRIFT_PROFILE_PATH
+    return os.path.join(model_path(version), "drift_profile.json")
+
+
+def current_version() -> str:
+    """The version that should be served."""
+    if MODEL_VERSION:
+        return MODEL_VERSION
+    try:
+        with open(_current_file()) as f:
+            name = f.read().strip()
+    except FileNotFoundError:
+        return DEFAULT_VERSION
+    return name or DEFAULT_VERSION
+
+
+def set_current_version(version: str) -> None:
+    """Record `version` as the one to serve (atomically replaces CURRENT)."""
+    if MODEL_VERSION:
+        # Pinned by the environment: CURRENT would be ignored anyway
+        return
+    os.makedirs(MODELS_DIR, exist_ok=True)
+    path = _current_file()
+    with open(path + ".tmp", "w") as f:
+        f.write(version + "\n")
+    os.replace(path + ".tmp", path)
+
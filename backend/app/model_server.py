@@ -0,0 +1,421 @@
+"""Shared scoring backend for multi-worker serving.
+
+With `SCORING_BACKEND=spark` every API worker process would start its own
+JVM and load its own copy of the pipeline. Instead, one model server process
+loads the model once and serves all workers over a Unix socket; workers run
+with `SCORING_BACKEND=remote` and send their input columns to it.
+
+Messages are length-prefixed frames (`!BQ`: kind, payload size). Score
+requests and responses carry Arrow IPC streams, so columns cross the socket
+without per-row encoding. Requests arriving from several workers within
+`MODEL_SERVER_MAX_WAIT_MS` are coalesced into one `predict_columns` call.
+Model reloads and rollbacks run in the server (which also watches
+MODELS_DIR/CURRENT); the workers' admin endpoints forward them.
+
+    python -m app.model_server          # normally started by `python -m app.serve`
+"""
+import json
+import os
+import queue
+import socket
+import socketserver
+import struct
+import subprocess
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.ipc as ipc
+
+from app.config import (
+    MODEL_SERVER_SOCKET,
+    MODEL_SERVER_MAX_ROWS,
+    MODEL_SERVER_MAX_WAIT_MS,
+    MODEL_SERVER_TIMEOUT_S,
+)
+
+MSG_OK = 0
+MSG_INFO = 1
+MSG_SCORE = 2
+MSG_ERROR = 3
+MSG_ADMIN = 4
+
+_HEADER = struct.Struct("!BQ")
+
+
+def _send(sock: socket.socket, kind: int, payload: bytes = b"") -> None:
+    sock.sendall(_HEADER.pack(kind, len(payload)) + payload)
+
+
+def _recv_exact(sock: socket.socket, size: int) -> bytes:
+    buf = bytearray(size)
+    view = memoryview(buf)
+    received = 0
+    while received < size:
+        n = sock.recv_into(view[received:])
+        if n == 0:
+            raise ConnectionError("Model server connection closed")
+        received += n
+    return bytes(buf)
+
+
+def _recv(sock: socket.socket) -> Tuple[int, bytes]:
+    kind, size = _HEADER.unpack(_recv_exact(sock, _HEADER.size))
+    return kind, _recv_exact(sock, size) if size else b""
+
+
+def _table_bytes(table: pa.Table) -> bytes:
+    sink = pa.BufferOutputStream()
+    with ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def _read_table(payload: bytes) -> pa.Table:
+    return ipc.open_stream(pa.py_buffer(payload)).read_all()
+
+
+class RemoteScoringError(RuntimeError):
+    """Scoring failed inside the model server."""
+
+
+class ModelServerClient:
+    """Thread-safe client with a small pool of persistent connections."""
+
+    def __init__(self, path: str = MODEL_SERVER_SOCKET, timeout_s: float = MODEL_SERVER_TIMEOUT_S):
+        self.path = path
+        self.timeout_s = timeout_s
+        self._idle: List[socket.socket] = []
+        self._lock = threading.Lock()
+        self._info: Optional[Dict[str, Any]] = None
+
+    def _connect(self) -> socket.socket:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout_s)
+        try:
+            sock.connect(self.path)
+        except OSError:
+            sock.close()
+            raise
+        return sock
+
+    def _request(self, kind: int, payload: bytes = b"") -> bytes:
+        # A pooled connection may have been closed by a server restart, so a
+        # failed exchange is retried once on a new connection (scoring is
+        # idempotent)
+        for attempt in range(2):
+            with self._lock:
+                sock = self._idle.pop() if self._idle else None
+            fresh = sock is None
+            if fresh:
+                sock = self._connect()
+            try:
+                _send(sock, kind, payload)
+                reply_kind, reply = _recv(sock)
+            except (ConnectionError, BrokenPipeError, socket.timeout) as e:
+                sock.close()
+                if fresh or attempt or isinstance(e, socket.timeout):
+                    raise
+                continue
+            with self._lock:
+                self._idle.append(sock)
+            if reply_kind == MSG_ERROR:
+                raise RemoteScoringError(reply.decode("utf-8"))
+            return reply
+        raise ConnectionError("Model server unavailable")
+
+    def info(self) -> Dict[str, Any]:
+        """Model identity, labels, backend and counters of the server."""
+        info = json.loads(self._request(MSG_INFO))
+        self._info = info
+        return info
+
+    def wait_ready(self, timeout_s: float = 120.0,
+                   process: Optional[subprocess.Popen] = None) -> Dict[str, Any]:
+        """Poll until the server answers; raises TimeoutError otherwise.
+
+        If `process` (the server's own process) exits first, raises
+        RuntimeError with its exit code instead of waiting out the timeout.
+        """
+        deadline = time.monotonic() + timeout_s
+        while True:
+            try:
+                return self.info()
+            except OSError:
+                if process is not None and process.poll() is not None:
+                    raise RuntimeError(f"Model server exited with code {process.returncode}")
+                if time.monotonic() >= deadline:
+                    raise TimeoutError(f"Model server at {self.path} did not answer within {timeout_s:g}s")
+                time.sleep(0.2)
+
+    @property
+    def model_identity(self) -> str:
+        if self._info is None:
+            self.info()
+        return self._info["model_identity"]
+
+    @property
+    def model_version(self) -> Optional[str]:
+        if self._info is None:
+            self.info()
+        return self._info.get("version")
+
+    def admin(self, action: str, version: Optional[str] = None) -> Dict[str, Any]:
+        """Run "status", "reload" or "rollback" in the server.
+
+        Errors are raised as the HTTPException the server raised.
+        """
+        from fastapi import HTTPException
+
+        request = json.dumps({"action": action, "version": version}).encode("utf-8")
+        reply = json.loads(self._request(MSG_ADMIN, request))
+        if "error" in reply:
+            raise HTTPException(status_code=reply["error"]["status_code"], detail=reply["error"]["detail"])
+        self.info()
+        return reply
+
+    @property
+    def labels(self) -> List[str]:
+        if self._info is None:
+            self.info()
+        return self._info["labels"]
+
+    def is_ready(self) -> bool:
+        return self._info is not None
+
+    def predict_columns(self, columns: Dict[str, np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+        """Score input column arrays remotely; same result as `SparkService.predict_columns`."""
+        table = pa.table({name: columns[name] for name in columns})
+        result = _read_table(self._request(MSG_SCORE, _table_bytes(table)))
+        metadata = result.schema.metadata or {}
+        if b"model_identity" in metadata and self._info is not None:
+            self._info["model_identity"] = metadata[b"model_identity"].decode("utf-8")
+            self._info["version"] = metadata[b"model_version"].decode("utf-8")
+        indices = result.column("prediction").to_numpy()
+        proba_columns = [name for name in result.column_names if name != "prediction"]
+        proba = np.column_stack([result.column(name).to_numpy() for name in proba_columns])
+        return indices.astype(np.int64), proba.reshape(len(indices), len(proba_columns))
+
+
+# Server side
+
+class _Request:
+    __slots__ = ("table", "future", "queued")
+
+    def __init__(self, table: pa.Table):
+        self.table = table
+        self.future: Future = Future()
+        self.queued = time.perf_counter()
+
+
+class ModelServer:
+    """Owns the model and scores coalesced requests from all API workers."""
+
+    def __init__(self, path: str = MODEL_SERVER_SOCKET,
+                 max_rows: int = MODEL_SERVER_MAX_ROWS, max_wait_ms: float = MODEL_SERVER_MAX_WAIT_MS):
+        from app.batching import BatchStats
+
+        self.path = path
+        self.max_rows = max(1, max_rows)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self.stats = BatchStats(64)
+        self.rows = 0
+        self._queue: "queue.Queue[_Request]" = queue.Queue()
+        self._stopping = threading.Event()
+        self._server: Optional[socketserver.UnixStreamServer] = None
+
+    def load(self) -> Dict[str, Any]:
+        """Load and warm up the model once, then watch for new versions."""
+        from app.config import SCORING_BACKEND
+        from app.spark_service import spark_service
+
+        if SCORING_BACKEND == "remote":
+            raise ValueError("The model server needs SCORING_BACKEND=numpy or spark, not remote")
+        spark_service.prepare()
+        threading.Thread(target=spark_service.watch, name="model-watcher", daemon=True).start()
+        return self.info()
+
+    def info(self) -> Dict[str, Any]:
+        from app.config import SCORING_BACKEND
+        from app.spark_service import spark_service
+
+        label_map = spark_service.get_label_map()
+        return {
+            "backend": SCORING_BACKEND,
+            "model_identity": spark_service.model_identity(),
+            "version": spark_service.model_version(),
+            "labels": [label_map[i] for i in range(len(label_map))],
+            "pid": os.getpid(),
+            "rows": self.rows,
+            "batching": self.stats.as_dict(),
+            "jvm_heap": spark_service.jvm_heap(),
+        }
+
+    def admin(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        from fastapi import HTTPException
+        from app.spark_service import spark_service
+
+        try:
+            if request["action"] == "reload":
+                return spark_service.reload(request.get("version"))
+            if request["action"] == "rollback":
+                return spark_service.rollback()
+            return spark_service.model_status()
+        except HTTPException as e:
+            return {"error": {"status_code": e.status_code, "detail": e.detail}}
+
+    # Scoring loop
+
+    def submit(self, table: pa.Table) -> pa.Table:
+        request = _Request(table)
+        self._queue.put(request)
+        return request.future.result()
+
+    def _collect(self) -> List[_Request]:
+        while True:
+            try:
+                batch = [self._queue.get(timeout=0.5)]
+                break
+            except queue.Empty:
+                if self._stopping.is_set():
+                    return []
+        rows = batch[0].table.num_rows
+        deadline = time.perf_counter() + self.max_wait
+        while rows < self.max_rows:
+            remaining = deadline - time.perf_counter()
+            try:
+                request = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            batch.append(request)
+            rows += request.table.num_rows
+        return batch
+
+    def _score(self, tables: List[pa.Table]) -> List[pa.Table]:
+        from app.numpy_scorer import frame_to_columns
+        from app.spark_service import spark_service
+
+        combined = pa.concat_tables(tables) if len(tables) > 1 else tables[0]
+        bundle = spark_service.active
+        indices, proba = spark_service.predict_columns(frame_to_columns(combined.to_pandas()), bundle)
+        result = pa.table(
+            {"prediction": indices.astype(np.int64),
+             **{f"p{i}": proba[:, i] for i in range(proba.shape[1])}},
+        ).replace_schema_metadata({"model_identity": bundle.identity, "model_version": bundle.version})
+        parts, start = [], 0
+        for table in tables:
+            parts.append(result.slice(start, table.num_rows))
+            start += table.num_rows
+        return parts
+
+    def _run(self) -> None:
+        while not self._stopping.is_set():
+            batch = self._collect()
+            if not batch:
+                break
+            started = time.perf_counter()
+            self.stats.record(len(batch), [(started - r.queued) * 1000.0 for r in batch])
+            self.rows += sum(r.table.num_rows for r in batch)
+            try:
+                results = self._score([r.table for r in batch])
+            except Exception as e:
+                self.stats.failed_batches += 1
+                if len(batch) == 1:
+                    batch[0].future.set_exception(e)
+                    continue
+                # Score one by one, so a bad request only fails itself
+                results = []
+                for request in batch:
+                    try:
+                        results.append(self._score([request.table])[0])
+                    except Exception as single_error:
+                        request.future.set_exception(single_error)
+                        results.append(None)
+            for request, result in zip(batch, results):
+                if result is not None:
+                    request.future.set_result(result)
+
+    # Socket server
+
+    def serve_forever(self) -> None:
+        """Listen on the socket until `shutdown` (or Ctrl+C)."""
+        if os.path.exists(self.path):
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(self.path)
+            except OSError:
+                os.unlink(self.path)  # Left over from a server that died
+            else:
+                raise RuntimeError(f"A model server is already listening on {self.path}")
+            finally:
+                probe.close()
+
+        model_server = self
+
+        class Handler(socketserver.BaseRequestHandler):
+            def handle(self):
+                while True:
+                    try:
+                        kind, payload = _recv(self.request)
+                    except (ConnectionError, OSError):
+                        return
+                    try:
+                        if kind == MSG_INFO:
+                            _send(self.request, MSG_OK, json.dumps(model_server.info()).encode("utf-8"))
+                        elif kind == MSG_ADMIN:
+                            reply = model_server.admin(json.loads(payload))
+                            _send(self.request, MSG_OK, json.dumps(reply).encode("utf-8"))
+                        elif kind == MSG_SCORE:
+                            result = model_server.submit(_read_table(payload))
+                            _send(self.request, MSG_OK, _table_bytes(result))
+                        else:
+                            _send(self.request, MSG_ERROR, f"Unknown message kind {kind}".encode("utf-8"))
+                    except (ConnectionError, OSError):
+                        return
+                    except Exception as e:
+                        _send(self.request, MSG_ERROR, f"{type(e).__name__}: {e}".encode("utf-8"))
+
+        class Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+            daemon_threads = True
+
+        old_umask = os.umask(0o177)  # socket only usable by this user
+        try:
+            self._server = Server(self.path, Handler)
+        finally:
+            os.umask(old_umask)
+        threading.Thread(target=self._run, name="model-server-score", daemon=True).start()
+        try:
+            self._server.serve_forever()
+        finally:
+            self._server.server_close()
+            if os.path.exists(self.path):
+                os.unlink(self.path)
+
+    def shutdown(self) -> None:
+        self._stopping.set()
+        if self._server is not None:
+            self._server.shutdown()
+
+
+def main() -> None:
+    import signal
+
+    server = ModelServer()
+    print("🚀 Starting model server...")
+    info = server.load()
+    print(f"✅ Model loaded ({info['backend']}, {info['model_identity']})")
+    # SIGTERM from the launcher: stop serving and remove the socket
+    signal.signal(signal.SIGTERM, lambda *_: threading.Thread(target=server.shutdown).start())
+    print(f"📡 Listening on {server.path}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    print("🛑 Model server stopped")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,11 @@
 """Pydantic models for request/response validation."""
 from pydantic import BaseModel, Field, field_validator
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
+from datetime import datetime
 from enum import Enum
 
+from app.config import SWEEP_MAX_POINTS
+
 
 class RoadType(str, Enum):
     URBAN = "urban"
@@ -69,11 +72,19 @@ class RiskLevel(str, Enum):
     HIGH = "high"
 
 
+class FeatureContribution(BaseModel):
+    """Contribution of one model feature to the predicted risk level."""
+    feature: str = Field(..., description="Assembled feature, e.g. 'curvature' or 'weather=foggy'")
+    value: float = Field(..., description="Scaled feature value seen by the model")
+    contribution: float = Field(..., description="Value times the coefficient of the predicted level")
+
+
 class PredictionResult(BaseModel):
     """Output schema for prediction result."""
     accident_risk_level: Optional[RiskLevel] = Field(None, description="Predicted accident risk level")
     input_data: Optional[dict] = None
     error: Optional[str] = None
+    explanation: Optional[List[FeatureContribution]] = Field(None, description="Largest contributions (explain=true)")
 
 
 class BatchPredictionResult(BaseModel):
@@ -83,8 +94,196 @@ class BatchPredictionResult(BaseModel):
     summary: dict
 
 
+class CompactBatchPredictionResult(BaseModel):
+    """Column-oriented batch predictions (`mode=compact`)."""
+    total_count: int
+    summary: dict
+    labels: Optional[List[Optional[RiskLevel]]] = Field(None, description="Risk level per row, null for invalid rows")
+    label_table: Optional[List[RiskLevel]] = Field(None, description="Labels indexed by `codes` (labels=codes)")
+    codes: Optional[List[int]] = Field(None, description="Index into label_table per row, -1 for invalid rows")
+    errors: Dict[str, List[Any]] = Field(..., description="Failing row indices and their messages")
+    inputs: Optional[Dict[str, List[Any]]] = Field(None, description="Input values per column (include_input=true)")
+    explanations: Optional[Dict[str, Any]] = Field(
+        None, description="feature_table, and per row feature indices and contributions (explain=true)"
+    )
+
+
+class SweepAxis(BaseModel):
+    """One axis of a what-if sweep: explicit values or a numeric range."""
+    field: str = Field(..., description="Input field to vary, e.g. 'curvature' or 'weather'")
+    values: Optional[List[Any]] = Field(None, max_length=SWEEP_MAX_POINTS, description="Explicit values to try")
+    start: Optional[float] = Field(None, description="Range start (numeric fields)")
+    stop: Optional[float] = Field(None, description="Range end, inclusive (numeric fields)")
+    steps: Optional[int] = Field(None, ge=2, le=SWEEP_MAX_POINTS, description="Number of points in the range")
+
+
+class SweepRequest(BaseModel):
+    """Input schema for a what-if sweep."""
+    base: PredictionInput
+    axes: List[SweepAxis] = Field(..., min_length=1, max_length=2)
+
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "base": PredictionInput.Config.json_schema_extra["example"],
+                "axes": [
+                    {"field": "curvature", "start": 0.0, "stop": 1.0, "steps": 21},
+                    {"field": "weather", "values": ["clear", "rainy", "foggy"]},
+                ],
+            }
+        }
+
+
+class SweepResult(BaseModel):
+    """Output schema for a what-if sweep (row-major over the axes)."""
+    axes: List[Dict[str, Any]]
+    shape: List[int]
+    labels: List[str]
+    probabilities: Dict[str, List[float]]
+
+
+class RankedPrediction(BaseModel):
+    """One of the top-k rows of an upload."""
+    row: int = Field(..., description="Row index in the uploaded file")
+    group: Optional[Dict[str, Any]] = None
+    accident_risk_level: RiskLevel
+    probability: float = Field(..., description="Probability of the ranked risk level")
+    probabilities: Dict[str, float]
+    input_data: Dict[str, Any]
+
+
+class TopKResult(BaseModel):
+    """Top-k rows of an upload by the probability of one risk level."""
+    k: int
+    by: List[str]
+    risk_level: RiskLevel
+    total_count: int
+    error_count: int
+    results: List[RankedPrediction]
+
+
+class JobStatus(str, Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+
+class BatchJob(BaseModel):
+    """State and progress of an asynchronous batch scoring job."""
+    job_id: str
+    status: JobStatus
+    filename: Optional[str] = None
+    input_format: str
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    rows_total: Optional[int] = Field(None, description="Row count, if known before scoring")
+    rows_done: int = 0
+    error_count: int = 0
+    risk_distribution: Dict[str, int]
+    chunks_done: int = 0
+    rows_per_s: Optional[float] = None
+    eta_s: Optional[float] = Field(None, description="Estimated seconds until completion")
+    error: Optional[str] = None
+
+
+class BatchJobPage(BaseModel):
+    """One page of the results of a batch job."""
+    job_id: str
+    status: JobStatus
+    offset: int
+    limit: int
+    rows_available: int
+    predictions: List[PredictionResult]
+    next_offset: Optional[int] = None
+
+
+class SegmentInput(BaseModel):
+    """A road segment and its static attributes."""
+    segment_id: str = Field(..., min_length=1, max_length=128)
+    road_type: RoadType
+    num_lanes: int = Field(..., ge=1, le=8, description="Number of lanes (1-8)")
+    curvature: float = Field(..., ge=0.0, le=1.0, description="Road curvature (0.0-1.0)")
+    speed_limit: int = Field(..., ge=15, le=120, description="Speed limit in mph")
+    road_signs_present: bool
+    public_road: bool
+    num_reported_accidents: int = Field(..., ge=0, description="Number of reported accidents")
+
+
+class SegmentConditions(BaseModel):
+    """Environmental conditions a segment's risk is looked up for."""
+    lighting: Lighting
+    weather: Weather
+    time_of_day: TimeOfDay
+    holiday: bool
+    school_season: bool
+
+
+class SegmentRiskRequest(BaseModel):
+    """Segments to look up and the current conditions."""
+    segment_ids: List[str] = Field(..., min_length=1)
+    conditions: SegmentConditions
+
+
+class SegmentRisk(BaseModel):
+    """Materialized risk of one segment; null until first computed."""
+    segment_id: str
+    accident_risk_level: Optional[RiskLevel] = None
+    probabilities: Optional[Dict[str, float]] = None
+    current: bool = Field(..., description="Computed with the serving model and current attributes")
+
+
+class SegmentRiskResult(BaseModel):
+    """Risk of the requested segments under one set of conditions."""
+    conditions: SegmentConditions
+    model_identity: Optional[str] = None
+    results: List[SegmentRisk]
+    missing: List[str] = Field(..., description="Requested ids that are not registered")
+
+
+class SegmentUpsertResult(BaseModel):
+    """Outcome of a segment upsert."""
+    upserted: int
+    pending: int = Field(..., description="Upserted segments waiting for their risk to be (re)computed")
+
+
 class HealthResponse(BaseModel):
     """Health check response."""
     status: str
     model_loaded: bool
+    ready: bool = False
+    model_version: Optional[str] = None
     spark_version: Optional[str] = None
+    batching: Optional[dict] = None
+    executors: Optional[dict] = None
+    cache: Optional[dict] = None
+    jobs: Optional[dict] = None
+    model_server: Optional[dict] = None
+
+
+class ModelVersionInfo(BaseModel):
+    """A loaded model version."""
+    version: str
+    identity: str
+    labels: List[str]
+    loaded_at: str
+    warmup_ms: Optional[float] = None
+
+
+class ModelStatus(BaseModel):
+    """Serving model versions and reload state."""
+    backend: str
+    ready: bool
+    active: Optional[ModelVersionInfo] = None
+    previous: Optional[ModelVersionInfo] = None
+    current: str = Field(..., description="Version named by MODEL_VERSION or MODELS_DIR/CURRENT")
+    versions: List[str] = Field(..., description="Model versions found on disk")
+    reloading: bool
+    last_error: Optional[str] = None
+
+
+class ModelReloadRequest(BaseModel):
+    """Version to load; the one named in MODELS_DIR/CURRENT if omitted."""
+    version: Optional[str] = None
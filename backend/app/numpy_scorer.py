@@ -0,0 +1,569 @@
+"""JVM-free NumPy scorer compiled from the saved Spark ML pipeline.
+
+The traffic pipeline is StringIndexer -> OneHotEncoder -> VectorAssembler ->
+StandardScaler -> LogisticRegression. Every stage after the indexers is linear,
+so the whole pipeline folds into:
+
+- a weight matrix over the dense numeric/boolean input columns
+  (scaler factors are multiplied into the coefficients),
+- one logit lookup table per indexed categorical column
+  (one-hot encoding times coefficients, with the "keep" bucket as last entry),
+- an intercept vector.
+
+Scoring a batch is then one matrix product plus a few table lookups.
+
+The unfolded slots and coefficients are kept as well, so a prediction can be
+explained per assembled feature: the scaled feature value times the
+coefficient of the predicted class (`explain_columns`).
+"""
+import argparse
+import json
+import os
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.features import numpy_add_features
+
+
+def read_model_uid(model_path: str) -> Optional[str]:
+    """Read the PipelineModel uid from its metadata without starting Spark."""
+    metadata_dir = os.path.join(model_path, "metadata")
+    if not os.path.isdir(metadata_dir):
+        return None
+    for name in sorted(os.listdir(metadata_dir)):
+        if name.startswith("part-"):
+            with open(os.path.join(metadata_dir, name)) as f:
+                return json.loads(f.readline()).get("uid")
+    return None
+
+
+# Column dtypes used by the scorer (follow SparkService.get_input_schema)
+COLUMN_DTYPES = {
+    "road_type": object,
+    "num_lanes": np.int64,
+    "curvature": np.float32,
+    "speed_limit": np.int64,
+    "lighting": object,
+    "weather": object,
+    "road_signs_present": bool,
+    "public_road": bool,
+    "time_of_day": object,
+    "holiday": bool,
+    "school_season": bool,
+    "num_reported_accidents": np.int64,
+}
+
+
+def rows_to_columns(data_list: List[Dict[str, Any]]) -> Dict[str, np.ndarray]:
+    """Convert validated input dicts into typed column arrays.
+
+    Types follow `SparkService.get_input_schema`: curvature is a FloatType,
+    so it is rounded through float32 exactly like the Spark path.
+    """
+    return {
+        "road_type": np.array([d["road_type"] for d in data_list], dtype=object),
+        "num_lanes": np.array([int(d["num_lanes"]) for d in data_list], dtype=np.int64),
+        "curvature": np.array([float(d["curvature"]) for d in data_list], dtype=np.float32),
+        "speed_limit": np.array([int(d["speed_limit"]) for d in data_list], dtype=np.int64),
+        "lighting": np.array([d["lighting"] for d in data_list], dtype=object),
+        "weather": np.array([d["weather"] for d in data_list], dtype=object),
+        "road_signs_present": np.array([bool(d["road_signs_present"]) for d in data_list], dtype=bool),
+        "public_road": np.array([bool(d["public_road"]) for d in data_list], dtype=bool),
+        "time_of_day": np.array([d["time_of_day"] for d in data_list], dtype=object),
+        "holiday": np.array([bool(d["holiday"]) for d in data_list], dtype=bool),
+        "school_season": np.array([bool(d["school_season"]) for d in data_list], dtype=bool),
+        "num_reported_accidents": np.array(
+            [int(d["num_reported_accidents"]) for d in data_list], dtype=np.int64
+        ),
+    }
+
+
+def frame_to_columns(df) -> Dict[str, np.ndarray]:
+    """Column-wise counterpart of `rows_to_columns` for a validated DataFrame."""
+    columns = {}
+    for name, dtype in COLUMN_DTYPES.items():
+        columns[name] = df[name].to_numpy(dtype=dtype)
+    return columns
+
+
+# A slot is one position of an assembled feature vector:
+# ("num", column, None, factor, offset)  -> factor * column + offset
+# ("cat", column, index, factor, offset) -> factor * onehot(column == index) + offset
+Slot = Tuple[str, str, Optional[int], float, float]
+
+
+class NumpyScorer:
+    """Folded logistic regression over raw input columns."""
+
+    def __init__(
+        self,
+        labels: List[str],
+        intercept: np.ndarray,
+        numeric_columns: List[str],
+        weights: np.ndarray,
+        vocabularies: Dict[str, List[str]],
+        tables: Dict[str, np.ndarray],
+        strict_columns: Optional[List[str]] = None,
+        model_uid: Optional[str] = None,
+        feature_slots: Optional[List[Slot]] = None,
+        feature_names: Optional[List[str]] = None,
+        coefficients: Optional[np.ndarray] = None,
+    ):
+        self.labels = list(labels)
+        self.intercept = np.asarray(intercept, dtype=np.float64)
+        self.numeric_columns = list(numeric_columns)
+        self.weights = np.asarray(weights, dtype=np.float64)
+        self.vocabularies = {c: list(v) for c, v in vocabularies.items()}
+        self.tables = {c: np.asarray(t, dtype=np.float64) for c, t in tables.items()}
+        self.strict_columns = set(strict_columns or [])
+        self.model_uid = model_uid
+        self.feature_slots = list(feature_slots) if feature_slots is not None else None
+        self.feature_names = list(feature_names) if feature_names is not None else None
+        self.coefficients = np.asarray(coefficients, dtype=np.float64) if coefficients is not None else None
+        self._index = {c: {v: i for i, v in enumerate(vocab)} for c, vocab in self.vocabularies.items()}
+
+    @property
+    def num_classes(self) -> int:
+        return self.intercept.shape[0]
+
+    @property
+    def can_explain(self) -> bool:
+        """True if the scorer keeps the unfolded features (artifacts before they were added do not)."""
+        return self.coefficients is not None
+
+    # ------------------------------------------------------------------
+    # Compilation
+    # ------------------------------------------------------------------
+    @classmethod
+    def from_pipeline_model(
+        cls, model, model_uid: Optional[str] = None, feature_names: Optional[List[str]] = None
+    ) -> "NumpyScorer":
+        """Compile a fitted PipelineModel into a NumpyScorer.
+
+        Supports StringIndexerModel, OneHotEncoderModel, VectorAssembler,
+        StandardScalerModel and a final LogisticRegressionModel. Any other
+        stage raises ValueError so an incompatible model is never served
+        with silently wrong scores.
+
+        `feature_names` names the assembled features used in explanations
+        (default: read from the pipeline's ML attribute metadata).
+        """
+        from pyspark.ml.classification import LogisticRegressionModel
+        from pyspark.ml.feature import (
+            OneHotEncoderModel,
+            StandardScalerModel,
+            StringIndexerModel,
+            VectorAssembler,
+        )
+
+        stages = list(model.stages)
+        lr = stages[-1]
+        if not isinstance(lr, LogisticRegressionModel):
+            raise ValueError(f"Last stage must be LogisticRegressionModel, got {type(lr).__name__}")
+
+        indexers: Dict[str, Tuple[str, List[str], str]] = {}
+        slots: Dict[str, List[Slot]] = {}
+        labels: Optional[List[str]] = None
+
+        def column_slots(name: str) -> List[Slot]:
+            # Columns not produced by a stage are raw (or engineered) scalars
+            return slots.get(name, [("num", name, None, 1.0, 0.0)])
+
+        for stage in stages[:-1]:
+            if isinstance(stage, StringIndexerModel):
+                if stage.getOutputCol() == lr.getLabelCol():
+                    labels = list(stage.labels)
+                    continue
+                indexers[stage.getOutputCol()] = (
+                    stage.getInputCol(), list(stage.labels), stage.getHandleInvalid()
+                )
+            elif isinstance(stage, OneHotEncoderModel):
+                idx_col = stage.getInputCol()
+                if idx_col not in indexers:
+                    raise ValueError(f"OneHotEncoder input '{idx_col}' is not a StringIndexer output")
+                raw_col = indexers[idx_col][0]
+                size = stage.categorySizes[0] - (1 if stage.getDropLast() else 0)
+                slots[stage.getOutputCol()] = [("cat", raw_col, k, 1.0, 0.0) for k in range(size)]
+            elif isinstance(stage, VectorAssembler):
+                assembled: List[Slot] = []
+                for col in stage.getInputCols():
+                    if col in indexers:
+                        raise ValueError(f"Raw index column '{col}' in VectorAssembler is not supported")
+                    assembled.extend(column_slots(col))
+                slots[stage.getOutputCol()] = assembled
+            elif isinstance(stage, StandardScalerModel):
+                source = column_slots(stage.getInputCol())
+                std = stage.std.toArray()
+                mean = stage.mean.toArray()
+                scaled: List[Slot] = []
+                for j, (kind, col, key, factor, offset) in enumerate(source):
+                    if stage.getWithMean():
+                        offset -= mean[j]
+                    if stage.getWithStd():
+                        inv = 1.0 / std[j] if std[j] != 0.0 else 0.0
+                        factor, offset = factor * inv, offset * inv
+                    scaled.append((kind, col, key, factor, offset))
+                slots[stage.getOutputCol()] = scaled
+            else:
+                raise ValueError(f"Unsupported pipeline stage: {type(stage).__name__}")
+
+        features = column_slots(lr.getFeaturesCol())
+        coef = lr.coefficientMatrix.toArray()
+        intercept = lr.interceptVector.toArray().astype(np.float64)
+        if coef.shape[0] == 1 and lr.numClasses == 2:
+            # Binomial model: logits [0, m] give the same softmax as sigmoid(m)
+            coef = np.vstack([np.zeros_like(coef), coef])
+            intercept = np.array([0.0, intercept[0]])
+        if coef.shape[1] != len(features):
+            raise ValueError(f"Model expects {coef.shape[1]} features, pipeline assembles {len(features)}")
+        if feature_names is None:
+            feature_names = assembled_feature_names(model)
+        if len(feature_names) != len(features):
+            raise ValueError(f"Got {len(feature_names)} feature names for {len(features)} features")
+
+        num_classes = coef.shape[0]
+        intercept = intercept.copy()
+        numeric_columns: List[str] = []
+        weights: List[np.ndarray] = []
+        vocabularies: Dict[str, List[str]] = {}
+        tables: Dict[str, np.ndarray] = {}
+        strict: List[str] = []
+        for _, (raw_col, vocab, handle_invalid) in indexers.items():
+            vocabularies[raw_col] = vocab
+            # Last entry is the "keep" bucket for unseen categories
+            tables[raw_col] = np.zeros((num_classes, len(vocab) + 1))
+            if handle_invalid != "keep":
+                strict.append(raw_col)
+
+        for j, (kind, col, key, factor, offset) in enumerate(features):
+            intercept += coef[:, j] * offset
+            if kind == "cat":
+                tables[col][:, key] += coef[:, j] * factor
+            else:
+                if col not in numeric_columns:
+                    numeric_columns.append(col)
+                    weights.append(np.zeros(num_classes))
+                weights[numeric_columns.index(col)] += coef[:, j] * factor
+
+        if labels is None:
+            labels = [str(i) for i in range(num_classes)]
+
+        return cls(
+            labels=labels,
+            intercept=intercept,
+            numeric_columns=numeric_columns,
+            weights=np.stack(weights, axis=1) if weights else np.zeros((num_classes, 0)),
+            vocabularies=vocabularies,
+            tables=tables,
+            strict_columns=strict,
+            model_uid=model_uid,
+            feature_slots=features,
+            feature_names=feature_names,
+            coefficients=coef,
+        )
+
+    # ------------------------------------------------------------------
+    # Artifact I/O
+    # ------------------------------------------------------------------
+    def save(self, path: str) -> None:
+        """Save the compiled scorer as a compact .npz artifact."""
+        categorical = list(self.vocabularies)
+        arrays = {
+            "labels": np.array(self.labels, dtype=str),
+            "intercept": self.intercept,
+            "numeric_columns": np.array(self.numeric_columns, dtype=str),
+            "weights": self.weights,
+            "categorical_columns": np.array(categorical, dtype=str),
+            "strict_columns": np.array(sorted(self.strict_columns), dtype=str),
+            "model_uid": np.array(self.model_uid or "", dtype=str),
+        }
+        for col in categorical:
+            arrays[f"vocab__{col}"] = np.array(self.vocabularies[col], dtype=str)
+            arrays[f"table__{col}"] = self.tables[col]
+        if self.can_explain:
+            kinds, cols, keys, factors, offsets = zip(*self.feature_slots)
+            arrays.update({
+                "feature_names": np.array(self.feature_names, dtype=str),
+                "slot_kinds": np.array(kinds, dtype=str),
+                "slot_columns": np.array(cols, dtype=str),
+                "slot_keys": np.array([-1 if k is None else k for k in keys], dtype=np.int64),
+                "slot_factors": np.array(factors, dtype=np.float64),
+                "slot_offsets": np.array(offsets, dtype=np.float64),
+                "coefficients": self.coefficients,
+            })
+        with open(path, "wb") as f:
+            np.savez_compressed(f, **arrays)
+
+    @classmethod
+    def load(cls, path: str) -> "NumpyScorer":
+        """Load a scorer saved with `save`."""
+        with np.load(path, allow_pickle=False) as data:
+            categorical = data["categorical_columns"].tolist()
+            slots, names, coefficients = None, None, None
+            if "coefficients" in data.files:
+                slots = [
+                    (kind, col, None if key < 0 else key, factor, offset)
+                    for kind, col, key, factor, offset in zip(
+                        data["slot_kinds"].tolist(), data["slot_columns"].tolist(), data["slot_keys"].tolist(),
+                        data["slot_factors"].tolist(), data["slot_offsets"].tolist(),
+                    )
+                ]
+                names = data["feature_names"].tolist()
+                coefficients = data["coefficients"]
+            return cls(
+                labels=data["labels"].tolist(),
+                intercept=data["intercept"],
+                numeric_columns=data["numeric_columns"].tolist(),
+                weights=data["weights"],
+                vocabularies={c: data[f"vocab__{c}"].tolist() for c in categorical},
+                tables={c: data[f"table__{c}"] for c in categorical},
+                strict_columns=data["strict_columns"].tolist(),
+                model_uid=str(data["model_uid"]) or None,
+                feature_slots=slots,
+                feature_names=names,
+                coefficients=coefficients,
+            )
+
+    # ------------------------------------------------------------------
+    # Scoring
+    # ------------------------------------------------------------------
+    def _encode(self, column: str, values: np.ndarray) -> np.ndarray:
+        """Map category strings to StringIndexer indices (vectorized over uniques)."""
+        index = self._index[column]
+        unknown = len(index)
+        uniques, inverse = np.unique(values.astype(str), return_inverse=True)
+        codes = np.array([index.get(u, unknown) for u in uniques], dtype=np.int64)
+        if column in self.strict_columns and (codes == unknown).any():
+            bad = [u for u, c in zip(uniques, codes) if c == unknown]
+            raise ValueError(f"Unseen labels for {column}: {', '.join(bad)}")
+        return codes[inverse.reshape(-1)]
+
+    def decision_function(self, columns: Dict[str, np.ndarray]) -> np.ndarray:
+        """Raw logits (n_rows x n_classes) for engineered feature columns."""
+        n = len(next(iter(columns.values())))
+        logits = np.tile(self.intercept, (n, 1))
+        if self.numeric_columns:
+            X = np.column_stack([np.asarray(columns[c], dtype=np.float64) for c in self.numeric_columns])
+            logits += X @ self.weights.T
+        for col, table in self.tables.items():
+            logits += table[:, self._encode(col, columns[col])].T
+        return logits
+
+    def predict_proba_columns(self, columns: Dict[str, np.ndarray]) -> np.ndarray:
+        """Class probabilities for raw input columns."""
+        logits = self.decision_function(numpy_add_features(columns))
+        logits -= logits.max(axis=1, keepdims=True)
+        np.exp(logits, out=logits)
+        logits /= logits.sum(axis=1, keepdims=True)
+        return logits
+
+    def predict_columns(self, columns: Dict[str, np.ndarray]) -> np.ndarray:
+        """Predicted class indices for raw input columns."""
+        return self.decision_function(numpy_add_features(columns)).argmax(axis=1)
+
+    def predict(self, data_list: List[Dict[str, Any]]) -> np.ndarray:
+        """Predicted class indices for a list of validated input dicts."""
+        if not data_list:
+            return np.zeros(0, dtype=np.int64)
+        return self.predict_columns(rows_to_columns(data_list))
+
+    # ------------------------------------------------------------------
+    # Explanations
+    # ------------------------------------------------------------------
+    def feature_matrix(self, columns: Dict[str, np.ndarray]) -> np.ndarray:
+        """Assembled, scaled feature vectors (n_rows x n_features) for engineered columns.
+
+        The input of the LogisticRegression stage, rebuilt column by column
+        from the slots.
+        """
+        n = len(next(iter(columns.values())))
+        X = np.empty((n, len(self.feature_slots)))
+        codes = {col: self._encode(col, columns[col]) for col in self.tables}
+        for j, (kind, col, key, factor, offset) in enumerate(self.feature_slots):
+            if kind == "cat":
+                X[:, j] = (codes[col] == key) * factor + offset
+            else:
+                X[:, j] = np.asarray(columns[col], dtype=np.float64) * factor + offset
+        return X
+
+    def explain_columns(
+        self, columns: Dict[str, np.ndarray], top: int = 5
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """Largest feature contributions to the predicted class of each row.
+
+        A contribution is the scaled feature value times the coefficient of
+        the predicted class, so the contributions of a row add up to its
+        logit minus the intercept. Computed for the whole batch at once;
+        `top` features per row are kept, by absolute contribution.
+
+        Returns (predicted class indices, class probabilities, feature
+        indices, contributions, scaled values), the last three n_rows x top.
+        """
+        if not self.can_explain:
+            raise ValueError("Scorer artifact has no feature coefficients; recompile it to explain predictions")
+        engineered = numpy_add_features(columns)
+        X = self.feature_matrix(engineered)
+        # The folded intercept includes the slot offsets, which X already has
+        offsets = np.array([slot[4] for slot in self.feature_slots])
+        logits = X @ self.coefficients.T + (self.intercept - self.coefficients @ offsets)
+        predicted = logits.argmax(axis=1)
+        contributions = X * self.coefficients[predicted]
+        proba = np.exp(logits - logits.max(axis=1, keepdims=True))
+        proba /= proba.sum(axis=1, keepdims=True)
+
+        top = min(top, X.shape[1])
+        magnitude = np.abs(contributions)
+        features = np.argpartition(-magnitude, top - 1, axis=1)[:, :top]
+        order = np.argsort(-np.take_along_axis(magnitude, features, axis=1), axis=1, kind="stable")
+        features = np.take_along_axis(features, order, axis=1)
+        return (
+            predicted,
+            proba,
+            features,
+            np.take_along_axis(contributions, features, axis=1),
+            np.take_along_axis(X, features, axis=1),
+        )
+
+
+def assembled_feature_names(model) -> List[str]:
+    """Names of the features going into the model's last stage.
+
+    Read from the ML attribute metadata Spark attaches to the final
+    VectorAssembler output (a transform of an empty DataFrame, so no job
+    runs). Scaled slots, which Spark only names `<column>_<i>`, take the
+    names of the scaler's input; one-hot slots become `column=value`.
+    """
+    from pyspark.ml.feature import OneHotEncoderModel, StandardScalerModel, StringIndexerModel, VectorAssembler
+    from app.spark_service import spark_service
+
+    schema = spark_service.get_input_schema()
+    df = spark_service.add_engineered_features(spark_service.spark.createDataFrame([], schema))
+    transformed = model.transform(df)
+
+    def attribute_names(column: str) -> List[str]:
+        attrs = transformed.schema[column].metadata.get("ml_attr", {}).get("attrs", {})
+        return [name for _, name in sorted((a["idx"], a["name"]) for group in attrs.values() for a in group)]
+
+    features_col = model.stages[-1].getFeaturesCol()
+    renamed: Dict[str, str] = {}
+    prefixes: List[Tuple[str, str]] = []
+    raw_columns: Dict[str, str] = {}
+    for stage in model.stages[:-1]:
+        if isinstance(stage, StringIndexerModel):
+            raw_columns[stage.getOutputCol()] = stage.getInputCol()
+        elif isinstance(stage, OneHotEncoderModel):
+            raw = raw_columns.get(stage.getInputCol(), stage.getInputCol())
+            prefixes.append((f"{stage.getOutputCol()}_", f"{raw}="))
+        elif isinstance(stage, StandardScalerModel):
+            for i, name in enumerate(attribute_names(stage.getInputCol())):
+                renamed[f"{stage.getOutputCol()}_{i}"] = name
+        elif isinstance(stage, VectorAssembler) and stage.getOutputCol() != features_col:
+            prefixes.append((f"{stage.getOutputCol()}_", ""))
+
+    names = []
+    for name in attribute_names(features_col):
+        name = renamed.get(name, name)
+        for prefix, replacement in prefixes:
+            if name.startswith(prefix):
+                name = replacement + name[len(prefix):]
+                break
+        names.append(name)
+    return names
+
+
+def sample_inputs(n: int, seed: int = 0) -> List[Dict[str, Any]]:
+    """Generate random inputs covering the whole PredictionInput domain."""
+    from app.config import ROAD_TYPES, LIGHTING_OPTIONS, WEATHER_OPTIONS, TIME_OF_DAY_OPTIONS
+
+    rng = np.random.default_rng(seed)
+    curvature = np.round(rng.uniform(0.0, 1.0, n), 2)
+    # Exercise the high_curvature threshold exactly
+    curvature[rng.random(n) < 0.05] = 0.5
+    return [
+        {
+            "road_type": str(rng.choice(ROAD_TYPES)),
+            "num_lanes": int(rng.integers(1, 9)),
+            "curvature": float(curvature[i]),
+            "speed_limit": int(rng.integers(15, 121)),
+            "lighting": str(rng.choice(LIGHTING_OPTIONS)),
+            "weather": str(rng.choice(WEATHER_OPTIONS)),
+            "road_signs_present": bool(rng.integers(0, 2)),
+            "public_road": bool(rng.integers(0, 2)),
+            "time_of_day": str(rng.choice(TIME_OF_DAY_OPTIONS)),
+            "holiday": bool(rng.integers(0, 2)),
+            "school_season": bool(rng.integers(0, 2)),
+            "num_reported_accidents": int(rng.integers(0, 8)),
+        }
+        for i in range(n)
+    ]
+
+
+# Largest probability difference from Spark accepted by `verify_parity`
+PARITY_TOLERANCE = 1e-6
+
+
+def verify_parity(scorer: NumpyScorer, model, n: int = 5000, seed: int = 0) -> Dict[str, Any]:
+    """Compare NumPy scores against Spark `transform` of `model` on generated inputs.
+
+    `passed` is set when every label matches and no probability differs by
+    more than PARITY_TOLERANCE.
+    """
+    from app.spark_service import spark_service
+
+    data = sample_inputs(n, seed)
+    columns = rows_to_columns(data)
+    df = spark_service.add_engineered_features(
+        spark_service.spark.createDataFrame(
+            [tuple(d.values()) for d in data], spark_service.get_input_schema()
+        )
+    )
+    rows = model.transform(df).select("prediction", "probability").collect()
+    spark_pred = np.array([int(r["prediction"]) for r in rows])
+    spark_prob = np.array([r["probability"].toArray() for r in rows])
+
+    np_pred = scorer.predict_columns(columns)
+    np_prob = scorer.predict_proba_columns(columns)
+    label_mismatches = int((spark_pred != np_pred).sum())
+    max_probability_diff = float(np.abs(spark_prob - np_prob).max())
+    return {
+        "rows": n,
+        "label_mismatches": label_mismatches,
+        "max_probability_diff": max_probability_diff,
+        "tolerance": PARITY_TOLERANCE,
+        "passed": label_mismatches == 0 and max_probability_diff <= PARITY_TOLERANCE,
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    from app.config import MODEL_PATH, SCORER_ARTIFACT_PATH
+
+    parser = argparse.ArgumentParser(description="Compile the Spark pipeline into a NumPy scorer")
+    parser.add_argument("--model-path", default=MODEL_PATH)
+    parser.add_argument("--output", default=SCORER_ARTIFACT_PATH)
+    parser.add_argument("--verify", type=int, default=0, metavar="N",
+                        help="check parity against Spark on N generated rows")
+    args = parser.parse_args(argv)
+
+    from pyspark.ml import PipelineModel
+    from app.spark_service import spark_service
+
+    _ = spark_service.spark
+    model = PipelineModel.load(args.model_path)
+    scorer = NumpyScorer.from_pipeline_model(model, model_uid=read_model_uid(args.model_path))
+    scorer.save(args.output)
+    print(f"✅ Scorer written to {args.output} "
+          f"({len(scorer.numeric_columns)} numeric columns, {len(scorer.tables)} categorical)")
+
+    if args.verify:
+        start = time.perf_counter()
+        report = verify_parity(scorer, model, n=args.verify)
+        report["seconds"] = round(time.perf_counter() - start, 2)
+        print(json.dumps(report))
+        if not report["passed"]:
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
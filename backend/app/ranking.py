@@ -0,0 +1,189 @@
+"""Top-k riskiest segments, overall or per group.
+
+Ranks segments by the predicted probability of one risk level (default
+"high") and keeps the `k` highest, optionally per value of a grouping
+column such as `road_type` or `time_of_day`. Only those rows are
+returned, with all class probabilities.
+
+- Uploads (`POST /api/predict/top`): the file is scored once and the
+  selection is a vectorized sort of the probability column per group.
+- Datasets (`python -m app.ranking`): scoring and selection run on Spark.
+  Without groups `orderBy(...).limit(k)` plans a bounded per-partition
+  sort (TakeOrderedAndProject); with groups the `row_number() <= k` filter
+  becomes a per-partition WindowGroupLimit before the shuffle. Either way
+  the driver only receives `k` rows per group.
+
+    python -m app.ranking ../data/test.csv --k 100
+    python -m app.ranking roads.parquet --k 20 --by road_type time_of_day --output top.csv
+"""
+import argparse
+import json
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+# Columns a ranking may be grouped by
+GROUP_COLUMNS = ["road_type", "lighting", "weather", "time_of_day", "num_lanes", "speed_limit",
+                 "road_signs_present", "public_road", "holiday", "school_season"]
+
+
+def top_k_indices(scores: np.ndarray, k: int, groups: Optional[np.ndarray] = None) -> np.ndarray:
+    """Positions of the `k` highest scores (per group if `groups` is given).
+
+    Ordered by group (first appearance), then score descending; ties keep
+    row order.
+    """
+    scores = np.asarray(scores, dtype=np.float64)
+    n = len(scores)
+    if n == 0 or k <= 0:
+        return np.empty(0, dtype=np.int64)
+    if groups is None:
+        if k < n:
+            # Partial selection first, then sort only the k survivors
+            candidates = np.argpartition(-scores, k - 1)[:k]
+            threshold = scores[candidates].min()
+            candidates = np.flatnonzero(scores >= threshold)
+        else:
+            candidates = np.arange(n)
+        order = candidates[np.lexsort((candidates, -scores[candidates]))]
+        return order[:k]
+    codes = pd.factorize(pd.Series(groups), sort=False)[0]
+    order = np.lexsort((np.arange(n), -scores, codes))
+    sorted_codes = codes[order]
+    starts = np.flatnonzero(np.r_[True, sorted_codes[1:] != sorted_codes[:-1]])
+    rank = np.arange(n) - np.repeat(starts, np.diff(np.r_[starts, n]))
+    return order[rank < k]
+
+
+def rank_upload(df: pd.DataFrame, validation, k: int, by: Optional[List[str]],
+                risk_level: str) -> Dict[str, Any]:
+    """Top `k` valid rows of an upload by P(`risk_level`), per `by` group."""
+    from app.spark_service import spark_service
+
+    clean = validation.clean
+    label_map = spark_service.get_label_map()
+    class_index = {label: i for i, label in label_map.items()}
+    if risk_level not in class_index:
+        from fastapi import HTTPException
+        raise HTTPException(status_code=400, detail=f"Unknown risk level '{risk_level}'")
+
+    results = []
+    if len(clean):
+        labels, proba = spark_service.score_frame(clean)
+        # Group ids in first-appearance order, without building string keys per row
+        groups = clean.groupby(by, sort=False).ngroup().to_numpy() if by else None
+        selected = top_k_indices(proba[:, class_index[risk_level]], k, groups)
+        rows = clean.iloc[selected]
+        positions = clean.index.to_numpy()[selected]
+        records = rows.to_dict("records")
+        for pos, i, record in zip(positions.tolist(), selected.tolist(), records):
+            results.append({
+                "row": pos,
+                "group": {c: record[c] for c in by} if by else None,
+                "accident_risk_level": labels[i],
+                "probability": round(float(proba[i, class_index[risk_level]]), 6),
+                "probabilities": {label: round(float(proba[i, idx]), 6) for idx, label in label_map.items()},
+                "input_data": record,
+            })
+    return {
+        "k": k,
+        "by": by or [],
+        "risk_level": risk_level,
+        "total_count": len(df),
+        "error_count": len(validation.errors),
+        "results": results,
+    }
+
+
+def top_k_spark(df, score_col: str, k: int, by: Optional[List[str]] = None):
+    """Top `k` rows of a Spark DataFrame by `score_col`, per `by` group (lazy)."""
+    from pyspark.sql import Window
+    from pyspark.sql import functions as F
+
+    if not by:
+        return df.orderBy(F.col(score_col).desc()).limit(k)
+    window = Window.partitionBy(*by).orderBy(F.col(score_col).desc())
+    return (df.withColumn("rank", F.row_number().over(window))
+              .where(F.col("rank") <= k)
+              .orderBy(*by, "rank"))
+
+
+def run(
+    inputs: List[str],
+    k: int = 100,
+    by: Optional[List[str]] = None,
+    risk_level: str = "high",
+    output: Optional[str] = None,
+    model_version: Optional[str] = None,
+    partitions: Optional[int] = None,
+    master: str = "local[*]",
+    driver_memory: str = "4g",
+    explain: bool = False,
+) -> Dict[str, Any]:
+    """Score `inputs` on Spark and return (or write) the top-k rows."""
+    from pyspark.ml import PipelineModel
+    from pyspark.sql import functions as F
+
+    from app.bulk_score import CLASS_RISK, build_session, read_input, score_dataframe
+    from app.model_registry import current_version, model_path
+
+    started = time.perf_counter()
+    spark = build_session(master, driver_memory)
+    version = model_version or current_version()
+    model = PipelineModel.load(model_path(version))
+    labels = list(model.stages[0].labels)
+    if risk_level not in labels:
+        raise ValueError(f"Unknown risk level '{risk_level}' (model levels: {', '.join(labels)})")
+    risk_values = {label: CLASS_RISK.get(label, 0.0) for label in labels}
+
+    df = read_input(spark, inputs)
+    if partitions:
+        df = df.repartition(partitions)
+    scored = score_dataframe(df, model, labels, risk_values, probabilities=True, include_input=True)
+    scored = scored.where(F.col("valid")).drop("valid", "error")
+    top = top_k_spark(scored, f"p_{risk_level}", k, by)
+    if explain:
+        top.explain()
+    result = top.toPandas()
+    elapsed = time.perf_counter() - started
+
+    if output:
+        if output.endswith(".parquet"):
+            result.to_parquet(output, index=False)
+        else:
+            result.to_csv(output, index=False)
+    return {
+        "model_version": version,
+        "k": k,
+        "by": by or [],
+        "risk_level": risk_level,
+        "rows_returned": len(result),
+        "elapsed_s": round(elapsed, 2),
+        "output": output,
+        "results": None if output else json.loads(result.to_json(orient="records")),
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m app.ranking", description="Top-k riskiest segments")
+    parser.add_argument("inputs", nargs="+", help="CSV or Parquet files or directories")
+    parser.add_argument("--k", type=int, default=100, help="rows to keep (per group)")
+    parser.add_argument("--by", nargs="+", choices=GROUP_COLUMNS, help="rank within groups of these columns")
+    parser.add_argument("--risk-level", default="high", help="rank by the probability of this level")
+    parser.add_argument("--output", help="write the rows to a .csv or .parquet file instead of printing them")
+    parser.add_argument("--model-version", help="model version (default: the one being served)")
+    parser.add_argument("--partitions", type=int, help="repartition the input into N tasks")
+    parser.add_argument("--master", default="local[*]")
+    parser.add_argument("--driver-memory", default="4g")
+    parser.add_argument("--explain", action="store_true", help="print the physical plan")
+    args = parser.parse_args(argv)
+
+    summary = run(args.inputs, args.k, args.by, args.risk_level, args.output, args.model_version,
+                  args.partitions, args.master, args.driver_memory, args.explain)
+    print(json.dumps(summary, indent=2, default=str))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+"""Replay captured traffic (see app/capture.py) against a running instance.
+
+    python -m app.replay captures/ --url http://127.0.0.1:8000 --speed 1
+    python -m app.replay captures/capture-20250101T120000-4242-0001.jsonl.gz --speed 4 --output replay.json
+
+Requests are sent with their recorded spacing divided by `--speed` (0 sends
+them back to back, up to `--max-in-flight` at a time), so bursts, repeated
+segments and concurrency peaks of the captured traffic are reproduced.
+At most `--max-in-flight` requests are open at once; when the target cannot
+keep up, requests start late and the schedule lag in the report grows.
+
+The report has per-endpoint latency percentiles of the replay next to the
+captured ones, status codes, transport errors and how many responses
+differ from the captured ones (by hash; predictions are deterministic, so
+a change there means a model or scoring change). Requests captured
+without a payload are skipped.
+
+Captured latencies are measured in the server, replayed ones in this
+client (connection and client time included), so compare a replay
+against a replay of the same log on the baseline code, not against
+the captured numbers.
+"""
+import argparse
+import asyncio
+import json
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from app.capture import body_hash, capture_files, read_capture
+
+
+def load_records(paths: List[str], only_paths: Optional[List[str]] = None,
+                 limit: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Captured records of all log files in `paths`, in arrival order."""
+    records = []
+    for path in capture_files(paths):
+        for record in read_capture(path):
+            if only_paths and record["path"] not in only_paths:
+                continue
+            records.append(record)
+    # Files of several workers overlap in time
+    records.sort(key=lambda r: r["ts"])
+    return records[:limit] if limit else records
+
+
+def _percentiles(latencies_ms: List[float]) -> Dict[str, Optional[float]]:
+    if not latencies_ms:
+        return {"p50_ms": None, "p95_ms": None, "p99_ms": None, "mean_ms": None}
+    p50, p95, p99 = np.percentile(latencies_ms, [50, 95, 99])
+    return {"p50_ms": round(float(p50), 3), "p95_ms": round(float(p95), 3),
+            "p99_ms": round(float(p99), 3), "mean_ms": round(float(np.mean(latencies_ms)), 3)}
+
+
+async def _replay(records: List[Dict[str, Any]], url: str, speed: float, max_in_flight: int,
+                  timeout_s: float) -> Dict[str, Any]:
+    import httpx
+
+    endpoints: Dict[str, Dict[str, Any]] = {}
+    lags: List[float] = []
+    skipped = 0
+    slots = asyncio.Semaphore(max_in_flight)
+
+    def endpoint(path: str) -> Dict[str, Any]:
+        if path not in endpoints:
+            endpoints[path] = {"captured": [], "replayed": [], "statuses": {}, "errors": 0,
+                               "status_changed": 0, "response_changed": 0}
+        return endpoints[path]
+
+    async def send(client, record: Dict[str, Any]) -> None:
+        stats = endpoint(record["path"])
+        headers = {k: record[f] for k, f in (("content-type", "content_type"), ("accept", "accept")) if record.get(f)}
+        target = record["path"] + (f"?{record['query']}" if record["query"] else "")
+        try:
+            started = time.perf_counter()
+            response = await client.request(record["method"], target, content=record["payload"], headers=headers)
+            latency_ms = (time.perf_counter() - started) * 1000
+        except httpx.HTTPError:
+            stats["errors"] += 1
+            return
+        finally:
+            slots.release()
+        key = str(response.status_code)
+        stats["statuses"][key] = stats["statuses"].get(key, 0) + 1
+        stats["captured"].append(record["latency_ms"])
+        stats["replayed"].append(latency_ms)
+        if response.status_code != record["status"]:
+            stats["status_changed"] += 1
+        elif response.status_code == 200 and body_hash(response.content) != record["response_hash"]:
+            stats["response_changed"] += 1
+
+    tasks = []
+    started = time.perf_counter()
+    first = records[0]["ts"] if records else 0.0
+    limits = httpx.Limits(max_connections=max_in_flight, max_keepalive_connections=max_in_flight)
+    async with httpx.AsyncClient(base_url=url, timeout=timeout_s, limits=limits) as client:
+        for record in records:
+            if record["payload"] is None:
+                skipped += 1
+                continue
+            due = started + (record["ts"] - first) / speed if speed > 0 else started
+            delay = due - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            await slots.acquire()
+            if speed > 0:
+                lags.append(max(time.perf_counter() - due, 0.0) * 1000)
+            tasks.append(asyncio.create_task(send(client, record)))
+        await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - started
+
+    span = records[-1]["ts"] - first if records else 0.0
+    sent = len(records) - skipped
+    report = {
+        "url": url,
+        "speed": speed,
+        "records": len(records),
+        "sent": sent,
+        "skipped_no_payload": skipped,
+        "captured_span_s": round(span, 3),
+        "replay_s": round(elapsed, 3),
+        "requests_per_s": round(sent / elapsed, 1) if elapsed > 0 else None,
+        "schedule_lag_ms": {
+            "p50": round(float(np.percentile(lags, 50)), 3),
+            "p99": round(float(np.percentile(lags, 99)), 3),
+            "max": round(max(lags), 3),
+        } if lags else None,
+        "endpoints": {},
+    }
+    for path, stats in sorted(endpoints.items()):
+        report["endpoints"][path] = {
+            "requests": len(stats["replayed"]) + stats["errors"],
+            "statuses": stats["statuses"],
+            "errors": stats["errors"],
+            "status_changed": stats["status_changed"],
+            "response_changed": stats["response_changed"],
+            "captured": _percentiles(stats["captured"]),
+            "replayed": _percentiles(stats["replayed"]),
+        }
+    return report
+
+
+def replay(paths: List[str], url: str = "http://127.0.0.1:8000", speed: float = 1.0,
+           max_in_flight: int = 64, only_paths: Optional[List[str]] = None,
+           limit: Optional[int] = None, timeout_s: float = 600.0) -> Dict[str, Any]:
+    """Send the captured requests in `paths` to `url` and report how they fared."""
+    records = load_records(paths, only_paths, limit)
+    return asyncio.run(_replay(records, url.rstrip("/"), speed, max_in_flight, timeout_s))
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m app.replay", description="Replay captured traffic")
+    parser.add_argument("captures", nargs="+", help="capture files or directories")
+    parser.add_argument("--url", default="http://127.0.0.1:8000", help="instance to send the requests to")
+    parser.add_argument("--speed", type=float, default=1.0,
+                        help="time compression: 1 = as captured, 4 = four times faster, 0 = back to back")
+    parser.add_argument("--max-in-flight", type=int, default=64, help="most requests open at once")
+    parser.add_argument("--paths", nargs="+", help="only replay these endpoints (e.g. /api/predict)")
+    parser.add_argument("--limit", type=int, help="only the first N captured requests")
+    parser.add_argument("--timeout", type=float, default=600.0, help="seconds per request")
+    parser.add_argument("--output", help="also write the report to this file")
+    args = parser.parse_args(argv)
+
+    report = replay(args.captures, args.url, args.speed, args.max_in_flight, args.paths, args.limit, args.timeout)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
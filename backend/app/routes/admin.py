@@ -0,0 +1,47 @@
+"""Model version administration routes."""
+import asyncio
+import hmac
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Request
+
+from app.config import ADMIN_TOKEN
+from app.models import ModelReloadRequest, ModelStatus
+from app.spark_service import spark_service
+
+
+def require_admin(request: Request, x_admin_token: Optional[str] = Header(None)):
+    """Allow callers with ADMIN_TOKEN, or local callers when no token is set."""
+    if ADMIN_TOKEN:
+        if x_admin_token is None or not hmac.compare_digest(x_admin_token, ADMIN_TOKEN):
+            raise HTTPException(status_code=401, detail="Invalid or missing X-Admin-Token")
+    elif request.client is None or request.client.host not in ("127.0.0.1", "::1"):
+        raise HTTPException(status_code=403, detail="Admin endpoints are local-only unless ADMIN_TOKEN is set")
+
+
+router = APIRouter(prefix="/admin/models", tags=["admin"], dependencies=[Depends(require_admin)])
+
+
+@router.get("", response_model=ModelStatus)
+async def model_status():
+    """Serving and previous model versions, versions on disk and reload state."""
+    return await asyncio.to_thread(spark_service.model_status)
+
+
+@router.post("/reload", response_model=ModelStatus)
+async def reload_model(request: Optional[ModelReloadRequest] = None):
+    """
+    Load a model version, warm it up and swap it in without downtime.
+
+    Predictions keep using the current model until the new one is warm.
+    The new version must map predictions to the same labels. It is recorded
+    in MODELS_DIR/CURRENT, so other workers and restarts follow.
+    """
+    version = request.version if request is not None else None
+    return await asyncio.to_thread(spark_service.reload, version)
+
+
+@router.post("/rollback", response_model=ModelStatus)
+async def rollback_model():
+    """Swap back to the model version replaced by the last reload."""
+    return await asyncio.to_thread(spark_service.rollback)
@@ -0,0 +1,75 @@
+"""Asynchronous batch job routes."""
+import asyncio
+from typing import List
+
+from fastapi import APIRouter, UploadFile, File, Query
+from fastapi.responses import FileResponse
+
+from app.config import JOB_PAGE_MAX
+from app.jobs import job_manager
+from app.models import BatchJob, BatchJobPage
+
+router = APIRouter(prefix="/predict/jobs", tags=["jobs"])
+
+
+@router.post("", response_model=BatchJob, status_code=202)
+async def submit_job(file: UploadFile = File(...)):
+    """
+    Submit a file for asynchronous batch scoring.
+    
+    Accepts the same formats as `/predict/batch`. The file is stored and
+    scored in the background; poll the returned job for progress.
+    """
+    return await asyncio.to_thread(job_manager.submit, file.file, file.filename, file.content_type)
+
+
+@router.get("", response_model=List[BatchJob])
+async def list_jobs():
+    """List batch jobs, newest first."""
+    return await asyncio.to_thread(job_manager.list_jobs)
+
+
+@router.get("/{job_id}", response_model=BatchJob)
+async def get_job(job_id: str):
+    """Get the status and progress (rows done, errors, ETA) of a job."""
+    return await asyncio.to_thread(job_manager.get, job_id)
+
+
+# Jobs never explain predictions
+@router.get("/{job_id}/results", response_model=BatchJobPage,
+            response_model_exclude={"predictions": {"__all__": {"explanation"}}})
+async def get_job_results(
+    job_id: str,
+    offset: int = Query(0, ge=0, description="First row to return"),
+    limit: int = Query(100, ge=1, le=JOB_PAGE_MAX, description="Rows per page"),
+):
+    """
+    Get one page of results.
+    
+    Rows become available chunk by chunk while the job runs; follow
+    `next_offset` until it is null.
+    """
+    return await asyncio.to_thread(job_manager.results_page, job_id, offset, limit)
+
+
+@router.get("/{job_id}/download")
+async def download_job_results(job_id: str):
+    """Download all results of a completed job as one Parquet file."""
+    path = await asyncio.to_thread(job_manager.results_file, job_id)
+    return FileResponse(
+        path,
+        media_type="application/vnd.apache.parquet",
+        filename=f"predictions-{job_id}.parquet",
+    )
+
+
+@router.post("/{job_id}/cancel", response_model=BatchJob)
+async def cancel_job(job_id: str):
+    """Cancel a queued or running job; chunks already scored are kept."""
+    return await asyncio.to_thread(job_manager.cancel, job_id)
+
+
+@router.post("/{job_id}/resume", response_model=BatchJob)
+async def resume_job(job_id: str):
+    """Resume a cancelled or failed job from its first unscored chunk."""
+    return await asyncio.to_thread(job_manager.resume, job_id)
@@ -0,0 +1,30 @@
+"""Monitoring routes."""
+import asyncio
+
+from fastapi import APIRouter, Depends, Query
+
+from app.drift import drift_monitor
+from app.routes.admin import require_admin
+
+router = APIRouter(prefix="/monitoring", tags=["monitoring"])
+
+
+@router.get("/drift")
+async def drift_report(
+    window: str = Query("recent", pattern="^(recent|total)$", description="Last DRIFT_WINDOW_S seconds or since start"),
+):
+    """
+    Compare live inputs and predictions with the training data.
+    
+    Reports the live distribution of every field and of the predicted risk
+    level and, when the serving model has a reference profile, their PSI and
+    KL divergence from it with a status per field (stable, warning, drift).
+    """
+    return await asyncio.to_thread(drift_monitor.report, window)
+
+
+@router.post("/drift/reset", dependencies=[Depends(require_admin)])
+async def reset_drift():
+    """Clear the live counts (admin), e.g. after retraining on recent data."""
+    drift_monitor.reset()
+    return {"status": "reset"}
@@ -1,35 +1,130 @@
 """Prediction routes."""
-import io
-from fastapi import APIRouter, UploadFile, File, HTTPException
-from typing import List
+import asyncio
+import gc
+import time
+from contextlib import contextmanager
+from fastapi import APIRouter, Depends, UploadFile, File, Header, HTTPException, Query
+from fastapi.responses import Response, StreamingResponse
+from typing import BinaryIO, Iterator, List, Optional, Tuple
+import numpy as np
 import pandas as pd
-from pydantic import ValidationError
 
 from app.models import (
     PredictionInput, 
     PredictionResult, 
     BatchPredictionResult,
-    RiskLevel
+    CompactBatchPredictionResult,
+    RiskLevel,
+    SweepRequest,
+    SweepResult,
+    TopKResult,
 )
 from app.spark_service import spark_service
+from app.batching import prediction_batcher
+from app.config import MICRO_BATCH_ENABLED, RETRY_AFTER_S, SWEEP_MAX_POINTS, STREAM_CHUNK_ROWS, TOP_K_MAX
+from app.streaming import CsvPredictionStream, open_csv_stream
+from app.sweep import axis_size, sweep_grid
+from app.ranking import GROUP_COLUMNS, rank_upload
+from app.summaries import grouped_summaries
+from app.drift import drift_monitor
+from app.executor import DeadlineExceeded, Overloaded, single_executor, batch_executor
+from app.validation import FrameValidation, validate_frame
+from app.metrics import current_trace, set_rows, stage
+from app.batch_formats import (
+    COMPACT_MEDIA_TYPE,
+    RESPONSE_FILES,
+    detect_format,
+    encode_compact,
+    encode_predictions,
+    read_batch_frame,
+    select_response_format,
+)
+
+
+async def require_model_ready():
+    """Answer 503 until the serving model is loaded and warmed up.
+    
+    Requests never load the model themselves: that would hold the event
+    loop (or a pool thread) while the background loader runs.
+    """
+    if not spark_service.is_ready():
+        raise HTTPException(
+            status_code=503,
+            detail="Model is loading, retry later",
+            headers={"Retry-After": str(RETRY_AFTER_S)},
+        )
+
 
-router = APIRouter(prefix="/predict", tags=["predictions"])
+router = APIRouter(prefix="/predict", tags=["predictions"], dependencies=[Depends(require_model_ready)])
 
 
-def create_prediction_result(risk_level: str, input_data: dict = None) -> PredictionResult:
+def create_prediction_result(
+    risk_level: str, input_data: dict = None, explanation: List[dict] = None
+) -> PredictionResult:
     """Create a PredictionResult from risk level string."""
     return PredictionResult(
         accident_risk_level=RiskLevel(risk_level),
-        input_data=input_data
+        input_data=input_data,
+        explanation=explanation,
     )
 
 
+def prediction_response(result: PredictionResult) -> Response:
+    """JSON of a single prediction, with an `explanation` key only if it has one."""
+    exclude = {"explanation"} if result.explanation is None else None
+    return Response(content=result.model_dump_json(exclude=exclude), media_type="application/json")
+
+
+def explanation_records(
+    names: List[str], features: np.ndarray, contributions: np.ndarray, values: np.ndarray
+) -> List[List[dict]]:
+    """Per-row lists of {feature, value, contribution} from `explain_frame` arrays."""
+    names = np.asarray(names, dtype=object)
+    return [
+        [{"feature": f, "value": v, "contribution": c} for f, v, c in zip(row_f, row_v, row_c)]
+        for row_f, row_v, row_c in zip(
+            names[features].tolist(), values.round(6).tolist(), contributions.round(6).tolist()
+        )
+    ]
+
+
+@contextmanager
+def gc_paused() -> Iterator[None]:
+    """Pause cyclic garbage collection while building many small containers.
+    
+    Per-row explanation lists and dicts hold no cycles, but allocating
+    millions of them triggers full collections that walk the whole heap
+    again and again (more than half the time of a verbose explained batch).
+    """
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def explain_single(data: dict, top_features: int) -> Tuple[str, List[dict]]:
+    """Risk level and explanation of one validated input (runs in a worker thread)."""
+    labels, _, names, features, contributions, values = spark_service.explain_frame(
+        pd.DataFrame([data]), top_features
+    )
+    return labels[0], explanation_records(names, features, contributions, values)[0]
+
+
 @router.post("", response_model=PredictionResult)
-async def predict_single(input_data: PredictionInput):
+async def predict_single(
+    input_data: PredictionInput,
+    explain: bool = Query(False, description="Add the features contributing most to the prediction"),
+    top_features: int = Query(5, ge=1, le=50, description="Features per explanation"),
+):
     """
     Predict accident risk for a single road segment.
     
-    Returns the predicted accident risk level (low/medium/high).
+    Returns the predicted accident risk level (low/medium/high). With
+    `explain=true` it also lists the model features that contributed most
+    (scaled value times the coefficient of the predicted level).
     """
     try:
         # Convert Pydantic model to dict with enum values as strings
@@ -48,101 +143,351 @@ async def predict_single(input_data: PredictionInput):
             "num_reported_accidents": input_data.num_reported_accidents,
         }
         
-        risk_level = spark_service.predict_single(data)
-        return create_prediction_result(risk_level, data)
+        set_rows(1)
+        if explain:
+            risk_level, explanation = await single_executor.run(explain_single, data, top_features)
+            return prediction_response(create_prediction_result(risk_level, data, explanation))
+        
+        risk_level = spark_service.get_cached(data)
+        if risk_level is None and MICRO_BATCH_ENABLED:
+            try:
+                risk_level = await asyncio.wait_for(
+                    prediction_batcher.submit(data), single_executor.deadline_s
+                )
+            except asyncio.TimeoutError:
+                raise DeadlineExceeded("single", single_executor.deadline_s)
+        elif risk_level is None:
+            risk_level = await single_executor.run(spark_service.predict_single, data)
+        drift_monitor.observe_record(data, risk_level)
+        return prediction_response(create_prediction_result(risk_level, data))
     
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Prediction failed: {str(e)}")
 
 
-@router.post("/batch", response_model=BatchPredictionResult)
-async def predict_batch(file: UploadFile = File(...)):
+@router.post("/sweep", response_model=SweepResult)
+async def predict_sweep(request: SweepRequest):
     """
-    Predict accident risk for multiple road segments from a CSV file.
+    Score a what-if grid around a base input.
     
-    The CSV file should contain columns matching the input features.
-    Returns predictions for each row along with summary statistics.
+    Varies one or two fields (e.g. curvature 0-1 or weather x lighting) and
+    returns row-major arrays of predicted labels and class probabilities.
     """
-    if not file.filename.endswith('.csv'):
-        raise HTTPException(status_code=400, detail="Only CSV files are accepted")
+    base = request.base.model_dump(mode="json")
+    fields = [axis.field for axis in request.axes]
+    if len(set(fields)) != len(fields):
+        raise HTTPException(status_code=400, detail="Sweep axes must vary different fields")
+    
+    # Checked from the request alone, before any value is generated
+    size = 1
+    for axis in request.axes:
+        size *= axis_size(axis)
+    if size > SWEEP_MAX_POINTS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Sweep grid has {size} points, the limit is {SWEEP_MAX_POINTS}"
+        )
     
     try:
-        # Read CSV content
-        content = await file.read()
-        df = pd.read_csv(io.StringIO(content.decode('utf-8')))
-        
-        # Required columns
-        required_columns = [
-            "road_type", "num_lanes", "curvature", "speed_limit",
-            "lighting", "weather", "road_signs_present", "public_road",
-            "time_of_day", "holiday", "school_season", "num_reported_accidents"
-        ]
-        
-        # Validate columns
-        missing_cols = set(required_columns) - set(df.columns)
-        if missing_cols:
-            raise HTTPException(
-                status_code=400, 
-                detail=f"Missing required columns: {', '.join(missing_cols)}"
-            )
-        
-        # Convert DataFrame to list of dicts
-        data_list = df[required_columns].to_dict('records')
-        
-        # Validate each row and prepare for processing
-        valid_indices = []
-        valid_data = []
-        all_results = [None] * len(data_list)
-        
-        for idx, row in enumerate(data_list):
-            try:
-                # Validate
-                PredictionInput(**row)
-                valid_indices.append(idx)
-                valid_data.append(row)
-            except ValidationError as e:
-                # Capture error
-                error_msg = "; ".join([f"{' -> '.join(str(l) for l in err['loc'])}: {err['msg']}" for err in e.errors()])
-                all_results[idx] = PredictionResult(
-                    input_data=row,
-                    error=f"Row {idx + 1}: {error_msg}"
-                )
-            except Exception as e:
-                all_results[idx] = PredictionResult(
-                    input_data=row,
-                    error=f"Row {idx + 1}: {str(e)}"
-                )
-        
-        # Make predictions only for valid rows
-        if valid_data:
-            risk_levels = spark_service.predict_batch(valid_data)
-            for i, risk_level in enumerate(risk_levels):
-                original_idx = valid_indices[i]
-                data = valid_data[i]
-                all_results[original_idx] = create_prediction_result(risk_level, data)
-        
-        # Filter out any lingering Nones
-        predictions = [res for res in all_results if res is not None]
-        
-        # Calculate summary statistics
-        valid_predictions = [p for p in predictions if p.error is None]
-        
-        # Count by risk level
-        risk_counts = {"low": 0, "medium": 0, "high": 0}
-        for p in valid_predictions:
-            if p.accident_risk_level:
-                risk_counts[p.accident_risk_level.value] += 1
+        axes, columns = await asyncio.to_thread(sweep_grid, base, request.axes)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    shape = [len(values) for _, values in axes]
+    size = len(next(iter(columns.values())))
+    try:
+        set_rows(size)
+        indices, proba = await single_executor.run(spark_service.predict_columns, columns)
         
-        return BatchPredictionResult(
-            predictions=predictions,
-            total_count=len(predictions),
-            summary={
-                "risk_distribution": risk_counts,
-                "error_count": len(predictions) - len(valid_predictions),
-            }
+        label_map = spark_service.get_label_map()
+        return SweepResult(
+            axes=[{"field": field, "values": values} for field, values in axes],
+            shape=shape,
+            labels=[label_map.get(int(i), "medium") for i in indices],
+            probabilities={
+                label: proba[:, idx].round(6).tolist() for idx, label in label_map.items()
+            },
+        )
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Sweep prediction failed: {str(e)}")
+
+
+@router.post(
+    "/batch",
+    response_model=BatchPredictionResult,
+    responses={200: {"content": {COMPACT_MEDIA_TYPE: {"schema": CompactBatchPredictionResult.model_json_schema()}}}},
+)
+async def predict_batch(
+    file: UploadFile = File(...),
+    accept: Optional[str] = Header(None),
+    mode: Optional[str] = Query(None, pattern="^(verbose|compact)$", description="Response mode; overrides Accept"),
+    labels: str = Query("strings", pattern="^(strings|codes)$", description="Compact mode: label strings or class-index codes"),
+    include_input: bool = Query(False, description="Compact mode: echo the inputs column by column"),
+    breakdown: bool = Query(False, description="Add risk summaries per category and histograms per risk level"),
+    explain: bool = Query(False, description="JSON modes: add the features contributing most to each prediction"),
+    top_features: int = Query(5, ge=1, le=50, description="Features per explanation"),
+):
+    """
+    Predict accident risk for multiple road segments from an uploaded file.
+    
+    Accepts CSV (optionally .csv.gz / .csv.zst), Parquet and Arrow
+    IPC/Feather files with columns matching the input features. Returns
+    predictions for each row along with summary statistics, as JSON or, if
+    the Accept header asks for it, as an Arrow IPC stream or Parquet file.
+    
+    `mode=compact` (or `Accept: application/vnd.trafficsafe.compact+json`)
+    returns column-oriented JSON: one label array, errors only for failing
+    rows and, optionally, the inputs.
+    
+    `breakdown=true` adds to the summary the risk distribution and mean
+    class probabilities per road type, weather, lighting and time of day,
+    and curvature/speed limit histograms per risk level.
+    
+    `explain=true` adds per-row feature contributions (verbose and compact
+    JSON only).
+    """
+    trace = current_trace()
+    if trace is not None:
+        # Receiving the multipart body happens before the handler runs
+        trace.add("upload", time.perf_counter() - trace.started)
+    try:
+        # Detect the format, then read/validate/score in the batch worker pool
+        input_format = detect_format(file.file, file.filename, file.content_type)
+        if mode is not None:
+            response_format = "compact" if mode == "compact" else None
+        else:
+            response_format = select_response_format(accept)
+        if explain and response_format not in (None, "compact"):
+            raise HTTPException(status_code=400, detail="explain=true needs a JSON response (verbose or compact)")
+        result = await batch_executor.run(
+            score_upload, file.file, input_format, response_format, labels == "codes", include_input,
+            breakdown, top_features if explain else 0
         )
     
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Batch prediction failed: {str(e)}")
+    
+    if trace is not None:
+        # Until the response starts
+        trace.begin("serialize")
+    if response_format in (None, "compact"):
+        # JSON encoded in the worker; the verbose schema is BatchPredictionResult
+        return Response(content=result, media_type="application/json")
+    media_type, filename = RESPONSE_FILES[response_format]
+    return Response(
+        content=result,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+@router.post("/top", response_model=TopKResult)
+async def predict_top(
+    file: UploadFile = File(...),
+    k: int = Query(10, ge=1, le=TOP_K_MAX, description="Rows to return (per group)"),
+    by: Optional[List[str]] = Query(None, description="Rank within groups of these columns"),
+    risk_level: RiskLevel = Query(RiskLevel.HIGH, description="Rank by the probability of this level"),
+):
+    """
+    Return the k road segments of an uploaded file most likely to be at a
+    given risk level, overall or per group (e.g. `by=road_type`).
+
+    Accepts the same formats as `/predict/batch`. Only the selected rows
+    are returned, each with its class probabilities.
+    """
+    unknown = sorted(set(by or []) - set(GROUP_COLUMNS))
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Cannot group by: {', '.join(unknown)}")
+    try:
+        input_format = detect_format(file.file, file.filename, file.content_type)
+        return await batch_executor.run(rank_file, file.file, input_format, k, by, risk_level.value)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Top-k prediction failed: {str(e)}")
+
+
+@router.post("/batch/stream")
+async def predict_batch_stream(
+    file: UploadFile = File(...),
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$", description="Output format: ndjson or csv"),
+):
+    """
+    Predict accident risk for a CSV file, streaming results as they are scored.
+    
+    The file is processed in fixed-size chunks so memory stays flat for any
+    input size. Output is NDJSON (one result per line) or CSV; the last
+    record carries the risk distribution and error count.
+    """
+    if not file.filename.endswith('.csv'):
+        raise HTTPException(status_code=400, detail="Only CSV files are accepted")
+    
+    try:
+        stream = await batch_executor.run(open_csv_stream, file.file, format, STREAM_CHUNK_ROWS)
+    except HTTPException:
+        raise
+    except pd.errors.EmptyDataError:
+        raise HTTPException(status_code=400, detail="CSV file is empty")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Batch prediction failed: {str(e)}")
+    
+    return StreamingResponse(iter_prediction_stream(stream), media_type=stream.media_type)
+
+
+async def iter_prediction_stream(stream: CsvPredictionStream):
+    """Yield encoded chunks, scoring each one in the batch worker pool."""
+    try:
+        while True:
+            try:
+                block = await batch_executor.run(stream.next_block)
+            except Overloaded:
+                # Output already started: wait for a free slot instead of failing
+                await asyncio.sleep(batch_executor.retry_after_s)
+                continue
+            if block is None:
+                break
+            yield block
+    except Exception as e:
+        detail = e.detail if isinstance(e, HTTPException) else str(e)
+        yield stream.error_block(f"Batch prediction failed: {detail}")
+    finally:
+        stream.close()
+
+
+def score_upload(
+    fileobj: BinaryIO,
+    input_format: str,
+    response_format: Optional[str] = None,
+    codes: bool = False,
+    include_input: bool = False,
+    breakdown: bool = False,
+    top_features: int = 0,
+) -> bytes:
+    """Read, validate and score an uploaded file (runs in a worker thread).
+    
+    `top_features` > 0 explains every valid row with that many features.
+    """
+    with stage("parse"):
+        df = read_batch_frame(fileobj, input_format)
+    set_rows(len(df))
+    
+    # Validate whole columns; only rows that fail are looked at one by one
+    with stage("validate"):
+        validation = validate_frame(df)
+    labels = np.full(len(df), None, dtype=object)
+    proba = None
+    explanation = None
+    if len(validation.clean):
+        # One scoring call per upload: each also records the rows for drift
+        if top_features:
+            labels[validation.clean.index], proba, *explanation = spark_service.explain_frame(
+                validation.clean, top_features
+            )
+        elif breakdown:
+            # Mean probabilities need the class probabilities, not just labels
+            labels[validation.clean.index], proba = spark_service.score_frame(validation.clean)
+        else:
+            labels[validation.clean.index] = spark_service.predict_frame(validation.clean)
+    
+    # Count by risk level
+    levels, counts = np.unique(labels[validation.valid_mask].astype(str), return_counts=True)
+    risk_counts = {"low": 0, "medium": 0, "high": 0}
+    risk_counts.update(zip(levels.tolist(), counts.tolist()))
+    summary = {
+        "risk_distribution": risk_counts,
+        "error_count": len(validation.errors),
+    }
+    if breakdown:
+        with stage("summarize"):
+            summary.update(grouped_summaries(
+                validation.clean, labels[validation.clean.index], proba, spark_service.get_label_map()
+            ))
+    with stage("serialize"):
+        return build_response(df, validation, labels, summary, response_format, codes, include_input, explanation)
+
+
+def rank_file(
+    fileobj: BinaryIO, input_format: str, k: int, by: Optional[List[str]], risk_level: str
+) -> dict:
+    """Read, validate and rank an uploaded file (runs in a worker thread)."""
+    with stage("parse"):
+        df = read_batch_frame(fileobj, input_format)
+    set_rows(len(df))
+    with stage("validate"):
+        validation = validate_frame(df)
+    return rank_upload(df, validation, k, by, risk_level)
+
+
+def compact_explanations(
+    n: int, validation: FrameValidation, names: List[str], features: np.ndarray,
+    contributions: np.ndarray, values: np.ndarray,
+) -> dict:
+    """Column-oriented explanations of `n` rows (null for invalid rows)."""
+    explanations = {"feature_table": list(names)}
+    positions = validation.clean.index.tolist()
+    for key, array in (("features", features), ("contributions", contributions.round(6)),
+                       ("values", values.round(6))):
+        column = [None] * n
+        for pos, row in zip(positions, array.tolist()):
+            column[pos] = row
+        explanations[key] = column
+    return explanations
+
+
+def build_response(
+    df: pd.DataFrame,
+    validation: FrameValidation,
+    labels: np.ndarray,
+    summary: dict,
+    response_format: Optional[str],
+    codes: bool,
+    include_input: bool,
+    explanation: Optional[list] = None,
+) -> bytes:
+    """Encode the results of a scored upload in the requested format.
+    
+    `explanation` holds the `explain_frame` arrays (names, features,
+    contributions, values) of the valid rows, if requested. Verbose JSON is
+    encoded here too (a BatchPredictionResult), so rows only carry an
+    `explanation` key when one was asked for.
+    """
+    if response_format == "compact":
+        explanations = None
+        if explanation is not None:
+            with gc_paused():
+                explanations = compact_explanations(len(df), validation, *explanation)
+        return encode_compact(df, validation, labels, summary, codes, include_input, explanations)
+    if response_format is not None:
+        return encode_predictions(labels, validation.errors, summary, response_format)
+    
+    all_results = [None] * len(df)
+    if validation.errors:
+        raw_rows = df.iloc[list(validation.errors)].to_dict('records')
+        for (idx, error), row in zip(validation.errors.items(), raw_rows):
+            all_results[idx] = PredictionResult(input_data=row, error=error)
+    
+    # Valid rows echo their coerced values
+    valid_data = validation.clean.to_dict('records')
+    if explanation is None:
+        for original_idx, data in zip(validation.clean.index, valid_data):
+            all_results[original_idx] = create_prediction_result(labels[original_idx], data)
+    else:
+        with gc_paused():
+            records = explanation_records(*explanation)
+            for original_idx, data, record in zip(validation.clean.index, valid_data, records):
+                all_results[original_idx] = create_prediction_result(labels[original_idx], data, record)
+    
+    result = BatchPredictionResult(
+        predictions=all_results,
+        total_count=len(all_results),
+        summary=summary,
+    )
+    exclude = {"predictions": {"__all__": {"explanation"}}} if explanation is None else None
+    return result.model_dump_json(exclude=exclude).encode()
@@ -0,0 +1,49 @@
+"""Segment registry routes."""
+import asyncio
+from typing import List
+
+from fastapi import APIRouter, HTTPException
+
+from app.config import SEGMENT_LOOKUP_MAX
+from app.models import SegmentInput, SegmentRiskRequest, SegmentRiskResult, SegmentUpsertResult
+from app.segments import segment_store
+
+router = APIRouter(prefix="/segments", tags=["segments"])
+
+
+@router.put("", response_model=SegmentUpsertResult)
+async def upsert_segments(segments: List[SegmentInput]):
+    """
+    Register segments or update their static attributes.
+    
+    Risk under every combination of conditions is (re)computed in the
+    background for new segments and segments whose attributes changed.
+    """
+    return await asyncio.to_thread(segment_store.upsert, [s.model_dump(mode="json") for s in segments])
+
+
+@router.post("/risk", response_model=SegmentRiskResult)
+async def lookup_risk(request: SegmentRiskRequest):
+    """
+    Get the precomputed risk of segments under the current conditions.
+    
+    Segments still waiting for recomputation return their previous risk
+    with `current: false` (null if never computed).
+    """
+    if len(request.segment_ids) > SEGMENT_LOOKUP_MAX:
+        raise HTTPException(status_code=400, detail=f"At most {SEGMENT_LOOKUP_MAX} segment ids per lookup")
+    return await asyncio.to_thread(
+        segment_store.lookup, request.segment_ids, request.conditions.model_dump(mode="json")
+    )
+
+
+@router.get("/status")
+async def segment_status():
+    """Registered segments, how many are current and the last background batch."""
+    return await asyncio.to_thread(segment_store.stats)
+
+
+@router.delete("/{segment_id}", status_code=204)
+async def delete_segment(segment_id: str):
+    """Remove a segment and its precomputed risk."""
+    await asyncio.to_thread(segment_store.delete, segment_id)
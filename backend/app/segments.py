@@ -0,0 +1,353 @@
+"""Segment registry with a materialized risk table.
+
+Road segments are registered once with their static attributes (road type,
+lanes, curvature, speed limit, signs, public road, reported accidents). Only
+the environmental fields change between requests, and they take few values:
+3 lightings x 3 weathers x 4 times of day x holiday x school season = 144
+conditions. The risk of every segment under every condition is scored ahead
+of time and stored in SQLite, so the current risk of thousands of segments
+is an indexed read instead of a model call.
+
+Tables (in SEGMENTS_DB, WAL mode so reads never wait for the writer):
+
+- `segments`: one row per segment id with its static attributes, a
+  `revision` bumped when they change and `scored_model`, the identity of
+  the model its risk rows were computed with (NULL until then)
+- `risk`: (segment, condition) -> level and class probabilities
+
+A background thread recomputes only segments whose `scored_model` is not
+the serving model: new or changed segments after an upsert, and every
+segment after a model reload. It scores SEGMENT_BATCH_SEGMENTS segments x
+144 conditions at a time through `SparkService.predict_columns`. Until a
+segment is recomputed, lookups return its previous risk marked
+`current: false`. With several API worker processes sharing the database,
+the one holding the lock on `<SEGMENTS_DB>.lock` recomputes.
+"""
+import fcntl
+import itertools
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from fastapi import HTTPException
+
+from app.config import (
+    LIGHTING_OPTIONS,
+    SEGMENT_BATCH_SEGMENTS,
+    SEGMENT_REFRESH_INTERVAL_S,
+    SEGMENTS_DB,
+    TIME_OF_DAY_OPTIONS,
+    WEATHER_OPTIONS,
+)
+from app.executor import SparkExecutor
+from app.numpy_scorer import COLUMN_DTYPES
+from app.spark_service import spark_service
+
+RISK_LEVELS = ["low", "medium", "high"]
+
+# Attributes stored per segment, in table column order
+STATIC_FIELDS = [
+    "road_type", "num_lanes", "curvature", "speed_limit",
+    "road_signs_present", "public_road", "num_reported_accidents",
+]
+
+# Environmental fields and their values; a condition code is the index of a
+# combination in CONDITIONS (mixed radix, last field fastest)
+CONDITION_FIELDS = {
+    "lighting": LIGHTING_OPTIONS,
+    "weather": WEATHER_OPTIONS,
+    "time_of_day": TIME_OF_DAY_OPTIONS,
+    "holiday": [False, True],
+    "school_season": [False, True],
+}
+CONDITIONS = [dict(zip(CONDITION_FIELDS, values)) for values in itertools.product(*CONDITION_FIELDS.values())]
+
+# SQLite limits the number of bound parameters per statement
+_IN_CHUNK = 500
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS segments (
+    sid INTEGER PRIMARY KEY,
+    segment_id TEXT NOT NULL UNIQUE,
+    road_type TEXT NOT NULL,
+    num_lanes INTEGER NOT NULL,
+    curvature REAL NOT NULL,
+    speed_limit INTEGER NOT NULL,
+    road_signs_present INTEGER NOT NULL,
+    public_road INTEGER NOT NULL,
+    num_reported_accidents INTEGER NOT NULL,
+    revision INTEGER NOT NULL DEFAULT 0,
+    scored_model TEXT,
+    updated_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS segments_scored_model ON segments (scored_model);
+CREATE TABLE IF NOT EXISTS risk (
+    sid INTEGER NOT NULL,
+    condition INTEGER NOT NULL,
+    level INTEGER NOT NULL,
+    p_low REAL NOT NULL,
+    p_medium REAL NOT NULL,
+    p_high REAL NOT NULL,
+    PRIMARY KEY (sid, condition)
+) WITHOUT ROWID;
+"""
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def condition_code(conditions: Dict[str, Any]) -> int:
+    """Index of a combination of environmental values in CONDITIONS."""
+    code = 0
+    for field, values in CONDITION_FIELDS.items():
+        value = conditions[field]
+        if value not in values:
+            raise HTTPException(status_code=400, detail=f"Unknown {field} '{value}'")
+        code = code * len(values) + values.index(value)
+    return code
+
+
+def condition_columns(segments: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    """Scorer input columns for every segment under every condition.
+
+    Row `i * len(CONDITIONS) + c` is segment `i` under condition `c`.
+    """
+    n = len(segments["road_type"])
+    columns = {field: np.repeat(values, len(CONDITIONS)) for field, values in segments.items()}
+    for field in CONDITION_FIELDS:
+        columns[field] = np.tile(np.array([c[field] for c in CONDITIONS], dtype=COLUMN_DTYPES[field]), n)
+    return {name: columns[name].astype(dtype, copy=False) for name, dtype in COLUMN_DTYPES.items()}
+
+
+class SegmentStore:
+    """SQLite segment registry and its background risk materializer."""
+
+    def __init__(self, path: str, batch_segments: int, interval_s: float):
+        self.path = path
+        self.batch_segments = batch_segments
+        self.interval_s = interval_s
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._lock_fd: Optional[int] = None
+        self.last_batch: Optional[Dict[str, Any]] = None
+        self.last_error: Optional[str] = None
+
+    # Storage
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            conn.execute("PRAGMA synchronous=NORMAL")
+            yield conn
+        finally:
+            conn.close()
+
+    def _init_db(self) -> None:
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+
+    def _claim(self) -> bool:
+        """Lock the materializer for this process; False if another process has it."""
+        if self._lock_fd is not None:
+            return True
+        fd = os.open(self.path + ".lock", os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return False
+        self._lock_fd = fd
+        return True
+
+    # Lifecycle
+
+    def start(self) -> None:
+        """Create the tables and start the background materializer."""
+        self._init_db()
+        self._stopping = threading.Event()
+        self._thread = threading.Thread(target=self._loop, name="segment-materializer", daemon=True)
+        self._thread.start()
+
+    def shutdown(self) -> None:
+        """Stop after the current batch; the rest is recomputed on next start."""
+        self._stopping.set()
+        self._wake.set()
+        if self._lock_fd is not None:
+            os.close(self._lock_fd)
+            self._lock_fd = None
+
+    # API
+
+    def upsert(self, segments: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Insert or update segments; changed ones are queued for recomputation."""
+        now = _now()
+        rows = [
+            (s["segment_id"], *(s[field] for field in STATIC_FIELDS), now)
+            for s in segments
+        ]
+        unchanged = " AND ".join(f"{field} IS excluded.{field}" for field in STATIC_FIELDS)
+        statement = f"""
+            INSERT INTO segments (segment_id, {", ".join(STATIC_FIELDS)}, updated_at)
+            VALUES ({", ".join("?" * (len(STATIC_FIELDS) + 2))})
+            ON CONFLICT (segment_id) DO UPDATE SET
+                {", ".join(f"{field} = excluded.{field}" for field in STATIC_FIELDS)},
+                revision = CASE WHEN {unchanged} THEN revision ELSE revision + 1 END,
+                scored_model = CASE WHEN {unchanged} THEN scored_model ELSE NULL END,
+                updated_at = CASE WHEN {unchanged} THEN updated_at ELSE excluded.updated_at END
+        """
+        with self._connect() as conn:
+            with conn:
+                conn.executemany(statement, rows)
+            ids = [s["segment_id"] for s in segments]
+            pending = 0
+            for start in range(0, len(ids), _IN_CHUNK):
+                chunk = ids[start:start + _IN_CHUNK]
+                pending += conn.execute(
+                    f"SELECT COUNT(*) FROM segments WHERE segment_id IN ({', '.join('?' * len(chunk))})"
+                    " AND scored_model IS NULL",
+                    chunk,
+                ).fetchone()[0]
+        self._wake.set()
+        return {"upserted": len(rows), "pending": pending}
+
+    def delete(self, segment_id: str) -> None:
+        """Remove a segment and its risk rows; 404 if it is not registered."""
+        with self._connect() as conn:
+            with conn:
+                row = conn.execute("SELECT sid FROM segments WHERE segment_id = ?", (segment_id,)).fetchone()
+                if row is None:
+                    raise HTTPException(status_code=404, detail=f"Segment {segment_id} not found")
+                conn.execute("DELETE FROM risk WHERE sid = ?", row)
+                conn.execute("DELETE FROM segments WHERE sid = ?", row)
+
+    def lookup(self, segment_ids: List[str], conditions: Dict[str, Any]) -> Dict[str, Any]:
+        """Materialized risk of segments under one set of conditions (indexed reads only)."""
+        code = condition_code(conditions)
+        identity = spark_service.model_identity() if spark_service.is_ready() else None
+        found: Dict[str, Dict[str, Any]] = {}
+        with self._connect() as conn:
+            for start in range(0, len(segment_ids), _IN_CHUNK):
+                chunk = segment_ids[start:start + _IN_CHUNK]
+                rows = conn.execute(
+                    "SELECT s.segment_id, s.scored_model, r.level, r.p_low, r.p_medium, r.p_high"
+                    " FROM segments s LEFT JOIN risk r ON r.sid = s.sid AND r.condition = ?"
+                    f" WHERE s.segment_id IN ({', '.join('?' * len(chunk))})",
+                    [code, *chunk],
+                ).fetchall()
+                for segment_id, scored_model, level, p_low, p_medium, p_high in rows:
+                    found[segment_id] = {
+                        "segment_id": segment_id,
+                        "accident_risk_level": RISK_LEVELS[level] if level is not None else None,
+                        "probabilities": (
+                            {"low": p_low, "medium": p_medium, "high": p_high} if level is not None else None
+                        ),
+                        "current": scored_model is not None and scored_model == identity,
+                    }
+        return {
+            "conditions": conditions,
+            "model_identity": identity,
+            "results": [found[s] for s in segment_ids if s in found],
+            "missing": [s for s in segment_ids if s not in found],
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        identity = spark_service.model_identity() if spark_service.is_ready() else None
+        with self._connect() as conn:
+            total, current = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(scored_model IS ?), 0) FROM segments", (identity,)
+            ).fetchone()
+        return {
+            "segments": total,
+            "current": current,
+            "pending": total - current,
+            "conditions": len(CONDITIONS),
+            "model_identity": identity,
+            "materializing": self._lock_fd is not None,
+            "last_batch": self.last_batch,
+            "last_error": self.last_error,
+        }
+
+    # Materializer
+
+    def _loop(self) -> None:
+        while not self._stopping.is_set():
+            done = 0
+            try:
+                if spark_service.is_ready() and self._claim():
+                    done = self.refresh()
+                    self.last_error = None
+            except Exception as e:
+                self.last_error = e.detail if isinstance(e, HTTPException) else str(e)
+                print(f"⚠️  Segment risk refresh failed: {self.last_error}")
+            if not done:
+                self._wake.wait(self.interval_s)
+                self._wake.clear()
+
+    def refresh(self) -> int:
+        """Recompute one batch of stale segments; returns how many were recomputed."""
+        identity = spark_service.model_identity()
+        with self._connect() as conn:
+            rows = conn.execute(
+                f"SELECT sid, revision, {', '.join(STATIC_FIELDS)} FROM segments"
+                " WHERE scored_model IS NOT ? ORDER BY sid LIMIT ?",
+                (identity, self.batch_segments),
+            ).fetchall()
+        if not rows:
+            return 0
+
+        started = time.perf_counter()
+        sids = [r[0] for r in rows]
+        static = {
+            field: np.array([r[2 + i] for r in rows], dtype=COLUMN_DTYPES[field])
+            for i, field in enumerate(STATIC_FIELDS)
+        }
+        levels, proba = SparkExecutor.call_tagged("segments", self._score, static)
+        scored_s = time.perf_counter() - started
+
+        n_conditions = len(CONDITIONS)
+        sid_column = np.repeat(np.array(sids, dtype=np.int64), n_conditions)
+        condition_column = np.tile(np.arange(n_conditions, dtype=np.int64), len(sids))
+        risk_rows = zip(sid_column.tolist(), condition_column.tolist(), levels.tolist(),
+                        *(proba[:, i].tolist() for i in range(proba.shape[1])))
+        with self._connect() as conn:
+            with conn:
+                conn.executemany("INSERT OR REPLACE INTO risk VALUES (?, ?, ?, ?, ?, ?)", risk_rows)
+                # A segment changed while it was being scored stays pending
+                conn.executemany(
+                    "UPDATE segments SET scored_model = ? WHERE sid = ? AND revision = ?",
+                    [(identity, sid, revision) for sid, revision, *_ in rows],
+                )
+        elapsed = time.perf_counter() - started
+        self.last_batch = {
+            "segments": len(rows),
+            "rows": len(rows) * n_conditions,
+            "score_s": round(scored_s, 3),
+            "elapsed_s": round(elapsed, 3),
+            "rows_per_s": round(len(rows) * n_conditions / max(elapsed, 1e-9), 1),
+            "model_identity": identity,
+            "finished_at": _now(),
+        }
+        return len(rows)
+
+    def _score(self, static: Dict[str, np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+        """Level codes and (low, medium, high) probabilities for every condition of `static` segments."""
+        indices, proba = spark_service.predict_columns(condition_columns(static))
+        levels = pd.Index(RISK_LEVELS).get_indexer(spark_service.labels_for(indices))
+        columns = {label: idx for idx, label in spark_service.get_label_map().items()}
+        return levels, proba[:, [columns[label] for label in RISK_LEVELS]]
+
+# Shared segment store, started in the app lifespan
+segment_store = SegmentStore(SEGMENTS_DB, SEGMENT_BATCH_SEGMENTS, SEGMENT_REFRESH_INTERVAL_S)
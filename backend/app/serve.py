@@ -0,0 +1,96 @@
+"""Run several API worker processes that share one loaded model.
+
+    python -m app.serve --workers 4
+
+The model is loaded once, before the workers start:
+
+- `SCORING_BACKEND=spark`: a model server process (`app.model_server`)
+  starts the only JVM and loads the pipeline; the workers run with
+  `SCORING_BACKEND=remote` and score through it.
+- `SCORING_BACKEND=numpy`: the compiled scorer artifact is brought up to
+  date once (in a short-lived process, since compiling needs Spark); every
+  worker then loads the artifact without starting a JVM. Pass
+  `--model-server` to serve the NumPy scorer from a model server as well.
+"""
+import argparse
+import os
+import signal
+import subprocess
+import sys
+from typing import Optional, List
+
+from app.config import MODEL_SERVER_SOCKET, SCORING_BACKEND
+from app.model_registry import current_version, model_path, scorer_path
+
+
+def scorer_artifact_current(version: str) -> bool:
+    """True if the NumPy scorer artifact of `version` matches its saved model."""
+    from app.numpy_scorer import NumpyScorer, read_model_uid
+
+    artifact = scorer_path(version)
+    if not os.path.exists(artifact):
+        return False
+    scorer = NumpyScorer.load(artifact)
+    return scorer.model_uid == read_model_uid(model_path(version)) and scorer.can_explain
+
+
+def start_model_server(backend: str, timeout_s: float = 300.0) -> subprocess.Popen:
+    """Start `app.model_server` and wait until it has loaded the model."""
+    from app.model_server import ModelServerClient
+
+    env = dict(os.environ, SCORING_BACKEND=backend, MODEL_SERVER_SOCKET=MODEL_SERVER_SOCKET)
+    process = subprocess.Popen([sys.executable, "-m", "app.model_server"], env=env)
+    client = ModelServerClient(MODEL_SERVER_SOCKET)
+    try:
+        client.wait_ready(timeout_s, process=process)
+    except TimeoutError:
+        process.terminate()
+        raise
+    return process
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Serve the API from several worker processes")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--model-server", action="store_true",
+                        help="use a model server with the numpy backend too")
+    args = parser.parse_args(argv)
+
+    # The workers run in a fresh uvicorn process, so app.config there reads
+    # this environment (this process has already imported it)
+    env = dict(os.environ)
+    server = None
+    if SCORING_BACKEND == "spark" or args.model_server:
+        print(f"🚀 Starting model server ({SCORING_BACKEND}) on {MODEL_SERVER_SOCKET}...")
+        server = start_model_server(SCORING_BACKEND)
+        env.update(SCORING_BACKEND="remote", MODEL_SERVER_SOCKET=MODEL_SERVER_SOCKET)
+    elif SCORING_BACKEND == "numpy" and not scorer_artifact_current(current_version()):
+        version = current_version()
+        print(f"🔧 Compiling the NumPy scorer artifact of model {version}...")
+        subprocess.run([sys.executable, "-m", "app.numpy_scorer", "--model-path", model_path(version),
+                        "--output", scorer_path(version)], check=True)
+
+    command = [sys.executable, "-m", "uvicorn", "app.main:app", "--host", args.host,
+               "--port", str(args.port), "--workers", str(args.workers)]
+    api = subprocess.Popen(command, env=env)
+    # Stop gracefully on SIGTERM; Ctrl+C already reaches the whole process group
+    signal.signal(signal.SIGTERM, lambda *_: api.terminate())
+    try:
+        while api.poll() is None:
+            try:
+                api.wait()
+            except KeyboardInterrupt:
+                continue
+    finally:
+        if server is not None:
+            server.terminate()
+            try:
+                server.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                server.kill()
+
+
+if __name__ == "__main__":
+    main()
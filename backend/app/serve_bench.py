@@ -0,0 +1,179 @@
+"""Measure memory and throughput of multi-worker serving.
+
+For each worker count, starts the API with the Spark backend either as
+independent uvicorn workers ("per-process": one JVM and model per worker)
+or through `app.serve` ("shared": one model server for all workers), then
+sends single predictions with distinct inputs from concurrent clients.
+Reports startup time, requests/second, latency percentiles, resident
+memory of the whole process tree and the number of JVMs.
+
+    python -m app.serve_bench --workers 1 2 4 --duration 20
+"""
+import argparse
+import json
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+
+def _children(pid: int) -> List[int]:
+    children = []
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        if ppid == pid:
+            children.append(int(entry))
+    return children
+
+
+def process_tree(pid: int) -> List[int]:
+    pids, todo = [], [pid]
+    while todo:
+        current = todo.pop()
+        pids.append(current)
+        todo.extend(_children(current))
+    return pids
+
+
+def tree_memory(pid: int) -> Dict[str, Any]:
+    """Resident memory (MiB) of a process and its descendants, and JVM count."""
+    rss_kb = 0
+    jvms = 0
+    for p in process_tree(pid):
+        try:
+            with open(f"/proc/{p}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        rss_kb += int(line.split()[1])
+            with open(f"/proc/{p}/cmdline", "rb") as f:
+                if b"java" in f.read().split(b"\0")[0]:
+                    jvms += 1
+        except OSError:
+            continue
+    return {"rss_mib": round(rss_kb / 1024), "jvms": jvms}
+
+
+def launch(mode: str, workers: int, port: int) -> subprocess.Popen:
+    env = dict(os.environ, SCORING_BACKEND="spark", PREDICTION_CACHE_SIZE="0",
+               JOBS_DIR=f"/tmp/serve-bench-jobs-{port}")
+    if mode == "shared":
+        cmd = [sys.executable, "-m", "app.serve", "--workers", str(workers), "--port", str(port)]
+    else:
+        cmd = [sys.executable, "-m", "uvicorn", "app.main:app", "--workers", str(workers),
+               "--port", str(port), "--log-level", "warning"]
+    return subprocess.Popen(cmd, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                            start_new_session=True)
+
+
+def wait_healthy(url: str, timeout_s: float) -> None:
+    """Wait until `/health/ready` reports a loaded, warmed-up model."""
+    import httpx
+
+    deadline = time.monotonic() + timeout_s
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f"{url}/health/ready", timeout=5).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+    raise TimeoutError(f"{url} not ready after {timeout_s:g}s")
+
+
+def load(url: str, clients: int, duration_s: float, seed: int = 0) -> Dict[str, Any]:
+    """Concurrent single predictions with distinct inputs; returns rates and latencies."""
+    import httpx
+    from app.numpy_scorer import sample_inputs
+
+    inputs = sample_inputs(20000, seed)
+    latencies: List[float] = []
+    errors = [0]
+    lock = threading.Lock()
+    stop = time.monotonic() + duration_s
+
+    def client(k: int) -> None:
+        local, failed = [], 0
+        with httpx.Client(base_url=url, timeout=30) as http:
+            i = k
+            while time.monotonic() < stop:
+                start = time.perf_counter()
+                response = http.post("/api/predict", json=inputs[i % len(inputs)])
+                if response.status_code == 200:
+                    local.append(time.perf_counter() - start)
+                else:
+                    failed += 1
+                i += clients
+        with lock:
+            latencies.extend(local)
+            errors[0] += failed
+
+    threads = [threading.Thread(target=client, args=(k,)) for k in range(clients)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+    ms = np.array(latencies) * 1000
+    return {
+        "requests": len(latencies),
+        "errors": errors[0],
+        "req_per_s": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(float(np.percentile(ms, 50)), 1) if len(ms) else None,
+        "p95_ms": round(float(np.percentile(ms, 95)), 1) if len(ms) else None,
+    }
+
+
+def run(modes: List[str], workers: List[int], clients: int, duration_s: float,
+        port: int = 8765, startup_timeout_s: float = 600.0) -> List[Dict[str, Any]]:
+    report = []
+    for mode in modes:
+        for n in workers:
+            url = f"http://127.0.0.1:{port}"
+            start = time.perf_counter()
+            process = launch(mode, n, port)
+            try:
+                wait_healthy(url, startup_timeout_s)
+                startup_s = time.perf_counter() - start
+                # Let the remaining workers come up and warm their code paths
+                load(url, clients, min(duration_s, 10), seed=1)
+                result = load(url, clients, duration_s)
+                entry = {"mode": mode, "workers": n, "startup_s": round(startup_s, 1),
+                         **result, **tree_memory(process.pid)}
+            finally:
+                os.killpg(process.pid, signal.SIGTERM)
+                try:
+                    process.wait(timeout=60)
+                except subprocess.TimeoutExpired:
+                    os.killpg(process.pid, signal.SIGKILL)
+                    process.wait()
+            report.append(entry)
+            print(json.dumps(entry), flush=True)
+    return report
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Compare per-process and shared-model serving")
+    parser.add_argument("--modes", nargs="+", default=["per-process", "shared"],
+                        choices=["per-process", "shared"])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--clients", type=int, default=16, help="concurrent HTTP clients")
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds of load per run")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args(argv)
+    run(args.modes, args.workers, args.clients, args.duration, args.port)
+
+
+if __name__ == "__main__":
+    main()
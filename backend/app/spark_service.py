@@ -1,11 +1,57 @@
 """Spark service for model loading and predictions."""
 import os
+import threading
+import time
+from datetime import datetime, timezone
+import pyspark
 from pyspark.sql import SparkSession
 from pyspark.ml import PipelineModel
+from pyspark.ml.functions import vector_to_array
 from pyspark.sql.types import StructType, StructField, StringType, IntegerType, FloatType, BooleanType
 from pyspark.sql import functions as F
-from typing import List, Dict, Any, Optional
-from app.config import SPARK_APP_NAME, MODEL_PATH
+from typing import List, Dict, Any, Optional, Tuple
+import numpy as np
+import pandas as pd
+from fastapi import HTTPException
+from app.config import SPARK_APP_NAME, SCORING_BACKEND, MODEL_WARMUP_ROWS, MODEL_WATCH_INTERVAL_S
+from app.numpy_scorer import NumpyScorer, sample_inputs, frame_to_columns, read_model_uid, rows_to_columns
+from app.cache import prediction_cache, canonical_key, key_to_input
+from app.features import spark_add_features
+from app.model_registry import current_version, list_versions, model_path, scorer_path, set_current_version
+from app.model_server import ModelServerClient
+from app.metrics import stage
+from app.drift import drift_monitor
+
+
+class LoadedModel:
+    """One model version with everything needed to score with it."""
+    
+    def __init__(
+        self,
+        version: str,
+        path: str,
+        label_map: Dict[int, str],
+        identity: str,
+        model: Optional[PipelineModel] = None,
+        scorer: Optional[NumpyScorer] = None,
+    ):
+        self.version = version
+        self.path = path
+        self.label_map = label_map
+        self.identity = identity
+        self.model = model
+        self.scorer = scorer
+        self.loaded_at = datetime.now(timezone.utc).isoformat()
+        self.warmup_ms: Optional[float] = None
+    
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "version": self.version,
+            "identity": self.identity,
+            "labels": [self.label_map[i] for i in sorted(self.label_map)],
+            "loaded_at": self.loaded_at,
+            "warmup_ms": self.warmup_ms,
+        }
 
 
 class SparkService:
@@ -13,8 +59,18 @@ class SparkService:
     
     _instance: Optional['SparkService'] = None
     _spark: Optional[SparkSession] = None
-    _model: Optional[PipelineModel] = None
-    _label_map: Optional[Dict[int, str]] = None
+    # Serving model and the one it replaced (kept warm for rollback). A swap
+    # is one assignment, so every request sees either the old or the new one.
+    _active: Optional[LoadedModel] = None
+    _previous: Optional[LoadedModel] = None
+    _remote: Optional[ModelServerClient] = None
+    _ready = False
+    _last_error: Optional[str] = None
+    _stopping = threading.Event()
+    # Guards lazy initialization; requests arrive from several worker threads
+    _lock = threading.RLock()
+    # Held while a new version is loaded and warmed up
+    _reload_lock = threading.Lock()
     
     def __new__(cls):
         if cls._instance is None:
@@ -25,50 +81,134 @@ class SparkService:
     def spark(self) -> SparkSession:
         """Get or create Spark session."""
         if self._spark is None:
-            # Ensure spark-events directory exists
-            spark_events_dir = "/tmp/spark-events"
-            os.makedirs(spark_events_dir, exist_ok=True)
-            
-            self._spark = (SparkSession.builder
-                .appName(SPARK_APP_NAME)
-                .master("local[*]")
-                .config("spark.driver.memory", "2g")
-                .config("spark.sql.shuffle.partitions", "2")
-                .config("spark.ui.enabled", "false")
-                .getOrCreate())
-            self._spark.sparkContext.setLogLevel("WARN")
+            with self._lock:
+                if self._spark is None:
+                    # Ensure spark-events directory exists
+                    spark_events_dir = "/tmp/spark-events"
+                    os.makedirs(spark_events_dir, exist_ok=True)
+                    
+                    spark = (SparkSession.builder
+                        .appName(SPARK_APP_NAME)
+                        .master("local[*]")
+                        .config("spark.driver.memory", "2g")
+                        .config("spark.sql.shuffle.partitions", "2")
+                        .config("spark.ui.enabled", "false")
+                        # Columnar transfer of pandas data to and from the JVM
+                        .config("spark.sql.execution.arrow.pyspark.enabled", "true")
+                        # Fail instead of silently falling back to pickled rows
+                        # (e.g. without pyarrow)
+                        .config("spark.sql.execution.arrow.pyspark.fallback.enabled", "false")
+                        # pandas input becomes a LocalRelation; folding the whole
+                        # pipeline into it would run every stage interpreted in
+                        # the optimizer instead of as a compiled job
+                        .config("spark.sql.optimizer.excludedRules",
+                                "org.apache.spark.sql.catalyst.optimizer.ConvertToLocalRelation")
+                        .getOrCreate())
+                    spark.sparkContext.setLogLevel("WARN")
+                    self._spark = spark
         return self._spark
     
+    @property
+    def active(self) -> LoadedModel:
+        """The model version currently serving (loaded on first use)."""
+        if self._active is None:
+            with self._lock:
+                if self._active is None:
+                    self._active = self._load_version(current_version())
+        return self._active
+    
     @property
     def model(self) -> PipelineModel:
-        """Get or load the ML pipeline model."""
-        if self._model is None:
-            self._model = PipelineModel.load(MODEL_PATH)
-            # Extract label mapping from StringIndexer
-            self._extract_label_map()
-        return self._model
-    
-    def _extract_label_map(self):
-        """Extract label mapping from the StringIndexer stage for the target variable."""
-        if self._model is None:
-            return
+        """Get or load the ML pipeline model of the serving version."""
+        bundle = self.active
+        if bundle.model is None:
+            with self._lock:
+                if bundle.model is None:
+                    _ = self.spark
+                    bundle.model = PipelineModel.load(bundle.path)
+        return bundle.model
+    
+    @property
+    def scorer(self) -> NumpyScorer:
+        """Get or build the JVM-free NumPy scorer of the serving version."""
+        bundle = self.active
+        if bundle.scorer is None:
+            with self._lock:
+                if bundle.scorer is None:
+                    bundle.scorer = self._load_scorer(bundle.version, bundle.path, bundle.model)
+        return bundle.scorer
+    
+    def _load_scorer(self, version: str, path: str, model: Optional[PipelineModel] = None) -> NumpyScorer:
+        """Load the compiled scorer of a version.
         
+        Loads the artifact when it matches the saved model (and has the
+        coefficients explanations need), otherwise compiles it from the Spark
+        PipelineModel and writes the artifact.
+        """
+        artifact = scorer_path(version)
+        model_uid = read_model_uid(path)
+        if os.path.exists(artifact):
+            scorer = NumpyScorer.load(artifact)
+            if scorer.model_uid == model_uid and scorer.can_explain:
+                return scorer
+        if model is None:
+            _ = self.spark
+            model = PipelineModel.load(path)
+        scorer = NumpyScorer.from_pipeline_model(model, model_uid=model_uid)
+        try:
+            scorer.save(artifact)
+        except OSError:
+            pass
+        return scorer
+    
+    def _load_version(self, version: str) -> LoadedModel:
+        """Load a model version for the configured backend (not yet serving)."""
+        path = model_path(version)
+        if SCORING_BACKEND == "numpy":
+            scorer = self._load_scorer(version, path)
+            return LoadedModel(version, path, dict(enumerate(scorer.labels)),
+                               f"numpy:{scorer.model_uid}", scorer=scorer)
+        _ = self.spark
+        model = PipelineModel.load(path)
+        return LoadedModel(version, path, self._extract_label_map(model), f"spark:{model.uid}", model=model)
+    
+    @property
+    def remote(self) -> ModelServerClient:
+        """Client of the shared model server (SCORING_BACKEND=remote)."""
+        if self._remote is None:
+            with self._lock:
+                if self._remote is None:
+                    self._remote = ModelServerClient()
+        return self._remote
+
+    def _extract_label_map(self, model: PipelineModel) -> Dict[int, str]:
+        """Extract label mapping from the StringIndexer stage for the target variable."""
         # The first stage (index 0) is the StringIndexer for accident_risk_level
         # It transforms the target column to numeric labels
-        stage0 = self._model.stages[0]
+        stage0 = model.stages[0]
         if hasattr(stage0, 'labels'):
             labels = stage0.labels
-            self._label_map = {i: label for i, label in enumerate(labels)}
-            return
+            return {i: label for i, label in enumerate(labels)}
         
         # Default mapping if not found
-        self._label_map = {0: "low", 1: "high", 2: "medium"}
+        return {0: "low", 1: "high", 2: "medium"}
     
     def get_label_map(self) -> Dict[int, str]:
         """Get the label mapping for predictions."""
-        if self._label_map is None:
-            _ = self.model  # Force model load which extracts label map
-        return self._label_map or {0: "low", 1: "high", 2: "medium"}
+        if SCORING_BACKEND == "remote":
+            return dict(enumerate(self.remote.labels))
+        return self.active.label_map
+    
+    def labels_for(self, indices: np.ndarray) -> np.ndarray:
+        """Map predicted class indices to risk level strings (vectorized)."""
+        indices = np.asarray(indices, dtype=np.int64)
+        if indices.size == 0:
+            return np.empty(0, dtype=object)
+        label_map = self.get_label_map()
+        table = np.array(
+            [label_map.get(i, "medium") for i in range(int(indices.max()) + 1)], dtype=object
+        )
+        return table[indices]
     
     def get_input_schema(self) -> StructType:
         """Define the schema for input data."""
@@ -90,156 +230,369 @@ class SparkService:
     def add_engineered_features(self, df):
         """Add feature engineering columns required by the pipeline.
         
-        Based on the LogisticRegression notebook, the model expects these derived features:
-        - is_night: 1 if lighting == 'night'
-        - bad_weather: 1 if weather in ('foggy', 'rainy')
-        - high_curvature: 1 if curvature >= 0.5
-        - high_speed: 1 if speed_limit >= 60
-        - night_high_curvature: is_night * high_curvature
-        - night_high_speed: is_night * high_speed
-        - high_curvature_bad_weather: high_curvature * bad_weather
-        - curvature_x_night: curvature * is_night
-        - speed_x_night: speed_limit * is_night
-        - road_signs_present_i, public_road_i, holiday_i, school_season_i: boolean to int
+        The features are declared in `app.features.FEATURES` and added in a
+        single `select` (the projection is built once per input schema).
         """
-        # is_night: 1 if lighting is "night", else 0
-        df = df.withColumn(
-            "is_night",
-            (F.col("lighting") == "night").cast("int")
-        )
-        
-        # bad_weather: 1 if weather is foggy or rainy
-        df = df.withColumn(
-            "bad_weather",
-            F.col("weather").isin("foggy", "rainy").cast("int")
-        )
+        return spark_add_features(df)
+    
+    def predict_single(self, data: Dict[str, Any]) -> str:
+        """Make prediction for a single input.
         
-        # high_curvature: 1 if curvature >= 0.5
-        df = df.withColumn(
-            "high_curvature",
-            (F.col("curvature") >= 0.5).cast("int")
-        )
+        Returns the predicted risk level as a string ('low', 'medium', or 'high').
+        """
+        return self.predict_batch([data])[0]
+    
+    def predict_batch(self, data_list: List[Dict[str, Any]]) -> List[str]:
+        """Make predictions for multiple inputs.
         
-        # high_speed: 1 if speed_limit >= 60
-        df = df.withColumn(
-            "high_speed",
-            (F.col("speed_limit") >= 60).cast("int")
-        )
+        Returns a list of risk levels as strings ('low', 'medium', or 'high').
+        """
+        # Identical rows are scored once; repeated rows come from the cache
+        keys = [canonical_key(d) for d in data_list]
+        # One model for the whole call, even if a reload swaps it meanwhile
+        bundle = None if SCORING_BACKEND == "remote" else self.active
+        model_tag = self.model_identity(bundle)
+        results = prediction_cache.get_many(dict.fromkeys(keys), model_tag)
+        missing = [k for k in dict.fromkeys(keys) if k not in results]
         
-        # Interaction features
-        df = df.withColumn(
-            "night_high_curvature",
-            (F.col("is_night") * F.col("high_curvature")).cast("int")
-        )
+        if missing:
+            indices, _ = self.predict_columns(rows_to_columns([key_to_input(k) for k in missing]), bundle)
+            scored = list(zip(missing, self.labels_for(indices).tolist()))
+            prediction_cache.put_many(scored, model_tag)
+            results.update(scored)
         
-        df = df.withColumn(
-            "night_high_speed",
-            (F.col("is_night") * F.col("high_speed")).cast("int")
-        )
+        return [results[k] for k in keys]
+    
+    def predict_frame(self, df: pd.DataFrame) -> np.ndarray:
+        """Make predictions for a validated input DataFrame.
         
-        df = df.withColumn(
-            "high_curvature_bad_weather",
-            (F.col("high_curvature") * F.col("bad_weather")).cast("int")
-        )
+        Column-wise counterpart of `predict_batch`: identical rows are scored
+        once and results are returned as an array of risk level strings.
+        """
+        unique_df, codes = self._unique_rows(df)
+        # Cache lookups
+        with stage("dedupe"):
+            labels = np.empty(len(unique_df), dtype=object)
+            bundle = None if SCORING_BACKEND == "remote" else self.active
+            
+            # Uploads with more distinct rows than the cache holds would only
+            # evict it, so they bypass it
+            use_cache = 0 < len(unique_df) <= prediction_cache.max_size
+            if use_cache:
+                model_tag = self.model_identity(bundle)
+                keys = [canonical_key(d) for d in unique_df.to_dict('records')]
+                cached = prediction_cache.get_many(keys, model_tag)
+                todo = np.array([k not in cached for k in keys], dtype=bool)
+                for i in np.flatnonzero(~todo).tolist():
+                    labels[i] = cached[keys[i]]
+            else:
+                todo = np.ones(len(unique_df), dtype=bool)
         
-        # Continuous interaction features
-        df = df.withColumn(
-            "curvature_x_night",
-            F.col("curvature") * F.col("is_night")
-        )
+        if todo.any():
+            indices, _ = self.predict_columns(frame_to_columns(unique_df[todo]), bundle)
+            labels[todo] = self.labels_for(indices)
+            if use_cache:
+                todo_keys = [keys[i] for i in np.flatnonzero(todo).tolist()]
+                prediction_cache.put_many(zip(todo_keys, labels[todo].tolist()), model_tag)
         
-        df = df.withColumn(
-            "speed_x_night",
-            F.col("speed_limit") * F.col("is_night")
-        )
+        labels = labels[codes]
+        with stage("drift"):
+            drift_monitor.observe_columns(frame_to_columns(df), labels)
+        return labels
+
+    def _unique_rows(self, df: pd.DataFrame) -> Tuple[pd.DataFrame, np.ndarray]:
+        """Distinct rows of a validated input DataFrame and each row's position among them."""
+        with stage("dedupe"):
+            fields = [f.name for f in self.get_input_schema().fields]
+            unique_df = pd.DataFrame(frame_to_columns(df), columns=fields)
+            codes = unique_df.groupby(fields, sort=False).ngroup().to_numpy()
+            # drop_duplicates keeps first occurrences, the same order as ngroup
+            return unique_df.drop_duplicates(ignore_index=True), codes
+
+    def score_frame(self, df: pd.DataFrame) -> Tuple[np.ndarray, np.ndarray]:
+        """Risk levels and class probabilities for a validated input DataFrame.
+
+        Like `predict_frame`, identical rows are scored once; the prediction
+        cache only holds labels, so it is not consulted.
+        """
+        unique_df, codes = self._unique_rows(df)
+        bundle = None if SCORING_BACKEND == "remote" else self.active
+        indices, proba = self.predict_columns(frame_to_columns(unique_df), bundle)
+        labels = self.labels_for(indices)[codes]
+        with stage("drift"):
+            drift_monitor.observe_columns(frame_to_columns(df), labels)
+        return labels, proba[codes]
+
+    def explain_frame(
+        self, df: pd.DataFrame, top: int = 5
+    ) -> Tuple[np.ndarray, np.ndarray, List[str], np.ndarray, np.ndarray, np.ndarray]:
+        """Risk levels, class probabilities and the `top` feature contributions of every row.
+
+        Returns (labels, probabilities, feature names, feature indices,
+        contributions, scaled feature values); see
+        `NumpyScorer.explain_columns`. Uses the NumPy scorer of the serving
+        version with any local backend.
+        """
+        if SCORING_BACKEND == "remote":
+            raise HTTPException(status_code=501, detail="Explanations are not available from the model server")
+        unique_df, codes = self._unique_rows(df)
+        scorer = self.scorer
+        with stage("explain"):
+            indices, proba, features, contributions, values = scorer.explain_columns(
+                frame_to_columns(unique_df), top
+            )
+        labels = self.labels_for(indices)[codes]
+        with stage("drift"):
+            drift_monitor.observe_columns(frame_to_columns(df), labels)
+        return labels, proba[codes], scorer.feature_names, features[codes], contributions[codes], values[codes]
+
+    def predict_columns(
+        self, columns: Dict[str, np.ndarray], bundle: Optional[LoadedModel] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Score input column arrays with `bundle` (default: the serving model).
         
-        # Convert boolean columns to integers with _i suffix
-        df = df.withColumn("road_signs_present_i", F.col("road_signs_present").cast("int"))
-        df = df.withColumn("public_road_i", F.col("public_road").cast("int"))
-        df = df.withColumn("holiday_i", F.col("holiday").cast("int"))
-        df = df.withColumn("school_season_i", F.col("school_season").cast("int"))
+        Returns (predicted class indices, class probability matrix).
+        """
+        if SCORING_BACKEND == "remote":
+            with stage("remote"):
+                return self.remote.predict_columns(columns)
+        bundle = bundle or self.active
+        if SCORING_BACKEND == "numpy":
+            with stage("score"):
+                proba = bundle.scorer.predict_proba_columns(columns)
+                return proba.argmax(axis=1), proba
         
-        return df
+        return self._predict_spark(columns, bundle)
     
-    def predict_single(self, data: Dict[str, Any]) -> str:
-        """Make prediction for a single input.
+    def get_cached(self, data: Dict[str, Any]) -> Optional[str]:
+        """Return the cached risk level for an input, if any.
         
-        Returns the predicted risk level as a string ('low', 'medium', or 'high').
+        Called on the event loop, so it never waits for the model: before
+        the serving model is ready every lookup is a miss.
         """
-        # Convert data to row format
-        row_data = [(
-            data["road_type"],
-            int(data["num_lanes"]),
-            float(data["curvature"]),
-            int(data["speed_limit"]),
-            data["lighting"],
-            data["weather"],
-            bool(data["road_signs_present"]),
-            bool(data["public_road"]),
-            data["time_of_day"],
-            bool(data["holiday"]),
-            bool(data["school_season"]),
-            int(data["num_reported_accidents"]),
-        )]
-        
-        # Create DataFrame with schema
-        df = self.spark.createDataFrame(row_data, self.get_input_schema())
-        
-        # Add engineered features
-        df = self.add_engineered_features(df)
-        
-        # Make prediction
-        predictions = self.model.transform(df)
-        prediction_idx = int(predictions.select("prediction").collect()[0]["prediction"])
-        
-        # Map prediction to risk level
-        label_map = self.get_label_map()
-        return label_map.get(prediction_idx, "medium")
+        if not prediction_cache.enabled or not self.is_ready():
+            return None
+        return prediction_cache.get(canonical_key(data), self.model_identity())
     
-    def predict_batch(self, data_list: List[Dict[str, Any]]) -> List[str]:
-        """Make predictions for multiple inputs.
+    def model_identity(self, bundle: Optional[LoadedModel] = None) -> str:
+        """Identity of the model serving predictions (or of `bundle`)."""
+        if SCORING_BACKEND == "remote":
+            return self.remote.model_identity
+        return (bundle or self.active).identity
+    
+    def model_version(self) -> Optional[str]:
+        """Name of the serving model version, once loaded."""
+        if SCORING_BACKEND == "remote":
+            return self.remote.model_version if self.remote.is_ready() else None
+        return self._active.version if self._active is not None else None
+    
+    def _predict_spark(
+        self, columns: Dict[str, np.ndarray], bundle: Optional[LoadedModel] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Run the Spark pipeline on input columns.
         
-        Returns a list of risk levels as strings ('low', 'medium', or 'high').
+        Data goes to the JVM and back as Arrow batches (pandas DataFrames)
+        rather than pickled rows; probabilities come back as one double
+        column per class.
         """
-        # Convert data to rows
-        rows = [
-            (
-                d["road_type"],
-                int(d["num_lanes"]),
-                float(d["curvature"]),
-                int(d["speed_limit"]),
-                d["lighting"],
-                d["weather"],
-                bool(d["road_signs_present"]),
-                bool(d["public_road"]),
-                d["time_of_day"],
-                bool(d["holiday"]),
-                bool(d["school_season"]),
-                int(d["num_reported_accidents"]),
-            )
-            for d in data_list
-        ]
+        schema = self.get_input_schema()
+        n = len(next(iter(columns.values())))
+        model = bundle.model if bundle is not None and bundle.model is not None else self.model
+        num_classes = model.stages[-1].numClasses
+        if n == 0:
+            return np.empty(0, dtype=np.int64), np.empty((0, num_classes))
         
-        # Create DataFrame
-        df = self.spark.createDataFrame(rows, self.get_input_schema())
+        with stage("create_dataframe"):
+            pdf = pd.DataFrame({f.name: columns[f.name] for f in schema.fields})
+            df = self.spark.createDataFrame(pdf, schema)
         
         # Add engineered features
-        df = self.add_engineered_features(df)
+        with stage("features"):
+            df = self.add_engineered_features(df)
         
-        # Make predictions
-        predictions = self.model.transform(df)
-        results = predictions.select("prediction").collect()
-        
-        label_map = self.get_label_map()
-        return [label_map.get(int(r["prediction"]), "medium") for r in results]
+        # Make predictions (transform only plans the job; it runs in collect)
+        with stage("transform"):
+            probability = vector_to_array("probability")
+            predictions = model.transform(df).select(
+                F.col("prediction").cast("int").alias("prediction"),
+                *[probability[i].alias(f"p{i}") for i in range(num_classes)],
+            )
+        with stage("collect"):
+            result = predictions.toPandas()
+        indices = result["prediction"].to_numpy(dtype=np.int64)
+        proba = result[[f"p{i}" for i in range(num_classes)]].to_numpy(dtype=np.float64)
+        return indices, proba
     
     def is_model_loaded(self) -> bool:
         """Check if model is loaded."""
-        return self._model is not None
+        if SCORING_BACKEND == "remote":
+            return self._remote is not None and self._remote.is_ready()
+        return self._active is not None
+    
+    def is_ready(self) -> bool:
+        """True once the serving model is loaded and warmed up."""
+        if SCORING_BACKEND == "remote":
+            return self.is_model_loaded()
+        return self._ready
+    
+    # Model lifecycle
+    
+    def warm_up(self, bundle: LoadedModel, rows: int = MODEL_WARMUP_ROWS) -> None:
+        """Score generated inputs with `bundle` so its first requests are fast.
+        
+        Runs the batch sizes of single, micro-batched and bulk requests and
+        raises ValueError if the probabilities are not valid distributions.
+        `rows=0` skips the warm-up.
+        """
+        if rows <= 0:
+            return
+        columns = rows_to_columns(sample_inputs(rows))
+        start = time.perf_counter()
+        for n in sorted({1, min(64, rows), rows}):
+            _, proba = self.predict_columns({name: values[:n] for name, values in columns.items()}, bundle)
+            if not (np.isfinite(proba).all() and np.allclose(proba.sum(axis=1), 1.0)):
+                raise ValueError("model returned invalid class probabilities")
+        bundle.warmup_ms = round((time.perf_counter() - start) * 1000, 1)
+    
+    def prepare(self) -> None:
+        """Load and warm up the serving model (or wait for the model server)."""
+        if SCORING_BACKEND == "remote":
+            info = self.remote.wait_ready()
+            print(f"✅ Connected to model server ({info['backend']}, pid {info['pid']})")
+            return
+        bundle = self.active
+        self.warm_up(bundle)
+        self._ready = True
+        print(f"✅ Model {bundle.version} loaded ({bundle.identity}), warm-up {bundle.warmup_ms or 0:.0f} ms")
+    
+    def start(self) -> None:
+        """Prepare the model in the background, then watch for new versions.
+        
+        The API answers liveness probes meanwhile; `is_ready` turns true
+        once warm-up has finished.
+        """
+        self._stopping = threading.Event()
+        threading.Thread(target=self._start, name="model-loader", daemon=True).start()
+    
+    def _start(self) -> None:
+        try:
+            self.prepare()
+        except Exception as e:
+            self._last_error = str(e)
+            print(f"❌ Model load failed: {e}")
+            return
+        self.watch()
+    
+    def stop(self) -> None:
+        self._stopping.set()
+    
+    def watch(self) -> None:
+        """Reload when MODELS_DIR/CURRENT names another version (blocking loop)."""
+        if SCORING_BACKEND == "remote" or MODEL_WATCH_INTERVAL_S <= 0:
+            return
+        failed = None
+        while not self._stopping.wait(MODEL_WATCH_INTERVAL_S):
+            if self._reload_lock.locked():
+                continue
+            version = current_version()
+            if version in (self.active.version, failed):
+                continue
+            try:
+                self.reload(version, persist=False)
+                failed = None
+            except HTTPException as e:
+                if e.status_code == 409:
+                    continue
+                # Not retried until CURRENT names another version
+                failed = version
+                self._last_error = e.detail
+                print(f"❌ Model version {version} not loaded: {e.detail}")
+    
+    def reload(self, version: Optional[str] = None, persist: bool = True) -> Dict[str, Any]:
+        """Load a model version beside the serving one, warm it up and swap.
+        
+        Requests are served by the current model until the swap. The new
+        model must map predictions to the same labels; the replaced model is
+        kept for `rollback`. With `persist`, the version is written to
+        MODELS_DIR/CURRENT so restarts and other workers follow.
+        """
+        if SCORING_BACKEND == "remote":
+            return self.remote.admin("reload", version)
+        if not self._reload_lock.acquire(blocking=False):
+            raise HTTPException(status_code=409, detail="A model reload is already in progress")
+        try:
+            version = version or current_version()
+            current = self.active
+            try:
+                candidate = self._load_version(version)
+                if candidate.label_map != current.label_map:
+                    raise HTTPException(
+                        status_code=422,
+                        detail=f"Model version '{version}' labels {candidate.as_dict()['labels']} differ "
+                               f"from the serving model's {current.as_dict()['labels']}; restart to change labels",
+                    )
+                self.warm_up(candidate)
+            except HTTPException:
+                raise
+            except Exception as e:
+                # JVM errors carry a stack trace after the first line
+                message = str(e).strip().splitlines()[0] if str(e).strip() else type(e).__name__
+                raise HTTPException(status_code=422, detail=f"Model version '{version}' failed to load: {message}")
+            with self._lock:
+                self._previous, self._active = current, candidate
+            if persist:
+                set_current_version(version)
+            self._last_error = None
+            print(f"🔄 Serving model {version} ({candidate.identity}), warm-up {candidate.warmup_ms or 0:.0f} ms")
+            return self.model_status()
+        finally:
+            self._reload_lock.release()
+    
+    def rollback(self) -> Dict[str, Any]:
+        """Swap back to the model replaced by the last reload (already warm)."""
+        if SCORING_BACKEND == "remote":
+            return self.remote.admin("rollback")
+        if not self._reload_lock.acquire(blocking=False):
+            raise HTTPException(status_code=409, detail="A model reload is in progress")
+        try:
+            if self._previous is None:
+                raise HTTPException(status_code=409, detail="No previous model version to roll back to")
+            with self._lock:
+                self._active, self._previous = self._previous, self._active
+            set_current_version(self._active.version)
+            print(f"↩️  Rolled back to model {self._active.version}")
+            return self.model_status()
+        finally:
+            self._reload_lock.release()
+    
+    def model_status(self) -> Dict[str, Any]:
+        """Serving and previous versions, versions on disk and reload state."""
+        if SCORING_BACKEND == "remote":
+            return self.remote.admin("status")
+        return {
+            "backend": SCORING_BACKEND,
+            "ready": self.is_ready(),
+            "active": self._active.as_dict() if self._active is not None else None,
+            "previous": self._previous.as_dict() if self._previous is not None else None,
+            "current": current_version(),
+            "versions": list_versions(),
+            "reloading": self._reload_lock.locked(),
+            "last_error": self._last_error,
+        }
+    
+    def jvm_heap(self) -> Optional[Dict[str, int]]:
+        """JVM heap usage in bytes, if this process runs a Spark session."""
+        if self._spark is None:
+            return None
+        runtime = self._spark._jvm.java.lang.Runtime.getRuntime()
+        total = runtime.totalMemory()
+        return {"used": total - runtime.freeMemory(), "committed": total, "max": runtime.maxMemory()}
     
     def get_spark_version(self) -> str:
-        """Get Spark version."""
-        return self.spark.version
+        """Get Spark version (without starting a session just to ask)."""
+        if self._spark is None:
+            return pyspark.__version__
+        return self._spark.version
 
 
 # Singleton instance
@@ -0,0 +1,265 @@
+"""Continuous scoring of files dropped into a directory (Structured Streaming).
+
+Upstream systems write road-condition files into a shared directory; this
+service picks up every new file with Spark's file source, scores it with
+the same validation, engineered features and `PipelineModel` as
+`app.bulk_score`, and appends the results to a partitioned Parquet
+directory:
+
+    python -m app.stream_score /data/incoming --output /data/scores
+    python -m app.stream_score /data/incoming --output /data/scores --input-format parquet \\
+        --trigger-interval "1 minute" --max-files-per-trigger 20 --partition-by scored_date accident_risk_level
+    python -m app.stream_score /data/incoming --output /data/scores --available-now   # backlog, then exit
+
+Exactly once: the checkpoint (`--checkpoint`, default `<output>/_checkpoint`)
+records which files each micro-batch read, and the Parquet sink's
+`_spark_metadata` log records which batches were committed. After a restart
+the query continues with the files it has not seen, and readers of the
+output (Spark, or anything honouring `_spark_metadata`) never see a batch
+twice. Files must appear atomically (written elsewhere, then moved in);
+only names matching `--glob` (default `*.csv` / `*.parquet`) are read.
+
+CSV files need a header and the 12 input columns in the order of
+`SparkService.get_input_schema` (after an `id` column with `--id-column`).
+They are read as strings and cast and validated like the API does, so bad
+values become rows with an `error`, not a failed batch. Parquet columns are
+matched by name; a Parquet file with a column of the wrong type stops the
+query (move the file away and restart). Output rows carry `source_file`, `scored_at`,
+`scored_date` and `model_version` besides the `bulk_score` columns.
+
+Each micro-batch with new rows prints one JSON line: rows, invalid rows,
+files' modification time to commit latency (oldest and newest file),
+processing rows/s and Spark's duration breakdown. `--metrics-file` appends
+the same lines to a file. The model is loaded at start; restart the
+service to score with a newly deployed version.
+"""
+import argparse
+import json
+import os
+import signal
+import sys
+import threading
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from app.bulk_score import CLASS_RISK, build_session, score_dataframe
+from app.model_registry import current_version, model_path
+
+OBSERVATION = "stream_score"
+
+
+def input_schema(input_format: str, id_column: bool = False):
+    """Stream source schema: the API input schema, as strings for CSV.
+
+    For Parquet, int and float columns are widened to long and double so
+    files written with 64-bit types (pandas' default) can be read; values are
+    cast back to the API schema and validated when scored.
+    """
+    from pyspark.sql.types import DoubleType, FloatType, IntegerType, LongType, StringType, StructField, StructType
+
+    from app.spark_service import spark_service
+
+    widened = {IntegerType(): LongType(), FloatType(): DoubleType()}
+    fields = spark_service.get_input_schema().fields
+    if input_format == "csv":
+        fields = [StructField(f.name, StringType()) for f in fields]
+    else:
+        fields = [StructField(f.name, widened.get(f.dataType, f.dataType)) for f in fields]
+    if id_column:
+        fields = [StructField("id", StringType() if input_format == "csv" else LongType())] + list(fields)
+    return StructType(fields)
+
+
+def build_query(spark, source: str, output: str, checkpoint: str, model, labels: List[str], version: str,
+                input_format: str = "csv", glob: Optional[str] = None, id_column: bool = False,
+                max_files_per_trigger: Optional[int] = None, trigger_interval: Optional[str] = "10 seconds",
+                available_now: bool = False, partition_by: Optional[List[str]] = None,
+                probabilities: bool = False, include_input: bool = False):
+    """Start the streaming query from `source` into `output` and return it."""
+    from pyspark.sql import functions as F
+
+    reader = spark.readStream.schema(input_schema(input_format, id_column))
+    reader = reader.option("pathGlobFilter", glob or f"*.{input_format}")
+    if max_files_per_trigger:
+        reader = reader.option("maxFilesPerTrigger", max_files_per_trigger)
+    if input_format == "csv":
+        df = reader.option("header", True).csv(source)
+    else:
+        df = reader.parquet(source)
+
+    df = df.select("*", F.col("_metadata.file_path").alias("source_file"),
+                   F.unix_millis(F.col("_metadata.file_modification_time")).alias("_file_mtime_ms"))
+    scored = score_dataframe(df, model, labels, CLASS_RISK, probabilities, include_input,
+                             passthrough=["source_file", "_file_mtime_ms"])
+    # Per-batch metrics, reported in the query progress
+    scored = scored.observe(
+        OBSERVATION,
+        F.count(F.lit(1)).alias("rows"),
+        F.sum((~F.col("valid")).cast("long")).alias("invalid"),
+        # Distinct aggregates are not allowed in observed metrics; exact at these counts
+        F.approx_count_distinct("source_file").alias("files"),
+        F.min("_file_mtime_ms").alias("oldest_file_ms"),
+        F.max("_file_mtime_ms").alias("newest_file_ms"),
+    )
+    # current_timestamp is fixed per micro-batch
+    result = scored.drop("valid", "_file_mtime_ms").select(
+        "*",
+        F.current_timestamp().alias("scored_at"),
+        F.to_date(F.current_timestamp()).alias("scored_date"),
+        F.lit(version).alias("model_version"),
+    )
+
+    writer = (result.writeStream
+              .format("parquet")
+              .option("path", output)
+              .option("checkpointLocation", checkpoint)
+              .outputMode("append")
+              .queryName("stream_score"))
+    if partition_by:
+        writer = writer.partitionBy(*partition_by)
+    if available_now:
+        writer = writer.trigger(availableNow=True)
+    elif trigger_interval:
+        writer = writer.trigger(processingTime=trigger_interval)
+    return writer.start()
+
+
+def batch_metrics(progress: Dict[str, Any]) -> Dict[str, Any]:
+    """Throughput and end-to-end latency of one micro-batch from its progress."""
+    durations = progress.get("durationMs", {})
+    observed = progress.get("observedMetrics", {}).get(OBSERVATION) or {}
+    if hasattr(observed, "asDict"):
+        # A Row since Spark 4.0, a dict before
+        observed = observed.asDict()
+    started_ms = datetime.fromisoformat(progress["timestamp"].replace("Z", "+00:00")).timestamp() * 1000
+    committed_ms = started_ms + durations.get("triggerExecution", 0)
+    rows = progress.get("numInputRows", 0)
+    metrics = {
+        "batch_id": progress["batchId"],
+        "timestamp": progress["timestamp"],
+        "rows": rows,
+        "invalid_rows": observed.get("invalid"),
+        "files": observed.get("files"),
+        "rows_per_s": round(progress.get("processedRowsPerSecond") or 0.0, 1),
+        "duration_ms": durations,
+    }
+    if observed.get("oldest_file_ms") is not None:
+        metrics["latency_s"] = {
+            "oldest_file": round((committed_ms - observed["oldest_file_ms"]) / 1000, 3),
+            "newest_file": round((committed_ms - observed["newest_file_ms"]) / 1000, 3),
+        }
+    return metrics
+
+
+def run(
+    source: str,
+    output: str,
+    checkpoint: Optional[str] = None,
+    input_format: str = "csv",
+    glob: Optional[str] = None,
+    id_column: bool = False,
+    model_version: Optional[str] = None,
+    max_files_per_trigger: Optional[int] = None,
+    trigger_interval: str = "10 seconds",
+    available_now: bool = False,
+    partition_by: Optional[List[str]] = None,
+    probabilities: bool = False,
+    include_input: bool = False,
+    metrics_file: Optional[str] = None,
+    master: str = "local[*]",
+    driver_memory: str = "4g",
+    poll_interval_s: float = 1.0,
+) -> Dict[str, Any]:
+    """Run the streaming query until it stops (SIGINT/SIGTERM, or the backlog with `available_now`).
+
+    Returns totals over the micro-batches of this run.
+    """
+    from pyspark.ml import PipelineModel
+
+    spark = build_session(master, driver_memory)
+    version = model_version or current_version()
+    model = PipelineModel.load(model_path(version))
+    labels = list(model.stages[0].labels)
+    checkpoint = checkpoint or os.path.join(output, "_checkpoint")
+    query = build_query(spark, source, output, checkpoint, model, labels, version, input_format, glob,
+                        id_column, max_files_per_trigger, trigger_interval, available_now,
+                        partition_by or ["scored_date"], probabilities, include_input)
+    print(f"🚀 Scoring new files in {source} into {output} (model {version}, checkpoint {checkpoint})",
+          file=sys.stderr, flush=True)
+
+    # The query is stopped from the loop below: stopping it inside the
+    # handler would interrupt the pending awaitTermination call
+    stopping = threading.Event()
+
+    def stop(signum, frame):
+        print("🛑 Stopping...", file=sys.stderr, flush=True)
+        stopping.set()
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    totals = {"batches": 0, "rows": 0, "invalid_rows": 0}
+    last_batch = -1
+    out = open(metrics_file, "a") if metrics_file else None
+    try:
+        while True:
+            active = not query.awaitTermination(poll_interval_s)
+            if active and stopping.is_set():
+                query.stop()
+                active = False
+            for progress in query.recentProgress:
+                if progress["batchId"] <= last_batch or not progress.get("numInputRows"):
+                    continue
+                last_batch = progress["batchId"]
+                metrics = batch_metrics(progress)
+                line = json.dumps(metrics)
+                print(line, flush=True)
+                if out:
+                    out.write(line + "\n")
+                    out.flush()
+                totals["batches"] += 1
+                totals["rows"] += metrics["rows"]
+                totals["invalid_rows"] += metrics["invalid_rows"] or 0
+            if not active:
+                break
+    finally:
+        if out:
+            out.close()
+    if query.exception() is not None:
+        raise RuntimeError(f"Streaming query failed: {query.exception()}")
+    return {"output": output, "checkpoint": checkpoint, "model_version": version, **totals}
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m app.stream_score",
+                                     description="Score files as they arrive in a directory")
+    parser.add_argument("source", help="directory watched for new files")
+    parser.add_argument("--output", required=True, help="Parquet output directory")
+    parser.add_argument("--checkpoint", help="checkpoint directory (default: <output>/_checkpoint)")
+    parser.add_argument("--input-format", default="csv", choices=["csv", "parquet"])
+    parser.add_argument("--glob", help="file names to read (default: *.csv or *.parquet)")
+    parser.add_argument("--id-column", action="store_true", help="files have an `id` column (first, in CSV)")
+    parser.add_argument("--model-version", help="model version (default: the one being served)")
+    parser.add_argument("--max-files-per-trigger", type=int, help="most new files per micro-batch")
+    parser.add_argument("--trigger-interval", default="10 seconds", help="time between micro-batches")
+    parser.add_argument("--available-now", action="store_true", help="score the files present, then exit")
+    parser.add_argument("--partition-by", nargs="+", default=["scored_date"],
+                        help="output partition columns (default: scored_date)")
+    parser.add_argument("--probabilities", action="store_true", help="add p_<level> columns")
+    parser.add_argument("--include-input", action="store_true", help="keep the input columns")
+    parser.add_argument("--metrics-file", help="also append per-batch metrics (JSON lines) to this file")
+    parser.add_argument("--master", default="local[*]", help="Spark master (default: all local cores)")
+    parser.add_argument("--driver-memory", default="4g")
+    args = parser.parse_args(argv)
+
+    summary = run(
+        args.source, args.output, args.checkpoint, args.input_format, args.glob, args.id_column,
+        args.model_version, args.max_files_per_trigger, args.trigger_interval, args.available_now,
+        args.partition_by, args.probabilities, args.include_input, args.metrics_file, args.master,
+        args.driver_memory,
+    )
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""Streaming, constant-memory scoring of CSV uploads.
+
+The upload is read `chunk_rows` rows at a time; each chunk is validated,
+scored with `SparkService.predict_frame` and encoded before the next one is
+read, so memory depends on the chunk size rather than on the file size.
+"""
+import csv
+import io
+import json
+import shutil
+import tempfile
+from typing import Any, BinaryIO, Dict, List, Optional
+
+import pandas as pd
+
+from app.metrics import set_rows, stage
+from app.spark_service import spark_service
+from app.validation import REQUIRED_COLUMNS, check_required_columns, validate_frame
+
+STREAM_MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+
+def json_safe(row: Dict[str, Any]) -> Dict[str, Any]:
+    # NaN (empty cells) is not valid JSON
+    return {k: (None if isinstance(v, float) and v != v else v) for k, v in row.items()}
+
+
+class CsvPredictionStream:
+    """Score a CSV file chunk by chunk and encode results as NDJSON or CSV.
+
+    NDJSON emits one PredictionResult-shaped object per row followed by a
+    final `{"summary": ..., "total_count": ...}` record. CSV echoes the
+    input columns plus `accident_risk_level` and `error`, and ends with a
+    `# summary: {...}` comment line.
+    """
+
+    def __init__(self, fileobj: BinaryIO, output_format: str = "ndjson", chunk_rows: int = 10000):
+        if output_format not in STREAM_MEDIA_TYPES:
+            raise ValueError(f"Unsupported stream format: {output_format}")
+        self.fileobj = fileobj
+        self.output_format = output_format
+        self.media_type = STREAM_MEDIA_TYPES[output_format]
+        self._reader = pd.read_csv(fileobj, chunksize=chunk_rows)
+        self._pending: Optional[pd.DataFrame] = None
+        self.rows = 0
+        self.risk_counts = {"low": 0, "medium": 0, "high": 0}
+        self.error_count = 0
+        self._finished = False
+
+    def open(self) -> None:
+        """Read the first chunk and check the columns before any output."""
+        try:
+            with stage("parse"):
+                self._pending = next(self._reader)
+        except StopIteration:
+            self._pending = pd.DataFrame(columns=REQUIRED_COLUMNS)
+        check_required_columns(self._pending.columns)
+
+    def close(self) -> None:
+        self._reader.close()
+        self.fileobj.close()
+
+    def next_block(self) -> Optional[bytes]:
+        """Score the next chunk and return its encoded output, or None when done."""
+        if self._finished:
+            return None
+        if self._pending is not None:
+            chunk, self._pending = self._pending, None
+            header = self._header()
+        else:
+            with stage("parse"):
+                chunk = next(self._reader, None)
+            header = b""
+            if chunk is None:
+                self._finished = True
+                set_rows(self.rows)
+                return self._summary()
+
+        chunk = chunk[REQUIRED_COLUMNS].reset_index(drop=True)
+        with stage("validate"):
+            validation = validate_frame(chunk, offset=self.rows)
+        errors = validation.errors
+        # Valid rows are echoed with their coerced values, invalid ones as read
+        data_list: List[Dict[str, Any]] = [None] * len(chunk)
+        levels: List[Optional[str]] = [None] * len(chunk)
+        if errors:
+            raw_rows = chunk.iloc[list(errors)].to_dict('records')
+            for idx, row in zip(errors, raw_rows):
+                data_list[idx] = json_safe(row)
+        valid_data = validation.clean.to_dict('records')
+        if valid_data:
+            predicted = spark_service.predict_frame(validation.clean).tolist()
+            for idx, row, level in zip(validation.clean.index, valid_data, predicted):
+                data_list[idx] = row
+                levels[idx] = level
+                self.risk_counts[level] += 1
+        self.error_count += len(errors)
+        self.rows += len(chunk)
+
+        with stage("serialize"):
+            return header + self._encode(data_list, levels, errors)
+
+    def _encode(self, data_list: List[Dict[str, Any]], levels: List[Optional[str]], errors: Dict[int, str]) -> bytes:
+        if self.output_format == "ndjson":
+            body = "".join(
+                json.dumps({
+                    "accident_risk_level": level,
+                    "input_data": row,
+                    "error": errors.get(idx),
+                }) + "\n"
+                for idx, (row, level) in enumerate(zip(data_list, levels))
+            )
+        else:
+            buf = io.StringIO()
+            writer = csv.writer(buf)
+            for idx, (row, level) in enumerate(zip(data_list, levels)):
+                writer.writerow([row[c] for c in REQUIRED_COLUMNS] + [level or "", errors.get(idx, "")])
+            body = buf.getvalue()
+        return body.encode("utf-8")
+
+    def _header(self) -> bytes:
+        if self.output_format == "csv":
+            return (",".join(REQUIRED_COLUMNS + ["accident_risk_level", "error"]) + "\n").encode("utf-8")
+        return b""
+
+    def error_block(self, message: str) -> bytes:
+        """Encode an error that aborted the stream after output started."""
+        if self.output_format == "csv":
+            return f"# error: {message}\n".encode("utf-8")
+        return (json.dumps({"error": message}) + "\n").encode("utf-8")
+
+    def _summary(self) -> bytes:
+        summary = {
+            "summary": {
+                "risk_distribution": self.risk_counts,
+                "error_count": self.error_count,
+            },
+            "total_count": self.rows,
+        }
+        if self.output_format == "csv":
+            return f"# summary: {json.dumps(summary)}\n".encode("utf-8")
+        return (json.dumps(summary) + "\n").encode("utf-8")
+
+
+def open_csv_stream(upload: BinaryIO, output_format: str, chunk_rows: int) -> CsvPredictionStream:
+    """Open a prediction stream over a private copy of an uploaded file.
+
+    FastAPI closes uploaded files as soon as the endpoint returns, before a
+    streaming response is sent, so the upload is copied (in 1 MiB blocks) to
+    a temporary file owned by the stream.
+    """
+    tmp = tempfile.TemporaryFile()
+    try:
+        shutil.copyfileobj(upload, tmp, 1 << 20)
+        tmp.seek(0)
+        stream = CsvPredictionStream(tmp, output_format, chunk_rows)
+        stream.open()
+        return stream
+    except BaseException:
+        tmp.close()
+        raise
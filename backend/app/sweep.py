@@ -0,0 +1,95 @@
+"""What-if sweeps: score a grid of inputs around a base prediction input."""
+import math
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+from pydantic import ValidationError
+
+from app.cache import FEATURE_FIELDS
+from app.models import SweepAxis
+from app.numpy_scorer import COLUMN_DTYPES
+from app.validation import FIELD_ADAPTERS
+
+INTEGER_FIELDS = {"num_lanes", "speed_limit", "num_reported_accidents"}
+FLOAT_FIELDS = {"curvature"}
+NUMERIC_FIELDS = INTEGER_FIELDS | FLOAT_FIELDS
+
+
+def axis_size(axis: SweepAxis) -> int:
+    """Points on an axis, known from the request before any value is built.
+
+    An integer range may have fewer distinct points; this is the upper bound
+    the grid size limit is checked against.
+    """
+    if axis.values is not None:
+        return len(axis.values)
+    return axis.steps or 0
+
+
+def _validate(field: str, value: Any) -> Any:
+    try:
+        result = FIELD_ADAPTERS[field].validate_python(value)
+    except ValidationError as e:
+        msg = "; ".join(err["msg"] for err in e.errors())
+        raise ValueError(f"Invalid value {value!r} for '{field}': {msg}")
+    return result.value if hasattr(result, "value") else result
+
+
+def axis_values(axis: SweepAxis) -> List[Any]:
+    """Resolve and validate the values of one sweep axis.
+
+    Values are checked with the field's own validator, so a sweep accepts
+    exactly the values a single prediction would accept. A numeric range
+    only needs its (rounded, for integer fields) end points checked: every
+    point lies between them.
+    """
+    if axis.field not in FEATURE_FIELDS:
+        raise ValueError(f"Unknown sweep field '{axis.field}'")
+
+    if axis.values is not None:
+        values = [_validate(axis.field, value) for value in axis.values]
+    elif axis.field in NUMERIC_FIELDS:
+        if axis.start is None or axis.stop is None or axis.steps is None:
+            raise ValueError(f"Axis '{axis.field}' needs either values or start/stop/steps")
+        ends = [axis.start, axis.stop]
+        if not all(math.isfinite(v) for v in ends):
+            raise ValueError(f"Axis '{axis.field}' needs a finite start and stop")
+        if axis.field in INTEGER_FIELDS:
+            ends = [int(round(v)) for v in ends]
+        start, stop = (_validate(axis.field, v) for v in ends)
+        values = np.linspace(start, stop, axis.steps).tolist()
+        if axis.field in INTEGER_FIELDS:
+            values = list(dict.fromkeys(int(round(v)) for v in values))
+    else:
+        raise ValueError(f"Axis '{axis.field}' is categorical and needs explicit values")
+
+    if not values:
+        raise ValueError(f"Axis '{axis.field}' has no values")
+    return values
+
+
+def sweep_grid(
+    base: Dict[str, Any], request_axes: List[SweepAxis]
+) -> Tuple[List[Tuple[str, List[Any]]], Dict[str, np.ndarray]]:
+    """Resolved axes and grid input columns of a sweep (runs in a worker thread)."""
+    axes = [(axis.field, axis_values(axis)) for axis in request_axes]
+    return axes, build_grid(base, axes)
+
+
+def build_grid(base: Dict[str, Any], axes: List[Tuple[str, List[Any]]]) -> Dict[str, np.ndarray]:
+    """Build input columns for the cartesian product of the axes (row-major).
+
+    Non-swept fields are broadcast from `base`; the result has the same
+    columns and dtypes as `numpy_scorer.rows_to_columns`.
+    """
+    shape = [len(values) for _, values in axes]
+    size = int(np.prod(shape))
+    columns = {
+        field: np.full(size, base[field], dtype=COLUMN_DTYPES.get(field, object))
+        for field in FEATURE_FIELDS
+    }
+    # Index of each grid point along each axis, last axis varying fastest
+    positions = np.unravel_index(np.arange(size), shape)
+    for (field, values), pos in zip(axes, positions):
+        columns[field] = np.asarray(values, dtype=COLUMN_DTYPES.get(field, object))[pos]
+    return columns
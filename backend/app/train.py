@@ -0,0 +1,461 @@
+"""Train the accident-risk model from the command line.
+
+Builds the same pipeline as `notebook/LogisticRegression.ipynb` (label and
+category StringIndexers, OneHotEncoders, a StandardScaler on the numeric
+columns, VectorAssemblers and a multinomial LogisticRegression), searches
+LogisticRegression parameters with CrossValidator or TrainValidationSplit
+and saves a `PipelineModel` with the stage layout of `traffic_lr_model`, so
+the API, the NumPy scorer and `app.bulk_score` can load it.
+
+    python -m app.train ../data/train.csv --version v2
+    python -m app.train ../data/train.csv --version v3 --search tvs \\
+        --grid regParam=0.001,0.01,0.1 elasticNetParam=0,0.5 --parallelism 4
+
+Steps:
+
+1. Featurize: the input is cast to the API schema, rows with missing or
+   unusable values are dropped, `app.features` adds the engineered columns
+   and the data is split into train/test (`--test-fraction`, `--seed`).
+   The feature stages (indexers, encoders, scaler, assemblers) are fitted
+   on the train split, and both splits are written as Parquet with only
+   `label` and `features` to `TRAINING_CACHE_DIR/<key>/`. The key covers
+   the input files (size and modification time), `FEATURES`, the split and
+   the stage layout, so later runs on the same data skip straight to the
+   search.
+2. Search: the parameter grid is cut into chunks of `--parallelism` maps;
+   each chunk is one CrossValidator (`--folds`) or TrainValidationSplit run
+   fitting its models in parallel, which also refits the chunk's best
+   parameters on the whole train split. After every chunk its metrics and
+   refitted model are checkpointed, so an interrupted search resumes with
+   the combinations not checkpointed yet, even with another
+   `--parallelism` (`--restart` starts over).
+3. The best model, with the fitted feature stages, is saved to
+   `MODELS_DIR/<version>/` (or `--output`), evaluated like the notebook
+   (accuracy, weighted precision and recall, F1 on train and test, the
+   per-class report, the confusion matrix and mean |coefficient| per
+   feature), and the report is written to `training_report.json` in the
+   model directory.
+4. The drift reference profile (input and prediction sketches of the
+   training data, see `app.drift`) is written to `drift_profile.json` in
+   the model directory.
+
+The feature stages are fitted once per dataset rather than per fold, so the
+folds share the scaler statistics; this does not affect the held-out test
+metrics. Serving the new version: `POST /api/admin/models/reload` with
+`{"version": "v2"}`.
+"""
+import argparse
+import hashlib
+import itertools
+import json
+import os
+import shutil
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.config import SPARK_APP_NAME, TRAINING_CACHE_DIR
+from app.features import FEATURES, spark_add_features
+from app.validation import REQUIRED_COLUMNS
+
+TARGET_COL = "accident_risk_level"
+
+# Pipeline columns, as in the notebook
+CATEGORICAL_COLS = ["road_type", "lighting", "weather", "time_of_day"]
+NUMERIC_COLS = ["num_lanes", "curvature", "speed_limit", "num_reported_accidents",
+                "curvature_x_night", "speed_x_night"]
+BOOLEAN_FEATURES = [
+    "is_night", "bad_weather", "high_curvature", "high_speed",
+    "night_high_curvature", "night_high_speed", "high_curvature_bad_weather",
+    "road_signs_present_i", "public_road_i", "holiday_i", "school_season_i",
+]
+# Bump when the feature stages change, so cached datasets are rebuilt
+STAGES_VERSION = 1
+
+# LogisticRegression settings of the notebook, and the default grid
+BASE_PARAMS = {"family": "multinomial", "maxIter": 100, "regParam": 0.01, "elasticNetParam": 0.0}
+DEFAULT_GRID = {"regParam": [0.001, 0.01, 0.1], "elasticNetParam": [0.0, 0.5]}
+
+# Metrics of the notebook's report, by MulticlassClassificationEvaluator name
+REPORT_METRICS = ("accuracy", "weightedPrecision", "weightedRecall", "f1")
+
+
+def build_session(master: str = "local[*]", driver_memory: str = "4g"):
+    from pyspark.sql import SparkSession
+
+    os.makedirs("/tmp/spark-events", exist_ok=True)
+    spark = (SparkSession.builder
+             .appName(f"{SPARK_APP_NAME}-train")
+             .master(master)
+             .config("spark.driver.memory", driver_memory)
+             .config("spark.ui.enabled", "false")
+             .getOrCreate())
+    spark.sparkContext.setLogLevel("WARN")
+    return spark
+
+
+def feature_stages() -> list:
+    """Unfitted label/feature stages, in the order of `traffic_lr_model`."""
+    from pyspark.ml.feature import OneHotEncoder, StandardScaler, StringIndexer, VectorAssembler
+
+    return [
+        StringIndexer(inputCol=TARGET_COL, outputCol="label", handleInvalid="keep"),
+        *[StringIndexer(inputCol=c, outputCol=f"{c}_idx", handleInvalid="keep") for c in CATEGORICAL_COLS],
+        *[OneHotEncoder(inputCol=f"{c}_idx", outputCol=f"{c}_ohe", dropLast=True) for c in CATEGORICAL_COLS],
+        VectorAssembler(inputCols=NUMERIC_COLS, outputCol="num_raw", handleInvalid="keep"),
+        StandardScaler(inputCol="num_raw", outputCol="num_scaled", withMean=False, withStd=True),
+        VectorAssembler(inputCols=BOOLEAN_FEATURES, outputCol="bool_features", handleInvalid="keep"),
+        VectorAssembler(
+            inputCols=["num_scaled", "bool_features"] + [f"{c}_ohe" for c in CATEGORICAL_COLS],
+            outputCol="features",
+            handleInvalid="keep",
+        ),
+    ]
+
+
+def _fingerprint(paths: List[str]) -> List[Tuple[str, int, int]]:
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, names in os.walk(path):
+                files.extend(os.path.join(root, n) for n in names if not n.startswith((".", "_")))
+        else:
+            files.append(path)
+    return [(os.path.abspath(f), os.path.getsize(f), int(os.path.getmtime(f))) for f in sorted(files)]
+
+
+def dataset_key(paths: List[str], test_fraction: float, seed: int) -> str:
+    """Cache key of a featurized dataset."""
+    payload = json.dumps({
+        "files": _fingerprint(paths),
+        "features": [list(map(str, f)) for f in FEATURES],
+        "test_fraction": test_fraction,
+        "seed": seed,
+        "stages": STAGES_VERSION,
+    }, sort_keys=True)
+    return hashlib.sha1(payload.encode()).hexdigest()[:16]
+
+
+def featurize(spark, paths: List[str], cache_dir: str, test_fraction: float = 0.2,
+              seed: int = 42) -> Dict[str, Any]:
+    """Featurized train/test splits and fitted feature stages, from cache if possible."""
+    from pyspark.ml import Pipeline, PipelineModel
+    from pyspark.sql import functions as F
+
+    from app.bulk_score import read_input
+    from app.spark_service import spark_service
+
+    directory = os.path.join(cache_dir, dataset_key(paths, test_fraction, seed))
+    meta_path = os.path.join(directory, "meta.json")
+    if os.path.exists(meta_path):
+        with open(meta_path) as f:
+            meta = json.load(f)
+        meta["cache_hit"] = True
+    else:
+        started = time.perf_counter()
+        # A partial cache from an interrupted run is rebuilt
+        shutil.rmtree(directory, ignore_errors=True)
+        df = read_input(spark, paths)
+        missing = set(REQUIRED_COLUMNS + [TARGET_COL]) - set(df.columns)
+        if missing:
+            raise ValueError(f"Missing required columns: {', '.join(sorted(missing))}")
+        schema = spark_service.get_input_schema()
+        df = df.select(*[F.col(f.name).try_cast(f.dataType).alias(f.name) for f in schema.fields],
+                       F.col(TARGET_COL).cast("string").alias(TARGET_COL))
+        total = df.count()
+        df = df.dropna()
+        train_raw, test_raw = spark_add_features(df).randomSplit([1 - test_fraction, test_fraction], seed=seed)
+        train_raw = train_raw.cache()
+
+        stages = PipelineModel(Pipeline(stages=feature_stages()).fit(train_raw).stages)
+        stages.write().overwrite().save(os.path.join(directory, "stages"))
+        for name, split in (("train", train_raw), ("test", test_raw)):
+            stages.transform(split).select("label", "features").write.parquet(os.path.join(directory, name))
+        train_raw.unpersist()
+
+        meta = {
+            "inputs": [os.path.abspath(p) for p in paths],
+            "rows": total,
+            "train_rows": spark.read.parquet(os.path.join(directory, "train")).count(),
+            "test_rows": spark.read.parquet(os.path.join(directory, "test")).count(),
+            "featurize_s": round(time.perf_counter() - started, 2),
+        }
+        meta["dropped_rows"] = total - meta["train_rows"] - meta["test_rows"]
+        with open(meta_path, "w") as f:
+            json.dump(meta, f, indent=2)
+        meta["cache_hit"] = False
+
+    meta["directory"] = directory
+    meta["stages"] = PipelineModel.load(os.path.join(directory, "stages"))
+    meta["train"] = spark.read.parquet(os.path.join(directory, "train"))
+    meta["test"] = spark.read.parquet(os.path.join(directory, "test"))
+    return meta
+
+
+def param_grid(grid: Dict[str, List[Any]]) -> List[Dict[str, Any]]:
+    """Every combination of the grid values, in a stable order."""
+    names = sorted(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(grid[n] for n in names))]
+
+
+def search(spark, train, directory: str, grid: Dict[str, List[Any]], method: str = "cv",
+           folds: int = 3, train_ratio: float = 0.8, metric: str = "f1", parallelism: int = 2,
+           seed: int = 42, restart: bool = False) -> Dict[str, Any]:
+    """Resumable parameter search; returns per-parameter metrics and the best model."""
+    from pyspark.ml.classification import LogisticRegression, LogisticRegressionModel
+    from pyspark.ml.evaluation import MulticlassClassificationEvaluator
+    from pyspark.ml.tuning import CrossValidator, TrainValidationSplit
+
+    combos = param_grid(grid)
+    spec = {"grid": combos, "method": method, "folds": folds, "train_ratio": train_ratio,
+            "metric": metric, "seed": seed, "base": BASE_PARAMS}
+    search_id = hashlib.sha1(json.dumps(spec, sort_keys=True).encode()).hexdigest()[:12]
+    checkpoint_dir = os.path.join(directory, f"search-{search_id}")
+    checkpoint_path = os.path.join(checkpoint_dir, "checkpoint.json")
+    if restart:
+        shutil.rmtree(checkpoint_dir, ignore_errors=True)
+    os.makedirs(checkpoint_dir, exist_ok=True)
+    checkpoint = {"spec": spec, "chunks": []}
+    if os.path.exists(checkpoint_path):
+        with open(checkpoint_path) as f:
+            checkpoint = json.load(f)
+
+    lr = LogisticRegression(featuresCol="features", labelCol="label", **BASE_PARAMS)
+    evaluator = MulticlassClassificationEvaluator(labelCol="label", predictionCol="prediction", metricName=metric)
+    # Combinations are skipped by the parameters recorded as done, not by
+    # chunk position: the chunk size (parallelism) may differ between runs
+    done = {json.dumps(r["params"], sort_keys=True) for c in checkpoint["chunks"] for r in c["results"]}
+    pending = [params for params in combos if json.dumps(params, sort_keys=True) not in done]
+    chunk_size = max(parallelism, 1)
+    chunks = [pending[i:i + chunk_size] for i in range(0, len(pending), chunk_size)]
+    resumed = len(checkpoint["chunks"])
+    if resumed:
+        print(f"♻️  Resuming search {search_id}: {len(combos) - len(pending)}/{len(combos)} combinations done")
+
+    train = train.cache()
+    started = time.perf_counter()
+    for offset, chunk in enumerate(chunks):
+        index = resumed + offset
+        maps = [{getattr(lr, name): value for name, value in params.items()} for params in chunk]
+        if method == "cv":
+            tuner = CrossValidator(estimator=lr, estimatorParamMaps=maps, evaluator=evaluator,
+                                   numFolds=folds, parallelism=parallelism, seed=seed)
+        else:
+            tuner = TrainValidationSplit(estimator=lr, estimatorParamMaps=maps, evaluator=evaluator,
+                                         trainRatio=train_ratio, parallelism=parallelism, seed=seed)
+        chunk_started = time.perf_counter()
+        fitted = tuner.fit(train)
+        scores = list(fitted.avgMetrics if method == "cv" else fitted.validationMetrics)
+        model_dir = os.path.join(checkpoint_dir, f"chunk-{index:03d}")
+        fitted.bestModel.write().overwrite().save(model_dir)
+        checkpoint["chunks"].append({
+            "results": [{"params": params, metric: score} for params, score in zip(chunk, scores)],
+            "model": model_dir,
+            "seconds": round(time.perf_counter() - chunk_started, 2),
+        })
+        with open(checkpoint_path + ".tmp", "w") as f:
+            json.dump(checkpoint, f, indent=2)
+        os.replace(checkpoint_path + ".tmp", checkpoint_path)
+        print(f"🔎 Chunk {index + 1}/{resumed + len(chunks)}: "
+              + ", ".join(f"{r['params']} {metric}={r[metric]:.4f}" for r in checkpoint["chunks"][-1]["results"]))
+    train.unpersist()
+
+    # Each chunk's model is refitted on the whole train split with its best parameters
+    sign = 1 if evaluator.isLargerBetter() else -1
+    results = [r for c in checkpoint["chunks"] for r in c["results"]]
+    best_chunk = max(checkpoint["chunks"], key=lambda c: max(sign * r[metric] for r in c["results"]))
+    best = max(best_chunk["results"], key=lambda r: sign * r[metric])
+    return {
+        "id": search_id,
+        "method": method,
+        "folds": folds if method == "cv" else None,
+        "train_ratio": train_ratio if method == "tvs" else None,
+        "metric": metric,
+        "parallelism": parallelism,
+        "resumed_chunks": resumed,
+        "results": results,
+        "best_params": best["params"],
+        "best_metric": best[metric],
+        "search_s": round(time.perf_counter() - started, 2),
+        "model": LogisticRegressionModel.load(best_chunk["model"]),
+    }
+
+
+def evaluate(model, train, test, labels: List[str]) -> Dict[str, Any]:
+    """The notebook's report: overall metrics, per-class report, confusion matrix, importances."""
+    import numpy as np
+    from pyspark.ml.evaluation import MulticlassClassificationEvaluator
+
+    report: Dict[str, Any] = {"metrics": {}}
+    predictions = {"train": model.transform(train), "test": model.transform(test)}
+    for split, pred in predictions.items():
+        pred = pred.cache()
+        report["metrics"][split] = {
+            name: MulticlassClassificationEvaluator(labelCol="label", predictionCol="prediction",
+                                                    metricName=name).evaluate(pred)
+            for name in REPORT_METRICS
+        }
+        predictions[split] = pred
+
+    test_pred = predictions["test"]
+    counts = test_pred.groupBy("label", "prediction").count().collect()
+    size = max([len(labels)] + [int(max(r["label"], r["prediction"])) + 1 for r in counts])
+    matrix = np.zeros((size, size), dtype=np.int64)
+    for r in counts:
+        matrix[int(r["label"]), int(r["prediction"])] = r["count"]
+    names = labels + [f"__unknown_{i}" for i in range(len(labels), size)]
+    per_class = {}
+    for i, name in enumerate(names):
+        support = int(matrix[i].sum())
+        predicted = int(matrix[:, i].sum())
+        if support == 0 and predicted == 0:
+            continue
+        precision = matrix[i, i] / predicted if predicted else 0.0
+        recall = matrix[i, i] / support if support else 0.0
+        f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+        per_class[name] = {"precision": round(float(precision), 4), "recall": round(float(recall), 4),
+                           "f1": round(float(f1), 4), "support": support}
+    report["per_class"] = per_class
+    report["confusion_matrix"] = {"labels": names, "rows_are": "true label", "matrix": matrix.tolist()}
+
+    # Mean |coefficient| per feature, named from the assembler metadata
+    attrs = train.schema["features"].metadata["ml_attr"]["attrs"]
+    feature_names = [None] * model.numFeatures
+    for group in attrs.values():
+        for attr in group:
+            feature_names[attr["idx"]] = attr["name"]
+    # The scaler drops the names of its inputs: "num_scaled_1" is NUMERIC_COLS[1]
+    feature_names = [
+        NUMERIC_COLS[int(n.rsplit("_", 1)[1])] if n and n.startswith("num_scaled_") else n
+        for n in feature_names
+    ]
+    importance = np.abs(model.coefficientMatrix.toArray()).mean(axis=0)
+    report["feature_importance"] = [
+        {"feature": feature_names[i], "importance": round(float(importance[i]), 6)}
+        for i in np.argsort(-importance)
+    ]
+    for pred in predictions.values():
+        pred.unpersist()
+    for split in report["metrics"]:
+        report["metrics"][split] = {k: round(v, 4) for k, v in report["metrics"][split].items()}
+    return report
+
+
+def run(
+    inputs: List[str],
+    version: Optional[str] = None,
+    output: Optional[str] = None,
+    method: str = "cv",
+    grid: Optional[Dict[str, List[Any]]] = None,
+    folds: int = 3,
+    train_ratio: float = 0.8,
+    metric: str = "f1",
+    parallelism: Optional[int] = None,
+    test_fraction: float = 0.2,
+    seed: int = 42,
+    cache_dir: str = TRAINING_CACHE_DIR,
+    restart: bool = False,
+    overwrite: bool = False,
+    master: str = "local[*]",
+    driver_memory: str = "4g",
+) -> Dict[str, Any]:
+    """Featurize (or reuse the cache), search, save the best model and its report."""
+    from pyspark.ml import PipelineModel
+
+    from app.drift import profile_files, write_profile
+    from app.model_registry import new_version_path
+    from app.numpy_scorer import NumpyScorer
+
+    if output is None:
+        if version is None:
+            raise ValueError("Pass a model version or an output directory")
+        output = new_version_path(version)
+    if os.path.exists(output) and not overwrite:
+        raise FileExistsError(f"{output} exists (use --overwrite)")
+
+    started = time.perf_counter()
+    spark = build_session(master, driver_memory)
+    parallelism = parallelism or spark.sparkContext.defaultParallelism
+    data = featurize(spark, inputs, cache_dir, test_fraction, seed)
+    print(f"📦 Featurized data {'from cache' if data['cache_hit'] else 'written to'} {data['directory']} "
+          f"({data['train_rows']} train / {data['test_rows']} test rows)")
+
+    result = search(spark, data["train"], data["directory"], grid or DEFAULT_GRID, method, folds,
+                    train_ratio, metric, parallelism, seed, restart)
+    lr_model = result.pop("model")
+    model = PipelineModel(data["stages"].stages + [lr_model])
+    model.write().overwrite().save(output)
+
+    evaluate_started = time.perf_counter()
+    labels = list(data["stages"].stages[0].labels)
+    evaluation = evaluate(lr_model, data["train"], data["test"], labels)
+    report = {
+        "model_path": output,
+        "version": version,
+        "model_uid": model.uid,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "labels": labels,
+        "data": {k: data[k] for k in ("inputs", "rows", "train_rows", "test_rows", "dropped_rows",
+                                      "directory", "cache_hit")},
+        "search": result,
+        **evaluation,
+        "timings": {
+            "featurize_s": 0.0 if data["cache_hit"] else data["featurize_s"],
+            "search_s": result["search_s"],
+            "evaluate_s": round(time.perf_counter() - evaluate_started, 2),
+            "total_s": round(time.perf_counter() - started, 2),
+        },
+    }
+    profile_started = time.perf_counter()
+    scorer = NumpyScorer.from_pipeline_model(model, model_uid=model.uid)
+    write_profile(profile_files(inputs, scorer), os.path.join(output, "drift_profile.json"))
+    report["timings"]["profile_s"] = round(time.perf_counter() - profile_started, 2)
+    report["timings"]["total_s"] = round(time.perf_counter() - started, 2)
+    with open(os.path.join(output, "training_report.json"), "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"✅ Model saved to {output} (test f1 {report['metrics']['test']['f1']:.4f})")
+    return report
+
+
+def _parse_grid(values: Optional[List[str]]) -> Optional[Dict[str, List[Any]]]:
+    if not values:
+        return None
+    grid = {}
+    for value in values:
+        name, _, numbers = value.partition("=")
+        grid[name] = [int(v) if name == "maxIter" else float(v) for v in numbers.split(",")]
+    return grid
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m app.train", description="Train the accident-risk model")
+    parser.add_argument("inputs", nargs="+", help="labelled CSV or Parquet files (e.g. data/train.csv)")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--version", help="save as MODELS_DIR/<version>")
+    target.add_argument("--output", help="save to this directory")
+    parser.add_argument("--search", default="cv", choices=["cv", "tvs"],
+                        help="CrossValidator or TrainValidationSplit")
+    parser.add_argument("--grid", nargs="+", metavar="PARAM=V1,V2",
+                        help="LogisticRegression grid (default regParam=0.001,0.01,0.1 elasticNetParam=0,0.5)")
+    parser.add_argument("--folds", type=int, default=3)
+    parser.add_argument("--train-ratio", type=float, default=0.8, help="TrainValidationSplit ratio")
+    parser.add_argument("--metric", default="f1", choices=list(REPORT_METRICS), help="search metric")
+    parser.add_argument("--parallelism", type=int, help="models fitted at once (default: cores)")
+    parser.add_argument("--test-fraction", type=float, default=0.2)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--cache-dir", default=TRAINING_CACHE_DIR, help="featurized data and checkpoints")
+    parser.add_argument("--restart", action="store_true", help="ignore the checkpoint of this search")
+    parser.add_argument("--overwrite", action="store_true", help="replace an existing model directory")
+    parser.add_argument("--master", default="local[*]")
+    parser.add_argument("--driver-memory", default="4g")
+    args = parser.parse_args(argv)
+
+    report = run(args.inputs, args.version, args.output, args.search, _parse_grid(args.grid), args.folds,
+                 args.train_ratio, args.metric, args.parallelism, args.test_fraction, args.seed,
+                 args.cache_dir, args.restart, args.overwrite, args.master, args.driver_memory)
+    print(json.dumps({k: report[k] for k in ("model_path", "metrics", "timings")}
+                     | {"best_params": report["search"]["best_params"]}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
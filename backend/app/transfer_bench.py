@@ -0,0 +1,97 @@
+"""Benchmark row-based vs Arrow-based data transfer for Spark batch scoring.
+
+"rows" is the previous path: every input becomes a Python tuple that is
+pickled into `createDataFrame`, and results come back as `Row` objects from
+`collect()`. "arrow" is `SparkService._predict_spark`: a pandas DataFrame goes
+to the JVM and back as Arrow record batches.
+
+    python -m app.transfer_bench --sizes 1000 10000 100000 1000000
+"""
+import argparse
+import json
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from app.config import ROAD_TYPES, LIGHTING_OPTIONS, WEATHER_OPTIONS, TIME_OF_DAY_OPTIONS
+from app.spark_service import spark_service
+
+
+def sample_columns(n: int, seed: int = 0) -> Dict[str, np.ndarray]:
+    """Random input columns covering the PredictionInput domain."""
+    rng = np.random.default_rng(seed)
+    return {
+        "road_type": rng.choice(np.array(ROAD_TYPES, dtype=object), n),
+        "num_lanes": rng.integers(1, 9, n),
+        "curvature": np.round(rng.uniform(0.0, 1.0, n), 2).astype(np.float32),
+        "speed_limit": rng.integers(15, 121, n),
+        "lighting": rng.choice(np.array(LIGHTING_OPTIONS, dtype=object), n),
+        "weather": rng.choice(np.array(WEATHER_OPTIONS, dtype=object), n),
+        "road_signs_present": rng.integers(0, 2, n).astype(bool),
+        "public_road": rng.integers(0, 2, n).astype(bool),
+        "time_of_day": rng.choice(np.array(TIME_OF_DAY_OPTIONS, dtype=object), n),
+        "holiday": rng.integers(0, 2, n).astype(bool),
+        "school_season": rng.integers(0, 2, n).astype(bool),
+        "num_reported_accidents": rng.integers(0, 8, n),
+    }
+
+
+def score_rows(columns: Dict[str, np.ndarray]) -> List[str]:
+    """Row-based transfer: pickled tuples in, collected Rows out."""
+    schema = spark_service.get_input_schema()
+    rows = list(zip(*[columns[f.name].tolist() for f in schema.fields]))
+    df = spark_service.add_engineered_features(spark_service.spark.createDataFrame(rows, schema))
+    results = spark_service.model.transform(df).select("prediction", "probability").collect()
+    label_map = spark_service.get_label_map()
+    # Probabilities are materialized too, as the Arrow path returns them
+    _ = [r["probability"].toArray() for r in results]
+    return [label_map.get(int(r["prediction"]), "medium") for r in results]
+
+
+def score_arrow(columns: Dict[str, np.ndarray]) -> np.ndarray:
+    """Arrow transfer: pandas in, prediction/probability columns out."""
+    indices, _ = spark_service._predict_spark(columns)
+    return spark_service.labels_for(indices)
+
+
+def run(sizes: List[int], repeat: int = 1, seed: int = 0) -> List[Dict[str, Any]]:
+    # Warm up the session, model and JIT paths on a small input
+    warmup = sample_columns(1000, seed)
+    score_rows(warmup)
+    score_arrow(warmup)
+
+    report = []
+    for n in sizes:
+        columns = sample_columns(n, seed)
+        entry: Dict[str, Any] = {"rows": n}
+        labels = {}
+        for name, fn in (("rows", score_rows), ("arrow", score_arrow)):
+            best = float("inf")
+            for _ in range(repeat):
+                start = time.perf_counter()
+                labels[name] = list(fn(columns))
+                best = min(best, time.perf_counter() - start)
+            entry[f"{name}_s"] = round(best, 3)
+            entry[f"{name}_rows_per_s"] = round(n / best)
+        entry["speedup"] = round(entry["rows_s"] / entry["arrow_s"], 2)
+        entry["same_labels"] = labels["rows"] == labels["arrow"]
+        report.append(entry)
+        print(json.dumps(entry), flush=True)
+    return report
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Compare row and Arrow transfer for Spark scoring")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000, 1000000])
+    parser.add_argument("--repeat", type=int, default=1, help="runs per size (best is reported)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    report = run(args.sizes, args.repeat, args.seed)
+    if not all(entry["same_labels"] for entry in report):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,260 @@
+"""Validation of uploaded batch rows.
+
+`validate_frame` applies the PredictionInput rules to whole columns. Values
+that are clearly valid (enum members, in-range numbers of the right dtype,
+real booleans) are accepted with NumPy/pandas masks. Everything else is
+checked once per distinct value with the field's own pydantic validator, so
+coercions and error messages match `PredictionInput(**row)` exactly while
+the per-row Python work only touches rows that failed.
+"""
+import argparse
+import io
+import json
+import time
+from enum import Enum
+from typing import Annotated, Any, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from fastapi import HTTPException
+from pydantic import TypeAdapter, ValidationError
+
+from app.models import PredictionInput
+
+# Columns every batch upload must provide
+REQUIRED_COLUMNS = [
+    "road_type", "num_lanes", "curvature", "speed_limit",
+    "lighting", "weather", "road_signs_present", "public_road",
+    "time_of_day", "holiday", "school_season", "num_reported_accidents"
+]
+
+
+def check_required_columns(columns: Iterable[str]) -> None:
+    """Raise 400 if any required column is missing."""
+    missing_cols = set(REQUIRED_COLUMNS) - set(columns)
+    if missing_cols:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Missing required columns: {', '.join(missing_cols)}"
+        )
+
+
+def validate_rows(
+    data_list: List[Dict[str, Any]], offset: int = 0
+) -> Tuple[List[int], List[Dict[str, Any]], Dict[int, str]]:
+    """Validate rows with PredictionInput.
+
+    Returns the positions and data of the valid rows, and an error message
+    per invalid position. Messages are numbered from `offset + 1`.
+    """
+    valid_indices = []
+    valid_data = []
+    errors = {}
+
+    for idx, row in enumerate(data_list):
+        try:
+            # Validate
+            PredictionInput(**row)
+            valid_indices.append(idx)
+            valid_data.append(row)
+        except ValidationError as e:
+            # Capture error
+            error_msg = "; ".join([f"{' -> '.join(str(l) for l in err['loc'])}: {err['msg']}" for err in e.errors()])
+            errors[idx] = f"Row {offset + idx + 1}: {error_msg}"
+        except Exception as e:
+            errors[idx] = f"Row {offset + idx + 1}: {str(e)}"
+
+    return valid_indices, valid_data, errors
+
+
+class FrameValidation(NamedTuple):
+    """Result of `validate_frame`."""
+    valid_mask: np.ndarray       # True for rows that passed validation
+    clean: pd.DataFrame          # coerced valid rows, indexed by row position
+    errors: Dict[int, str]       # "Row N: field: message" per invalid position
+
+
+def _field_adapter(name: str) -> TypeAdapter:
+    info = PredictionInput.model_fields[name]
+    if info.metadata:
+        return TypeAdapter(Annotated[(info.annotation, *info.metadata)])
+    return TypeAdapter(info.annotation)
+
+
+def _bound(name: str, attr: str):
+    for constraint in PredictionInput.model_fields[name].metadata:
+        if hasattr(constraint, attr):
+            return getattr(constraint, attr)
+    return None
+
+
+# Validators of single fields (PredictionInput has no cross-field rules)
+FIELD_ADAPTERS = {name: _field_adapter(name) for name in REQUIRED_COLUMNS}
+_FIELD_TYPES = {name: PredictionInput.model_fields[name].annotation for name in REQUIRED_COLUMNS}
+_DTYPES = {int: np.int64, float: np.float64, bool: np.bool_}
+
+
+def _fast_valid(name: str, series: pd.Series) -> np.ndarray:
+    """Mask of values that are certainly valid without calling pydantic."""
+    field_type = _FIELD_TYPES[name]
+    dtype = series.dtype
+    if isinstance(field_type, type) and issubclass(field_type, Enum):
+        if not (pd.api.types.is_string_dtype(dtype) or dtype == object):
+            return np.zeros(len(series), dtype=bool)
+        return series.isin([m.value for m in field_type]).to_numpy(dtype=bool)
+    if field_type is bool:
+        return np.full(len(series), pd.api.types.is_bool_dtype(dtype) and not series.hasnans)
+    if not pd.api.types.is_numeric_dtype(dtype) or pd.api.types.is_bool_dtype(dtype):
+        return np.zeros(len(series), dtype=bool)
+    values = series.to_numpy()
+    if field_type is int and values.dtype.kind in "iu":
+        ok = np.ones(len(values), dtype=bool)
+    elif field_type is int and values.dtype.kind == "f":
+        ok = np.isfinite(values) & (values == np.floor(values))
+    elif field_type is float and values.dtype.kind in "iuf":
+        ok = np.ones(len(values), dtype=bool)
+    else:
+        return np.zeros(len(values), dtype=bool)
+    ge, le = _bound(name, "ge"), _bound(name, "le")
+    # NaN fails both comparisons and falls through to pydantic
+    if ge is not None:
+        ok &= values >= ge
+    if le is not None:
+        ok &= values <= le
+    return ok
+
+
+def _validate_column(name: str, series: pd.Series) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Validate one column; returns (valid mask, coerced values, error messages)."""
+    n = len(series)
+    field_type = _FIELD_TYPES[name]
+    ok = np.array(_fast_valid(name, series), dtype=bool)
+    coerced = np.empty(n, dtype=_DTYPES.get(field_type, object))
+    messages = np.full(n, None, dtype=object)
+    if ok.all():
+        coerced[:] = series.to_numpy(dtype=coerced.dtype)
+        return ok, coerced, messages
+    if ok.any():
+        coerced[ok] = series[ok].to_numpy(dtype=coerced.dtype)
+
+    rest = np.flatnonzero(~ok)
+    codes, uniques = pd.factorize(series.iloc[rest].astype(object), use_na_sentinel=False)
+    adapter = FIELD_ADAPTERS[name]
+    unique_ok = np.zeros(len(uniques), dtype=bool)
+    unique_values = np.empty(len(uniques), dtype=coerced.dtype)
+    unique_messages = np.full(len(uniques), None, dtype=object)
+    for i, value in enumerate(uniques):
+        try:
+            result = adapter.validate_python(value)
+        except ValidationError as e:
+            unique_messages[i] = "; ".join(f"{name}: {err['msg']}" for err in e.errors())
+            continue
+        unique_ok[i] = True
+        unique_values[i] = result.value if isinstance(result, Enum) else result
+    ok[rest] = unique_ok[codes]
+    coerced[rest] = unique_values[codes]
+    messages[rest] = unique_messages[codes]
+    return ok, coerced, messages
+
+
+def validate_frame(df: pd.DataFrame, offset: int = 0) -> FrameValidation:
+    """Validate the required columns of `df` column-wise.
+
+    Applies the same rules and produces the same error strings as
+    `validate_rows`; invalid rows are numbered from `offset + 1`.
+    """
+    n = len(df)
+    valid_mask = np.ones(n, dtype=bool)
+    clean = {}
+    failed = []
+    for name in REQUIRED_COLUMNS:
+        ok, coerced, messages = _validate_column(name, df[name])
+        valid_mask &= ok
+        clean[name] = coerced
+        if not ok.all():
+            failed.append(messages)
+
+    errors = {}
+    for idx in np.flatnonzero(~valid_mask).tolist():
+        parts = [messages[idx] for messages in failed if messages[idx] is not None]
+        errors[idx] = f"Row {offset + idx + 1}: {'; '.join(parts)}"
+
+    positions = np.flatnonzero(valid_mask)
+    clean_df = pd.DataFrame({name: clean[name][positions] for name in REQUIRED_COLUMNS}, index=positions)
+    return FrameValidation(valid_mask, clean_df, errors)
+
+
+def _faulty_csv(n: int, seed: int = 0) -> bytes:
+    """Generated CSV with a mix of coercible and invalid cells."""
+    from app.numpy_scorer import sample_inputs
+
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame(sample_inputs(n, seed)).astype(object)
+    faults = {
+        "road_type": ["URBAN", "", "dirt"],
+        "num_lanes": ["3.0", " 2 ", "two", "", "9", "1e1", "0"],
+        "curvature": ["0.5", "abc", "", "1.5", "-0.1", "nan"],
+        "speed_limit": ["100", "121", "14", "fast", "50.5"],
+        "weather": ["sunny", ""],
+        "road_signs_present": ["yes", "no", "1", "0", "maybe", "", "2"],
+        "holiday": ["True", "false", "on", "off", "1.0"],
+        "num_reported_accidents": ["-1", "8", "7", ""],
+    }
+    for column, values in faults.items():
+        rows = np.flatnonzero(rng.random(n) < 0.01)
+        df.loc[rows, column] = rng.choice(values, len(rows))
+    return df.to_csv(index=False).encode("utf-8")
+
+
+def check_parity(content: bytes) -> Dict[str, Any]:
+    """Compare `validate_frame` against the per-row `validate_rows` path on a CSV file."""
+    return check_frame_parity(pd.read_csv(io.BytesIO(content)))
+
+
+def check_frame_parity(df: pd.DataFrame) -> Dict[str, Any]:
+    """Compare `validate_frame` against the per-row `validate_rows` path.
+
+    Takes any DataFrame with the required columns, e.g. the typed columns of
+    a Parquet or Arrow upload.
+    """
+    df = df[REQUIRED_COLUMNS]
+
+    start = time.perf_counter()
+    valid_indices, valid_data, errors = validate_rows(df.to_dict('records'))
+    rows_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    result = validate_frame(df)
+    frame_s = time.perf_counter() - start
+
+    expected = [PredictionInput(**row).model_dump(mode="json") for row in valid_data]
+    return {
+        "rows": len(df),
+        "invalid_rows": len(errors),
+        "same_valid_rows": list(result.clean.index) == valid_indices,
+        "same_errors": result.errors == errors,
+        "same_values": result.clean.to_dict('records') == expected,
+        "validate_rows_s": round(rows_s, 3),
+        "validate_frame_s": round(frame_s, 3),
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Check column-wise validation against per-row validation")
+    parser.add_argument("csv", nargs="?", help="CSV file to check (default: generated data)")
+    parser.add_argument("--rows", type=int, default=100000, help="generated rows when no file is given")
+    args = parser.parse_args(argv)
+
+    if args.csv:
+        with open(args.csv, "rb") as f:
+            content = f.read()
+    else:
+        content = _faulty_csv(args.rows)
+    report = check_parity(content)
+    print(json.dumps(report))
+    if not (report["same_valid_rows"] and report["same_errors"] and report["same_values"]):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""Check that the pandas and NumPy feature compilers agree, without a JVM.
+
+Both are compiled from `app.features.FEATURES`; this compares them with each
+other and with a row-by-row evaluation of the declarations, on generated
+inputs plus every lighting/weather pair and the threshold values. Result
+types must be the ones Spark gives (int, or double for products with the
+FloatType curvature).
+
+    python verify_features.py
+
+`python -m app.features --check` also compares the Spark projection, but
+needs a JVM.
+"""
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+
+import numpy as np
+import pandas as pd
+
+from app.config import LIGHTING_OPTIONS, WEATHER_OPTIONS
+from app.features import FEATURES, numpy_add_features, pandas_add_features
+from app.numpy_scorer import sample_inputs, rows_to_columns
+
+
+def edge_inputs():
+    """Every lighting/weather pair at and around the curvature and speed thresholds."""
+    base = sample_inputs(1, seed=0)[0]
+    rows = []
+    for lighting in LIGHTING_OPTIONS:
+        for weather in WEATHER_OPTIONS:
+            for curvature, speed_limit in ((0.5, 60), (0.49, 59), (1.0, 120), (0.0, 15)):
+                rows.append(dict(base, lighting=lighting, weather=weather,
+                                 curvature=curvature, speed_limit=speed_limit))
+    return rows
+
+
+def reference_features(columns):
+    """Evaluate the declarations one row at a time in plain Python."""
+    rows = [dict(zip(columns, values)) for values in zip(*(columns[c].tolist() for c in columns))]
+    float_columns = {c for c, values in columns.items() if values.dtype.kind == "f"}
+    for feature in FEATURES:
+        op, args = feature.op, feature.args
+        if op == "mul" and (args[0] in float_columns or args[1] in float_columns):
+            float_columns.add(feature.name)
+        for row in rows:
+            if op == "eq":
+                row[feature.name] = int(row[args[0]] == args[1])
+            elif op == "isin":
+                row[feature.name] = int(row[args[0]] in args[1])
+            elif op == "ge":
+                row[feature.name] = int(row[args[0]] >= args[1])
+            elif op == "int":
+                row[feature.name] = int(row[args[0]])
+            elif op == "mul":
+                row[feature.name] = row[args[0]] * row[args[1]]
+            else:
+                raise ValueError(f"Unknown feature op '{op}' for {feature.name}")
+    return {
+        f.name: np.array([row[f.name] for row in rows],
+                         dtype=np.float64 if f.name in float_columns else np.int64)
+        for f in FEATURES
+    }
+
+
+def compare(columns):
+    """Names of the features where a backend differs from the reference."""
+    expected = reference_features(columns)
+    np_cols = numpy_add_features(columns)
+    pd_cols = pandas_add_features(pd.DataFrame(columns))
+    mismatches = []
+    for feature in FEATURES:
+        name = feature.name
+        reference = expected[name]
+        checks = {
+            "numpy_dtype": np_cols[name].dtype == reference.dtype,
+            "numpy_values": np.array_equal(np_cols[name], reference),
+            "pandas_dtype": pd_cols[name].dtype == reference.dtype,
+            "pandas_values": np.array_equal(pd_cols[name].to_numpy(), reference),
+        }
+        failed = [k for k, ok in checks.items() if not ok]
+        if failed:
+            mismatches.append({"feature": name, "failed": failed})
+    return mismatches
+
+
+cases = {"edges": edge_inputs()}
+for seed in range(3):
+    cases[f"generated_seed{seed}"] = sample_inputs(20000, seed)
+cases["single_row"] = sample_inputs(1, seed=7)
+
+report = {}
+for name, rows in cases.items():
+    report[name] = {"rows": len(rows), "mismatches": compare(rows_to_columns(rows))}
+print(json.dumps(report, indent=2))
+
+if any(case["mismatches"] for case in report.values()):
+    print("Feature backends differ")
+    exit(1)
+print("pandas and NumPy features match.")
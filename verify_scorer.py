@@ -0,0 +1,43 @@
+"""Check the committed traffic_lr_model.npz against the Spark pipeline.
+
+Loads the NumPy scorer artifact as the API would, checks it was compiled
+from the committed traffic_lr_model, and compares its labels and
+probabilities with `PipelineModel.transform` on generated inputs. Fails if
+any label differs or a probability is off by more than
+`numpy_scorer.PARITY_TOLERANCE`. Needs a JVM.
+
+    python verify_scorer.py
+
+After retraining, rebuild the artifact with
+`python -m app.numpy_scorer --verify 5000` (from backend/) first.
+"""
+import json
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(ROOT, "backend"))
+
+from pyspark.ml import PipelineModel
+
+from app.numpy_scorer import NumpyScorer, read_model_uid, verify_parity
+from app.spark_service import spark_service
+
+model_path = os.path.join(ROOT, "traffic_lr_model")
+scorer = NumpyScorer.load(os.path.join(ROOT, "traffic_lr_model.npz"))
+
+_ = spark_service.spark
+model = PipelineModel.load(model_path)
+
+report = {"model_uid": {"artifact": scorer.model_uid, "model": read_model_uid(model_path)}}
+for seed in range(3):
+    report[f"generated_seed{seed}"] = verify_parity(scorer, model, n=5000, seed=seed)
+print(json.dumps(report, indent=2))
+
+failed = [name for name, case in report.items() if name != "model_uid" and not case["passed"]]
+if report["model_uid"]["artifact"] != report["model_uid"]["model"]:
+    failed.insert(0, "model_uid")
+if failed:
+    print(f"NumPy scorer differs from Spark: {', '.join(failed)}")
+    exit(1)
+print("NumPy scorer matches Spark.")
@@ -0,0 +1,56 @@
+"""Check that column-wise validation matches per-row PredictionInput validation.
+
+`validate_frame` must accept the same rows, coerce them to the same values
+and report the same error messages as `PredictionInput(**row)` row by row.
+Compared on generated CSV uploads with injected faults, on
+test_data/test_batch_with_errors.csv, and on typed frames like Parquet and
+Arrow uploads give (native ints, floats and bools, with nulls).
+
+    python verify_validation.py
+
+`python -m app.validation` runs the same comparison on one file, with
+timings.
+"""
+import json
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(ROOT, "backend"))
+
+import numpy as np
+import pandas as pd
+
+from app.numpy_scorer import sample_inputs
+from app.validation import _faulty_csv, check_frame_parity, check_parity
+
+
+def typed_frame(n, seed):
+    """Generated inputs with native dtypes, some cells null or out of range."""
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame(sample_inputs(n, seed))
+    df.loc[rng.random(n) < 0.01, "curvature"] = np.nan
+    df.loc[rng.random(n) < 0.01, "curvature"] = 1.5
+    df.loc[rng.random(n) < 0.01, "road_type"] = None
+    df.loc[rng.random(n) < 0.01, "weather"] = "sunny"
+    df["speed_limit"] = df["speed_limit"].astype(np.int32)
+    df.loc[rng.random(n) < 0.01, "speed_limit"] = 500
+    df["holiday"] = df["holiday"].astype(object)
+    df.loc[rng.random(n) < 0.01, "holiday"] = None
+    return df
+
+
+report = {}
+for seed in range(3):
+    report[f"faulty_csv_seed{seed}"] = check_parity(_faulty_csv(20000, seed))
+    report[f"typed_frame_seed{seed}"] = check_frame_parity(typed_frame(20000, seed))
+with open(os.path.join(ROOT, "test_data", "test_batch_with_errors.csv"), "rb") as f:
+    report["test_batch_with_errors"] = check_parity(f.read())
+print(json.dumps(report, indent=2))
+
+failed = [name for name, case in report.items()
+          if not (case["same_valid_rows"] and case["same_errors"] and case["same_values"])]
+if failed:
+    print(f"Column-wise validation differs from per-row validation: {', '.join(failed)}")
+    exit(1)
+print("Column-wise and per-row validation match.")